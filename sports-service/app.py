@@ -2,77 +2,786 @@ import grpc
 from concurrent import futures
 import time
 import threading
-from flask import Flask, jsonify, request, Response
-from pymongo import MongoClient
+import os
+import json
+import queue
+import base64
+import sys
+import subprocess
+import signal
+from contextlib import contextmanager
+from flask import Flask, jsonify, request, Response, g
+from pymongo import MongoClient, ReturnDocument, ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 import sports_service_pb2
 import sports_service_pb2_grpc
-from prometheus_client import generate_latest, Counter, Gauge, CollectorRegistry
+from prometheus_client import generate_latest, multiprocess, Counter, Gauge, CollectorRegistry, REGISTRY
 from bson.objectid import ObjectId
+from indexes import ensure_indexes, ONGOING_EVENT_PROJECTION, CATEGORY_PROJECTION
+from cache import TTLCache, TwoTierCache
+from shared_cache import SharedCache, SHARED_CACHE_ENABLED
+from versions import bump_collection_version, collection_version, make_etag
+from feed import ScoreFeed
+from ongoing_view import OngoingView, ONGOING_VIEW_ENABLED
+from singleflight import SingleFlight
+from batch_loader import BatchLoader
+from bloom import KnownGames, KNOWN_GAMES_FILTER_ENABLED, KNOWN_GAMES_FALSE_POSITIVES, EVENT_INSERTS_COUNTER
+from heavy_hitters import HotKeys
+from load import LoadTracker, LoadInterceptor
+from instrumentation import instrument_flask, MetricsInterceptor
+from mongo_monitoring import mongo_client_options, PoolMetricsListener, CommandMetricsListener
+from slow_queries import SlowQueryRecorder, SLOW_QUERY_SORT_KEYS
+from lanes import serve_lanes
+from limiter import AdaptiveLimiter, AdmissionInterceptor, REQUESTS_REJECTED, OVERLOAD_MESSAGE
 
 app = Flask(__name__)
+# Latency, size and status metrics for every route; registered first so that
+# requests shed by admission control are recorded too
+instrument_flask(app)
 
 # MongoDB connection setup
-client = MongoClient('mongodb://mongo:27017/')
-db = client['sports_database']
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://mongo:27017/')
+client = None
+db = None
+# Slowest query shapes with their plans, see /debug/slow-queries
+slow_queries = SlowQueryRecorder('sports')
+slow_queries.bind(lambda: client)
+# Pool and per-command metrics, shared by every client this process creates
+MONGO_LISTENERS = [PoolMetricsListener('sports'), CommandMetricsListener('sports'), slow_queries]
+
+def connect_mongo():
+    # A MongoClient must not be carried across fork(), so prefork workers call
+    # this again once they are running (see gunicorn.conf.py). connect=False
+    # keeps the client idle until its first operation.
+    global client, db
+    client = MongoClient(MONGO_URL, connect=False, event_listeners=MONGO_LISTENERS, **mongo_client_options())
+    db = client['sports_database']
+
+connect_mongo()
 
 CRITICAL_LOAD_THRESHOLD = 10
 
-REQUEST_COUNT = Counter('sports_requests_total', 'Total number of requests to sports service', ['method', 'endpoint'])
+# REST serving mode: 'flask' (threaded Werkzeug server), 'async' (Quart on
+# hypercorn with motor, see async_app.py) or 'prefork' (gunicorn workers, see
+# gunicorn.conf.py)
+HTTP_MODE = os.environ.get('SPORTS_HTTP_MODE', 'flask')
+# 'threads' (grpc.server on a thread pool) or 'aio' (grpc.aio, see grpc_aio.py)
+GRPC_MODE = os.environ.get('SPORTS_GRPC_MODE', 'threads')
+# Each open Watch stream holds one of these threads in 'threads' mode
+GRPC_MAX_WORKERS = int(os.environ.get('GRPC_MAX_WORKERS', 10))
+# Threads no watch stream can take, so the unary calls always have some.
+# WatchLoad streams (one per gateway) have a small cap of their own; the
+# WatchGame / WatchOngoing streams share what is left. Streams over either
+# cap get RESOURCE_EXHAUSTED.
+GRPC_WATCH_RESERVE = int(os.environ.get('GRPC_WATCH_RESERVE', 4))
+MAX_LOAD_WATCH_STREAMS = int(os.environ.get('GRPC_MAX_LOAD_WATCHES', 2))
+MAX_WATCH_STREAMS = max(1, GRPC_MAX_WORKERS - GRPC_WATCH_RESERVE - MAX_LOAD_WATCH_STREAMS)
+# What this process runs: 'all' (REST and gRPC threads in one process), 'http'
+# or 'grpc' alone, or 'supervisor' (one process per role, see supervisor.py)
+PROCESS_ROLE = os.environ.get('SPORTS_ROLE', 'all')
+# Lets several gRPC processes bind port 50051 at once in supervisor mode
+GRPC_SERVER_OPTIONS = [('grpc.so_reuseport', 1)]
+# How long in-flight RPCs get to finish when a gRPC process is asked to stop
+GRPC_SHUTDOWN_GRACE = float(os.environ.get('GRPC_SHUTDOWN_GRACE_SECONDS', 5))
+
+# Streaming mode for large listings: rows are pulled from the cursor in
+# batches of this size and written to the client as they arrive.
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 500))
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Number of documents sent to Mongo per insert_many call by the bulk endpoint
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 1000))
+
+# Read-through cache for the GET endpoints. TTLs are per endpoint, in seconds.
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+CACHE_TTLS = {
+    'ongoing': float(os.environ.get('CACHE_TTL_ONGOING', 2)),
+    'categories': float(os.environ.get('CACHE_TTL_CATEGORIES', 300)),
+    'game': float(os.environ.get('CACHE_TTL_GAME', 5)),
+}
+# With a Redis cluster configured, the per-process LRU is backed by a tier
+# shared by all replicas (see shared_cache.py)
+if SHARED_CACHE_ENABLED:
+    cache = TwoTierCache(CACHE_MAX_ENTRIES, CACHE_TTLS, SharedCache(CACHE_TTLS), versioned=('game',))
+else:
+    cache = TTLCache(CACHE_MAX_ENTRIES, CACHE_TTLS)
+
+# In-memory replica of the ongoing events, started by startup(). Until it has
+# loaded, the read paths fall back to the cache and Mongo.
+ongoing_view = OngoingView()
+
+# Concurrent lookups of the same game (a goal in a big match) share one query
+game_lookups = SingleFlight('game')
+
+# Bloom filter of existing game ids: lookups of ids that were never created
+# (scrapers, stale clients) are answered as not found without a query
+known_games = KnownGames()
+
+# Most requested games and categories, see /debug/hot-keys. The hot games are
+# pinned in the cache and refreshed before they expire (warm_hot_games).
+HOT_KEY_NAMESPACES = ('game', 'category')
+hot_keys = HotKeys(HOT_KEY_NAMESPACES)
+# Seconds between refreshes of the hot games; 0 turns pinning and warming off
+HOT_KEYS_WARM_INTERVAL = float(os.environ.get('HOT_KEYS_WARM_INTERVAL', 1))
+HOT_GAMES_REFRESHED = Counter('sports_hot_games_refreshed_total', 'Cache entries of hot games reloaded before expiry')
+
+# Score deltas for downstream consumers (gRPC watchers, websocket service)
+score_feed = ScoreFeed()
+
+SCORE_FIELDS = ("score_team_1", "score_team_2")
+SETTABLE_FIELDS = SCORE_FIELDS + ("status", "event_status")
+DELTA_FIELDS = SETTABLE_FIELDS + ("team_1", "team_2")
+GAME_PROJECTION = dict({"_id": 0, "event_id": 1, "version": 1, "sport_category": 1}, **{field: 1 for field in DELTA_FIELDS})
+
+# Limits for the batched gRPC reads
+MAX_BATCH_GAMES = int(os.environ.get('MAX_BATCH_GAMES', 1000))
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Deltas buffered per watch stream before the watcher is considered too slow
+WATCH_QUEUE_SIZE = int(os.environ.get('WATCH_QUEUE_SIZE', 1000))
+# How often an idle watch stream checks whether the client is still there
+WATCH_POLL_INTERVAL = 1.0
+WATCHER_OVERFLOW_MESSAGE = "Watcher fell behind, resume from the last seq received"
+WATCH_LIMIT_MESSAGE = "Too many watch streams, retry later"
+
 CURRENT_LOAD = Gauge('sports_current_load', 'Current load of sports service')
-REGISTRY = CollectorRegistry()
+
+# In-flight requests, request rate and latency across the HTTP and gRPC paths
+load_tracker = LoadTracker(window=int(os.environ.get('LOAD_WINDOW_SECONDS', 10)))
+load_tracker.export_metrics()
+CURRENT_LOAD.set_function(load_tracker.load)
+# Health checks and scrapes are not load; counting them would make every
+# replica look busy in proportion to how often it is polled.
+CONTROL_PATHS = ('/status', '/metrics')
+DEFAULT_LOAD_REPORT_INTERVAL_MS = 1000
+MIN_LOAD_REPORT_INTERVAL_MS = 100
+
+# Admission control for the API routes and the unary RPCs: work above the
+# adaptive limit is rejected with 503 / RESOURCE_EXHAUSTED and a Retry-After
+# hint instead of queueing until it times out.
+limiter = AdaptiveLimiter(
+    initial_limit=int(os.environ.get('LIMITER_INITIAL_LIMIT', 20)),
+    min_limit=int(os.environ.get('LIMITER_MIN_LIMIT', 2)),
+    max_limit=int(os.environ.get('LIMITER_MAX_LIMIT', 500)),
+    target_latency=float(os.environ.get('LIMITER_TARGET_LATENCY_MS', 250)) / 1000
+)
+# Bulk ingest is slow by design: it has its own small budget, so that its
+# latency doesn't shrink the limit of the interactive routes
+bulk_limiter = AdaptiveLimiter(
+    initial_limit=int(os.environ.get('LIMITER_BULK_INITIAL_LIMIT', 2)),
+    min_limit=1,
+    max_limit=int(os.environ.get('LIMITER_BULK_MAX_LIMIT', 8)),
+    target_latency=float(os.environ.get('LIMITER_BULK_TARGET_LATENCY_MS', 5000)) / 1000,
+    name='bulk'
+)
+SEPARATELY_LIMITED_PATHS = {'/api/sports/events:bulk': bulk_limiter}
+RETRY_AFTER_SECONDS = int(os.environ.get('LIMITER_RETRY_AFTER', 1))
+# The gateway pings replicas to pick the least loaded one; never shed those,
+# and don't count them as load either (like CONTROL_PATHS), or a replica would
+# look busy in proportion to how often it is pinged
+UNLIMITED_RPCS = ('/sportsservice.SportsService/Ping',)
+CONTROL_RPCS = UNLIMITED_RPCS
+
+# Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR;
+# /metrics then reports the sum over all workers, whichever one serves it.
+def metrics_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
 
 class SportsService(sports_service_pb2_grpc.SportsServiceServicer):
-    def __init__(self):
-        self.load_counter = 0
-        self.start_time = time.time()
+    def __init__(self, max_watch_streams=MAX_WATCH_STREAMS, max_load_watch_streams=MAX_LOAD_WATCH_STREAMS):
+        self._watch_slots = threading.BoundedSemaphore(max_watch_streams)
+        self._load_watch_slots = threading.BoundedSemaphore(max_load_watch_streams)
+
+    @contextmanager
+    def _watch_slot(self, context, slots=None):
+        slots = slots or self._watch_slots
+        if not slots.acquire(blocking=False):
+            REQUESTS_REJECTED.labels('grpc').inc()
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, WATCH_LIMIT_MESSAGE)
+        try:
+            yield
+        finally:
+            slots.release()
 
     def Ping(self, request, context):
-        current_time = time.time()
-        elapsed_time = current_time - self.start_time
+        load = load_tracker.load()
+        if load >= CRITICAL_LOAD_THRESHOLD:
+            print(f"ALERT: Load threshold exceeded! Current load: {load}")
+        print(f"Ping received: {request.message}. Current load: {load}")
+
+        response_message = f"Ping received: {request.message}, current load: {load}"
+        return sports_service_pb2.PingResponse(response=response_message, load=load)
+
+    def UpdateScore(self, request, context):
+        return call_rpc(context, update_score_rpc, request)
+
+    def GetGames(self, request, context):
+        return call_rpc(context, get_games_rpc, request)
+
+    def ListOngoingEvents(self, request, context):
+        return call_rpc(context, list_ongoing_events_rpc, request)
+
+    def WatchGame(self, request, context):
+        with self._watch_slot(context):
+            watch = GameWatch(request.game_id, request.since_version)
+            deltas = DeltaQueue(watch.matches)
+            unsubscribe = watch.subscribe(deltas)
+            try:
+                yield from call_rpc(context, watch.start)
+                for delta in deltas.deltas(context):
+                    message, done = watch.accept(delta)
+                    if message is not None:
+                        yield message
+                    if done:
+                        return
+            finally:
+                unsubscribe()
+
+    def WatchOngoing(self, request, context):
+        with self._watch_slot(context):
+            watch = OngoingWatch(request.sport_category, request.since_seq)
+            deltas = DeltaQueue(watch.matches)
+            unsubscribe = watch.subscribe(deltas)
+            try:
+                yield from call_rpc(context, watch.start)
+                for delta in deltas.deltas(context):
+                    message, _ = watch.accept(delta)
+                    if message is not None:
+                        yield message
+            finally:
+                unsubscribe()
+
+    def WatchLoad(self, request, context):
+        with self._watch_slot(context, self._load_watch_slots):
+            interval = load_report_interval(request)
+            while context.is_active():
+                yield load_report()
+                time.sleep(interval)
+
+def load_report():
+    return sports_service_pb2.LoadReport(**load_tracker.snapshot())
+
+def load_report_interval(request):
+    return max(request.interval_ms or DEFAULT_LOAD_REPORT_INTERVAL_MS, MIN_LOAD_REPORT_INTERVAL_MS) / 1000
+
+# Raised by the RPC implementations below; each server flavour turns it into
+# an aborted call in its own way (context.abort is a coroutine in grpc.aio).
+class RpcAbort(Exception):
+    def __init__(self, code, details):
+        super().__init__(details)
+        self.code = code
+        self.details = details
+
+def call_rpc(context, fn, *args):
+    try:
+        return fn(*args)
+    except RpcAbort as e:
+        context.abort(e.code, e.details)
+
+def update_score_rpc(request):
+    inc = {}
+    if request.inc_team_1:
+        inc["score_team_1"] = request.inc_team_1
+    if request.inc_team_2:
+        inc["score_team_2"] = request.inc_team_2
+    set_fields = {field: getattr(request, field) for field in SETTABLE_FIELDS if request.HasField(field)}
+
+    try:
+        game = update_score(request.game_id, inc, set_fields)
+    except ValueError as e:
+        raise RpcAbort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+    if game is None:
+        raise RpcAbort(grpc.StatusCode.NOT_FOUND, "Game not found")
+    return game_to_proto(game)
+
+def get_games_rpc(request):
+    game_ids = list(dict.fromkeys(request.game_ids))
+    if len(game_ids) > MAX_BATCH_GAMES:
+        raise RpcAbort(grpc.StatusCode.INVALID_ARGUMENT, f"At most {MAX_BATCH_GAMES} game ids per call")
+    for game_id in game_ids:
+        hot_keys.record('game', game_id)
+
+    # One $in query for the whole batch instead of one find_one per id
+    games = {}
+    if game_ids:
+        for game in db.events.find({"event_id": {"$in": game_ids}}, GAME_PROJECTION):
+            games[game["event_id"]] = game
+    return sports_service_pb2.GetGamesResponse(
+        games=[game_to_proto(games[game_id]) for game_id in game_ids if game_id in games],
+        missing_ids=[game_id for game_id in game_ids if game_id not in games]
+    )
+
+def list_ongoing_events_rpc(request):
+    page_size = request.page_size or DEFAULT_PAGE_SIZE
+    if page_size < 0 or page_size > MAX_PAGE_SIZE:
+        raise RpcAbort(grpc.StatusCode.INVALID_ARGUMENT, f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+
+    query = {"event_status": "ongoing"}
+    if request.sport_category:
+        query["sport_category"] = request.sport_category
+    hot_keys.record('category', request.sport_category)
+    # Keyset pagination: the token is the last event_id of the previous page
+    if request.page_token:
+        try:
+            query["event_id"] = {"$gt": base64.urlsafe_b64decode(request.page_token.encode()).decode()}
+        except ValueError:
+            raise RpcAbort(grpc.StatusCode.INVALID_ARGUMENT, "Invalid page_token")
+
+    # One extra row tells whether there is a next page
+    if ongoing_view.ready:
+        games = ongoing_view.page(request.sport_category, query.get("event_id", {}).get("$gt"), page_size + 1)
+    else:
+        games = list(db.events.find(query, GAME_PROJECTION).sort("event_id", ASCENDING).limit(page_size + 1))
+    next_page_token = ""
+    if len(games) > page_size:
+        games = games[:page_size]
+        next_page_token = base64.urlsafe_b64encode(games[-1]["event_id"].encode()).decode()
+    return sports_service_pb2.ListOngoingEventsResponse(
+        games=[game_to_proto(game) for game in games],
+        next_page_token=next_page_token
+    )
+
+# State of a WatchGame stream. start() does the blocking initial read and
+# returns the messages to send first; accept() decides per live delta.
+class GameWatch:
+    def __init__(self, game_id, since_version):
+        hot_keys.record('game', game_id)
+        self.game_id = game_id
+        # A single snapshot is the cheapest way to catch up a game, so
+        # resuming only needs the version the client already has.
+        self.last_version = since_version
+
+    def matches(self, delta):
+        return delta["game_id"] == self.game_id
+
+    def subscribe(self, callback):
+        return score_feed.subscribe(callback)
+
+    def start(self):
+        game = find_game(self.game_id)
+        if game is None:
+            raise RpcAbort(grpc.StatusCode.NOT_FOUND, "Game not found")
+        if game.get("version", 0) <= self.last_version:
+            return []
+        self.last_version = game.get("version", 0)
+        return [delta_to_proto(snapshot_delta(game, 0))]
+
+    # Returns (message or None, whether the stream is finished)
+    def accept(self, delta):
+        if delta.get("deleted"):
+            return delta_to_proto(delta), True
+        if delta["version"] <= self.last_version:
+            return None, False
+        self.last_version = delta["version"]
+        return delta_to_proto(delta), False
+
+# State of a WatchOngoing stream, same protocol as GameWatch
+class OngoingWatch:
+    def __init__(self, category, since_seq):
+        hot_keys.record('category', category)
+        self.category = category
+        self.since_seq = since_seq
+        self.backlog = None
+        self.snapshot_seq = 0
+
+    def matches(self, delta):
+        return not self.category or delta.get("sport_category") == self.category
+
+    def subscribe(self, callback):
+        self.backlog, unsubscribe = score_feed.subscribe_from(self.since_seq or None, callback, self.matches)
+        return unsubscribe
+
+    def start(self):
+        if self.backlog is not None:
+            # Resumed from history; the subscription was taken atomically
+            # with the backlog, so live deltas follow without overlap.
+            return [delta_to_proto(delta) for delta in self.backlog]
+
+        self.snapshot_seq = collection_version(db, 'events')
+        query = {"event_status": "ongoing"}
+        if self.category:
+            query["sport_category"] = self.category
+        return [delta_to_proto(snapshot_delta(game, self.snapshot_seq)) for game in db.events.find(query, GAME_PROJECTION)]
+
+    def accept(self, delta):
+        # Already contained in the snapshot
+        if delta["seq"] <= self.snapshot_seq:
+            return None, False
+        return delta_to_proto(delta), False
+
+# Per-stream buffer between the score feed and a watch RPC
+class DeltaQueue:
+    def __init__(self, matches):
+        self.matches = matches
+        self.queue = queue.Queue(maxsize=WATCH_QUEUE_SIZE)
+        self.overflowed = False
+
+    def __call__(self, delta):
+        if not self.matches(delta):
+            return
+        try:
+            self.queue.put_nowait(delta)
+        except queue.Full:
+            self.overflowed = True
+
+    # Deltas were lost upstream: end the stream so the client resumes
+    def resync(self):
+        self.overflowed = True
+
+    def deltas(self, context):
+        while context.is_active():
+            if self.overflowed:
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, WATCHER_OVERFLOW_MESSAGE)
+            try:
+                yield self.queue.get(timeout=WATCH_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+
+def snapshot_delta(game, seq):
+    return {
+        "game_id": game.get("event_id"),
+        "version": game.get("version", 0),
+        "seq": seq,
+        "sport_category": game.get("sport_category"),
+        "changes": {field: game[field] for field in DELTA_FIELDS if field in game},
+        "snapshot": True
+    }
+
+def deleted_delta(game, seq):
+    return {
+        "game_id": game["event_id"],
+        "version": game.get("version", 0),
+        "seq": seq,
+        "sport_category": game.get("sport_category"),
+        "changes": {},
+        "deleted": True
+    }
+
+def delta_to_proto(delta):
+    message = sports_service_pb2.ScoreDelta(
+        game_id=delta["game_id"],
+        version=delta["version"],
+        seq=delta["seq"],
+        sport_category=delta.get("sport_category") or "",
+        snapshot=delta.get("snapshot", False),
+        deleted=delta.get("deleted", False)
+    )
+    for field, value in delta["changes"].items():
+        # Fields with a value of the wrong type in Mongo are left out
+        try:
+            if value is not None:
+                setattr(message, field, value)
+        except (TypeError, ValueError):
+            pass
+    return message
+
+def game_to_proto(game):
+    return sports_service_pb2.Game(
+        game_id=game.get("event_id", ""),
+        team_1=game.get("team_1", ""),
+        team_2=game.get("team_2", ""),
+        score_team_1=game.get("score_team_1", 0),
+        score_team_2=game.get("score_team_2", 0),
+        status=game.get("status", ""),
+        sport_category=game.get("sport_category", ""),
+        event_status=game.get("event_status", ""),
+        version=game.get("version", 0)
+    )
+
+def _encode_row(row):
+    return json.dumps(row, separators=(',', ':'))
+
+def _ndjson_rows(cursor):
+    try:
+        for row in cursor:
+            yield _encode_row(row) + '\n'
+    finally:
+        cursor.close()
+
+def _json_array_rows(cursor):
+    # Same envelope as the buffered response, written one row at a time.
+    try:
+        yield '{"status":"success","data":['
+        separator = ''
+        for row in cursor:
+            yield separator + _encode_row(row)
+            separator = ','
+        yield ']}'
+    finally:
+        cursor.close()
+
+def wants_ndjson():
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
 
-        if elapsed_time >= 1.0:
-            if self.load_counter >= CRITICAL_LOAD_THRESHOLD:
-                print(f"ALERT: Load threshold exceeded! {self.load_counter} pings in the last second.")
-            else:
-                print(f"INFO: Load below threshold: {self.load_counter} pings in the last second.")
-                
-            self.load_counter = 0
-            self.start_time = current_time
+# Either `Accept: application/x-ndjson` or `?stream=1` switches a listing to streaming
+def wants_stream():
+    return request.args.get('stream') == '1' or wants_ndjson()
 
-        self.load_counter += 1
-        CURRENT_LOAD.set(self.load_counter)
-        print(f"Ping received: {request.message}. Current load: {self.load_counter}")
+def stream_response(cursor):
+    cursor = cursor.batch_size(STREAM_BATCH_SIZE)
+    if wants_ndjson():
+        return Response(_ndjson_rows(cursor), mimetype=NDJSON_MIMETYPE)
+    return Response(_json_array_rows(cursor), mimetype='application/json')
 
-        response_message = f"Ping received: {request.message}, current load: {self.load_counter}"
-        return sports_service_pb2.PingResponse(response=response_message, load=self.load_counter)
+# Loaders return (version, data) so that conditional GETs can be answered
+# from the cached version without touching or re-serializing the data.
+def load_ongoing_events():
+    # Read the version first: if a write lands in between, the data is newer
+    # than the version and the next request simply sees a changed ETag.
+    version = collection_version(db, 'events')
+    # The projection matches the event_status index, so this is a covered query
+    # and the documents already have the response shape.
+    return version, list(db.events.find({"event_status": "ongoing"}, ONGOING_EVENT_PROJECTION))
+
+def load_categories():
+    return list(db.categories.find({}, CATEGORY_PROJECTION))
+
+def game_payload(game):
+    return {
+        "game_id": game.get("event_id", "Unknown"),
+        "team_1": game.get("team_1", "Unknown"),
+        "team_2": game.get("team_2", "Unknown"),
+        "score_team_1": game.get("score_team_1", 0),
+        "score_team_2": game.get("score_team_2", 0),
+        "status": game.get("status", "Unknown")
+    }
+
+# Point lookups of different games that arrive together are resolved by one
+# $in query; a batch of one stays a plain find_one.
+def fetch_games(game_ids):
+    if len(game_ids) == 1:
+        game = db.events.find_one({"event_id": game_ids[0]})
+        return {game_ids[0]: game} if game else {}
+    return {game["event_id"]: game for game in db.events.find({"event_id": {"$in": game_ids}})}
+
+game_loader = BatchLoader('sports', 'game', fetch_games)
+
+# Whether the known game filter proves that the game doesn't exist. Such
+# answers are not cached: the game may be created any moment.
+def known_missing(game_id):
+    return known_games.rules_out(game_id, ongoing_view.followed_since)
+
+def find_game(game_id):
+    if known_missing(game_id):
+        return None
+    game = game_lookups.do(game_id, lambda: game_loader.load(game_id))
+    if game is None and known_games.ready and known_games.might_exist(game_id):
+        KNOWN_GAMES_FALSE_POSITIVES.inc()
+    return game
+
+# Pins the hot games in the cache and reloads those about to expire in one
+# query, so a hot game's readers never all miss at once. Ongoing games are
+# served from the in-memory view and need no cache entry.
+def warm_hot_games():
+    hot = [game_id for game_id, _ in hot_keys.top('game')]
+    cache.pin('game', hot)
+    stale = [game_id for game_id in hot
+             if ongoing_view.game(game_id) is None and known_games.might_exist(game_id)
+             and (cache.expires_in('game', game_id) or 0) < 2 * HOT_KEYS_WARM_INTERVAL]
+    if not stale:
+        return
+    games = fetch_games(stale)
+    for game_id in stale:
+        game = games.get(game_id)
+        cache.set('game', game_id, (game.get("version", 0), game_payload(game)) if game else None)
+    HOT_GAMES_REFRESHED.inc(len(stale))
+
+def run_cache_warmer():
+    while True:
+        time.sleep(HOT_KEYS_WARM_INTERVAL)
+        try:
+            warm_hot_games()
+        except PyMongoError as e:
+            print(f"WARNING: Failed to refresh hot games: {e}")
+
+# Deltas from other replicas were lost while Redis was unreachable
+def resync_after_feed_gap():
+    cache.clear()
+    if KNOWN_GAMES_FILTER_ENABLED:
+        known_games.request_rebuild()
+
+def remember_game(delta):
+    if not delta.get("deleted"):
+        known_games.add(delta["game_id"])
+
+
+def load_game(game_id):
+    game = find_game(game_id)
+    if not game:
+        return None
+    return game.get("version", 0), game_payload(game)
+
+# Ongoing games are answered from the in-memory view, others from the cache
+def ongoing_game(game_id):
+    event = ongoing_view.game(game_id)
+    if event is None:
+        return None
+    return event.get("version", 0), game_payload(event)
+
+# Called after every write to events. The version is bumped after the write so
+# that a listing loaded while the write was in flight never keeps its ETag.
+# `versions` maps deleted games to their last version, which the shared cache
+# tier then refuses to store again.
+def invalidate_events(event_ids, versions=None):
+    seq = bump_collection_version(db, 'events')
+    drop_cached_events(event_ids, versions)
+    return seq
+
+def drop_cached_events(event_ids, versions=None, local=False):
+    invalidate = cache.invalidate_local if local else cache.invalidate
+    invalidate('ongoing')
+    for event_id in event_ids:
+        if event_id is not None:
+            invalidate('game', event_id, (versions or {}).get(event_id))
+
+# Writes of other replicas, announced on the score feed: they have already
+# invalidated the shared cache tier, but not this process's entries
+def drop_remote_update(delta):
+    drop_cached_events([delta["game_id"]], local=True)
+
+def invalidate_event(event_id, version=None):
+    return invalidate_events([event_id], {event_id: version})
+
+def _validate_score_update(inc, set_fields):
+    if not inc and not set_fields:
+        raise ValueError("Nothing to update")
+    for field, value in inc.items():
+        if field not in SCORE_FIELDS:
+            raise ValueError(f"Cannot increment {field}")
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"Increment for {field} must be an integer")
+    for field, value in set_fields.items():
+        if field not in SETTABLE_FIELDS:
+            raise ValueError(f"Cannot set {field}")
+        if field in SCORE_FIELDS and (not isinstance(value, int) or isinstance(value, bool)):
+            raise ValueError(f"{field} must be an integer")
+        if field in inc:
+            raise ValueError(f"{field} cannot be incremented and set in the same update")
+
+# Applies the update atomically and returns the new document in the same round
+# trip, or None when the game does not exist. Raises ValueError on bad input.
+def update_score(game_id, inc, set_fields):
+    game = db.events.find_one_and_update(
+        {"event_id": game_id},
+        score_update_document(inc, set_fields),
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if game is None:
+        return None
+
+    seq = invalidate_event(game_id)
+    score_updated(game, list(inc) + list(set_fields), seq)
+    return game
+
+def score_update_document(inc, set_fields):
+    _validate_score_update(inc, set_fields)
+    update = {"$inc": dict(inc, version=1)}
+    if set_fields:
+        update["$set"] = set_fields
+    return update
+
+def score_updated(game, changed_fields, seq):
+    # The new state is already at hand, so refresh the cache instead of
+    # letting the next reader go back to the database.
+    cache.set('game', game["event_id"], (game["version"], game_payload(game)))
+    ongoing_view.apply(game)
+    score_feed.publish({
+        "game_id": game["event_id"],
+        "version": game["version"],
+        "seq": seq,
+        "sport_category": game.get("sport_category"),
+        "changes": {field: game.get(field) for field in changed_fields}
+    })
+
+def conditional_json(etag, data):
+    # Strong ETag; a matching If-None-Match is answered before the body is built.
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify({"status": "success", "data": data})
+    response.set_etag(etag)
+    return response
 
 # Start gRPC server
 def serve_grpc():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=GRPC_MAX_WORKERS),
+                         interceptors=[MetricsInterceptor(),
+                                       AdmissionInterceptor(limiter, RETRY_AFTER_SECONDS, UNLIMITED_RPCS),
+                                       LoadInterceptor(load_tracker, CONTROL_RPCS)],
+                         options=GRPC_SERVER_OPTIONS)
     sports_service_pb2_grpc.add_SportsServiceServicer_to_server(SportsService(), server)
     server.add_insecure_port('[::]:50051')
     print("Starting gRPC SportsService on port 50051...")
     server.start()
+    if threading.current_thread() is threading.main_thread():
+        # Running as a 'grpc' process: stop accepting calls on SIGTERM and let
+        # the ones in flight finish
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: server.stop(GRPC_SHUTDOWN_GRACE))
     server.wait_for_termination()
 
+def overloaded_response():
+    REQUESTS_REJECTED.labels('http').inc()
+    response = jsonify({"status": "error", "message": OVERLOAD_MESSAGE})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response
+
+def limiter_for(path):
+    return SEPARATELY_LIMITED_PATHS.get(path) or limiter
+
+def release_request(admitted):
+    route_limiter, started = admitted
+    route_limiter.release(load_tracker.finish(started))
+
+@app.before_request
+def admit_request():
+    if request.path in CONTROL_PATHS:
+        return None
+    route_limiter = limiter_for(request.path)
+    if not route_limiter.try_acquire():
+        return overloaded_response()
+    g.admitted = (route_limiter, load_tracker.start())
+
+# A streamed body is produced after teardown: the request keeps its slot until
+# the server closes the response
+@app.after_request
+def release_after_streaming(response):
+    if response.is_streamed and 'admitted' in g:
+        admitted = g.pop('admitted')
+        response.call_on_close(lambda: release_request(admitted))
+    return response
+
+@app.teardown_request
+def finish_request(exc):
+    admitted = g.pop('admitted', None)
+    if admitted is not None:
+        release_request(admitted)
+
 @app.route('/metrics', methods=['GET'])
 def metrics():
-    return Response(generate_latest(REGISTRY), mimetype="text/plain")
+    return Response(generate_latest(metrics_registry()), mimetype="text/plain")
 
 # Status Endpoint
 @app.route('/status', methods=['GET'])
 def status():
-    return jsonify({"status": "Sports Management Service is running"}), 200
+    load = load_tracker.snapshot()
+    return jsonify({"status": "Sports Management Service is running", "current_load": load["load"], "load": load}), 200
 
 # Get ongoing sports events
 @app.route('/api/sports/ongoing-events', methods=['GET'])
 def get_ongoing_events():
-    REQUEST_COUNT.labels(request.method, request.path).inc()
-    events = list(db.events.find({"event_status": "ongoing"}))
-    events_data = [{"sport_category": event['sport_category'], "team_1": event['team_1'], 
-                    "team_2": event['team_2'], "score_team_1": event['score_team_1'], 
-                    "score_team_2": event['score_team_2']} for event in events]
-    return jsonify({"status": "success", "data": events_data}), 200
+    # Streaming is meant for listings too large to buffer, so it bypasses the cache.
+    if wants_stream():
+        return stream_response(db.events.find({"event_status": "ongoing"}, ONGOING_EVENT_PROJECTION))
+    version, events_data = ongoing_view.listing() or cache.get_or_load('ongoing', 'all', load_ongoing_events)
+    return conditional_json(make_etag('ongoing', version), events_data)
 
 # Add a new sports event
 @app.route('/api/sports/events', methods=['POST'])
@@ -82,46 +791,187 @@ def add_event():
     if 'event_id' not in event_data:
         return jsonify({"status": "error", "message": "event_id is required"}), 400
     
-    db.events.insert_one(event_data)
+    # New documents start at the current collection version rather than 1, so
+    # a game that is deleted and re-added never reuses an old ETag.
+    event_data['version'] = bump_collection_version(db, 'events')
+    try:
+        db.events.insert_one(event_data)
+    except DuplicateKeyError:
+        return jsonify({"status": "error", "message": "event_id already exists"}), 409
+    known_games.add(event_data['event_id'])
+    bump_collection_version(db, EVENT_INSERTS_COUNTER)
+    ongoing_view.apply(event_data)
+    seq = invalidate_event(event_data['event_id'])
+    score_feed.publish(snapshot_delta(event_data, seq))
 
     return jsonify({"status": "success", "message": "Event added", "event_id": event_data['event_id']}), 201
 
+# Returns the parsed events keyed by position, plus per-item results for
+# records that were already rejected while parsing.
+def parse_bulk_body(mimetype, body):
+    if mimetype == NDJSON_MIMETYPE:
+        events, results = {}, {}
+        lines = [line for line in body.splitlines() if line.strip()]
+        for index, line in enumerate(lines):
+            try:
+                events[index] = json.loads(line)
+            except ValueError as e:
+                results[index] = {"index": index, "status": "error", "message": f"Invalid JSON: {str(e)}"}
+        return events, results
+
+    try:
+        events = json.loads(body)
+    except ValueError:
+        return None, None
+    if not isinstance(events, list):
+        return None, None
+    return dict(enumerate(events)), {}
+
+def split_bulk_events(events, results):
+    valid = []
+    for index, event in events.items():
+        if not isinstance(event, dict) or 'event_id' not in event:
+            results[index] = {"index": index, "status": "error", "message": "event_id is required"}
+        else:
+            valid.append((index, event))
+    return valid
+
+# Records the outcome of one insert_many chunk; the inserted games become
+# known to the game id filter right away.
+def bulk_chunk_results(chunk, failed, results):
+    for position, (index, event) in enumerate(chunk):
+        if position in failed:
+            results[index] = {"index": index, "status": "error", "event_id": event['event_id'], "message": failed[position]}
+        else:
+            results[index] = {"index": index, "status": "success", "event_id": event['event_id']}
+            known_games.add(event['event_id'])
+
+def bulk_response(results):
+    results = [results[index] for index in sorted(results)]
+    inserted = sum(1 for result in results if result["status"] == "success")
+    failed_count = len(results) - inserted
+    return {
+        "status": "success" if failed_count == 0 else "partial",
+        "inserted": inserted,
+        "failed": failed_count,
+        "results": results
+    }, 201 if failed_count == 0 else 207
+
+# Add many sports events in one request (JSON array or NDJSON body)
+@app.route('/api/sports/events:bulk', methods=['POST'])
+def add_events_bulk():
+    events, results = parse_bulk_body(request.mimetype, request.get_data(as_text=True))
+    if events is None:
+        return jsonify({"status": "error", "message": "Expected a JSON array or an NDJSON body"}), 400
+
+    valid = split_bulk_events(events, results)
+
+    if valid:
+        # One version for the whole batch is enough: it only has to be newer
+        # than any earlier incarnation of the same game.
+        version = bump_collection_version(db, 'events')
+        for start in range(0, len(valid), BULK_CHUNK_SIZE):
+            chunk = valid[start:start + BULK_CHUNK_SIZE]
+            for _, event in chunk:
+                event['version'] = version
+            # Unordered: Mongo keeps going past failed documents and reports
+            # them all at the end, indexed by position within the chunk.
+            try:
+                db.events.insert_many([event for _, event in chunk], ordered=False)
+                failed = {}
+            except BulkWriteError as e:
+                failed = {error['index']: error['errmsg'] for error in e.details.get('writeErrors', [])}
+            bulk_chunk_results(chunk, failed, results)
+
+        bump_collection_version(db, EVENT_INSERTS_COUNTER)
+        seq = invalidate_events([event['event_id'] for _, event in valid])
+        for index, event in valid:
+            if results[index]["status"] == "success":
+                ongoing_view.apply(event)
+                score_feed.publish(snapshot_delta(event, seq))
+
+    body, status_code = bulk_response(results)
+    return jsonify(body), status_code
+
+def parse_score_update(update_data):
+    if not isinstance(update_data, dict):
+        raise ValueError("Expected a JSON object")
+    inc = update_data.get("inc") or {}
+    set_fields = update_data.get("set") or {}
+    if not isinstance(inc, dict) or not isinstance(set_fields, dict):
+        raise ValueError("inc and set must be objects")
+    return inc, set_fields
+
+# Atomically update the score of a game.
+# Body: {"inc": {"score_team_1": 1}, "set": {"status": "second half"}}
+@app.route('/api/sports/games/<string:game_id>/score', methods=['PATCH'])
+def update_game_score(game_id):
+    try:
+        inc, set_fields = parse_score_update(request.get_json(silent=True))
+        game = update_score(game_id, inc, set_fields)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if game is None:
+        return jsonify({"status": "error", "message": "Game not found"}), 404
+
+    response = jsonify({"status": "success", "data": dict(game_payload(game), version=game["version"])})
+    response.set_etag(make_etag(game_id, game["version"]))
+    return response
+
 # Get sports categories
 @app.route('/api/sports/categories', methods=['GET'])
 def get_sports_categories():
-    categories = list(db.categories.find())
-    categories_data = [{"category_id": category["category_id"], "category_name": category["category_name"]} for category in categories]
+    if wants_stream():
+        return stream_response(db.categories.find({}, CATEGORY_PROJECTION))
+    categories_data = cache.get_or_load('categories', 'all', load_categories)
     return jsonify({"status": "success", "data": categories_data}), 200
 
 # Get details for a specific game
 @app.route('/api/sports/games/<string:game_id>', methods=['GET'])
 def get_game_details(game_id):
-    game = db.events.find_one({"event_id": game_id})
+    hot_keys.record('game', game_id)
+    game = ongoing_game(game_id)
+    if game is None and not known_missing(game_id):
+        game = cache.get_or_load('game', game_id, lambda: load_game(game_id))
     if game:
-        return jsonify({
-            "status": "success",
-            "data": {
-                "game_id": game.get("event_id", "Unknown"),
-                "team_1": game.get("team_1", "Unknown"),
-                "team_2": game.get("team_2", "Unknown"),
-                "score_team_1": game.get("score_team_1", 0),
-                "score_team_2": game.get("score_team_2", 0),
-                "status": game.get("status", "Unknown")
-            }
-        }), 200
+        version, game_data = game
+        return conditional_json(make_etag(game_id, version), game_data)
     return jsonify({"status": "error", "message": "Game not found"}), 404
 
 @app.route('/api/sports/events/<event_id>', methods=['DELETE'])
 def delete_event(event_id):
     try:
-        result = db.events.delete_one({"_id": ObjectId(event_id)})
-        if result.deleted_count > 0:
+        deleted = db.events.find_one_and_delete({"_id": ObjectId(event_id)}, projection=GAME_PROJECTION)
+        if deleted:
+            ongoing_view.remove(ObjectId(event_id))
+            seq = invalidate_event(deleted.get("event_id"), deleted.get("version"))
+            if deleted.get("event_id") is not None:
+                score_feed.publish(deleted_delta(deleted, seq))
             return jsonify({"status": "success", "message": "Event deleted successfully"}), 200
         else:
             return jsonify({"status": "error", "message": "Event not found"}), 404
     except Exception as e:
         return jsonify({"status": "error", "message": f"Failed to delete event: {str(e)}"}), 500
 
+# Most requested game ids and categories with their estimated request counts
+@app.route('/debug/hot-keys', methods=['GET'])
+def get_hot_keys():
+    return jsonify({"status": "success", "data": hot_keys_report(request.args.get('limit', 20, type=int))}), 200
+
+def hot_keys_report(limit):
+    return {namespace: [{"key": key, "count": count} for key, count in hot_keys.top(namespace, limit)]
+            for namespace in HOT_KEY_NAMESPACES}
+
+# Top slow Mongo query shapes: ?limit=20&sort=worst_ms|count|total_ms|mean_ms
+@app.route('/debug/slow-queries', methods=['GET'])
+def get_slow_queries():
+    sort = request.args.get('sort', 'worst_ms')
+    if sort not in SLOW_QUERY_SORT_KEYS:
+        return jsonify({"status": "error", "message": f"sort must be one of {', '.join(SLOW_QUERY_SORT_KEYS)}"}), 400
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({"status": "success", "threshold_ms": slow_queries.threshold_ms,
+                    "data": slow_queries.top(limit, sort)}), 200
+
 @app.route('/simulate-failure', methods=['GET'])
 def simulate_failure():
     should_fail = True
@@ -133,11 +983,91 @@ def simulate_failure():
 
 def run_flask():
     print("Starting Flask app on port 5001...")
-    app.run(host='0.0.0.0', port=5001)
+    # /status and /metrics get their own workers so they stay responsive when
+    # the API handlers are saturated
+    serve_lanes(app, '0.0.0.0', 5001, CONTROL_PATHS, 'sports')
+
+PREFORK_COMMAND = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']
+
+def run_prefork_http():
+    # gunicorn forks its workers, which is not safe in a process that already
+    # runs gRPC threads, so it gets a process of its own
+    print("Starting gunicorn prefork app on port 5001...")
+    subprocess.run(PREFORK_COMMAND, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+def run_async_http():
+    import asyncio
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    # async_app imports this module as `app`; make sure it gets this instance
+    # (with its cache and score feed) rather than a second copy of __main__.
+    sys.modules.setdefault('app', sys.modules[__name__])
+    from async_app import app as async_app
+
+    config = Config()
+    config.bind = ['0.0.0.0:5001']
+    print("Starting async (Quart on hypercorn) app on port 5001...")
+    # Runs outside the main thread, so hypercorn must not install signal handlers
+    asyncio.run(serve(async_app, config, shutdown_trigger=lambda: asyncio.Event().wait()))
+
+def run_grpc_aio():
+    # Same reason as in run_async_http: grpc_aio imports this module as `app`
+    sys.modules.setdefault('app', sys.modules[__name__])
+    from grpc_aio import serve_grpc_aio
+
+    serve_grpc_aio()
+
+def startup():
+    ensure_indexes(db)
+    seq = None
+    try:
+        seq = collection_version(db, 'events')
+    except PyMongoError as e:
+        print(f"WARNING: Score delta history disabled, watchers will always get snapshots: {e}")
+    score_feed.resync_listeners.append(resync_after_feed_gap)
+    score_feed.remote_listeners.append(drop_remote_update)
+    score_feed.start_history(seq)
+    if KNOWN_GAMES_FILTER_ENABLED:
+        # Games created by other replicas arrive through the score feed (with
+        # Redis) and the ongoing view's change stream
+        score_feed.subscribe(remember_game)
+        ongoing_view.insert_listeners.append(lambda event: known_games.add(event.get("event_id")))
+        known_games.start(db)
+    if ONGOING_VIEW_ENABLED:
+        ongoing_view.start(db)
+    hot_keys.start()
+    if HOT_KEYS_WARM_INTERVAL > 0:
+        threading.Thread(target=run_cache_warmer, name='cache-warmer', daemon=True).start()
+
+def run_role(role):
+    if role == 'supervisor':
+        from supervisor import supervise
+        supervise()
+    elif role == 'http' and HTTP_MODE == 'prefork':
+        # Nothing else runs here, so gunicorn can take over the process and
+        # receive the supervisor's signals itself
+        os.execv(sys.executable, PREFORK_COMMAND)
+    elif role == 'http':
+        startup()
+        {'async': run_async_http}.get(HTTP_MODE, run_flask)()
+    elif role == 'grpc':
+        startup()
+        if GRPC_MODE == 'aio':
+            run_grpc_aio()
+        else:
+            serve_grpc()
 
 if __name__ == '__main__':
-    flask_thread = threading.Thread(target=run_flask)
-    grpc_thread = threading.Thread(target=serve_grpc)
+    if PROCESS_ROLE != 'all':
+        run_role(PROCESS_ROLE)
+        sys.exit(0)
+
+    startup()
+
+    http_servers = {'async': run_async_http, 'prefork': run_prefork_http}
+    flask_thread = threading.Thread(target=http_servers.get(HTTP_MODE, run_flask))
+    grpc_thread = threading.Thread(target=run_grpc_aio if GRPC_MODE == 'aio' else serve_grpc)
 
     flask_thread.start()
     grpc_thread.start()
@@ -0,0 +1,348 @@
+# Asynchronous serving mode of the sports REST API: the same routes and
+# payloads as the Flask app in app.py, served by Quart on an ASGI server with
+# motor instead of blocking pymongo calls, so one process can hold thousands
+# of concurrent slow clients without a thread per request.
+#
+# Run with:  hypercorn async_app:app --bind 0.0.0.0:5001
+# or start app.py with SPORTS_HTTP_MODE=async.
+import asyncio
+import json
+from quart import Quart, jsonify, request, Response, g
+from quart.wrappers.response import IterableBody
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from prometheus_client import generate_latest
+from bloom import KNOWN_GAMES_FALSE_POSITIVES, EVENT_INSERTS_COUNTER
+from bson.objectid import ObjectId
+
+import app as sports
+from app import (cache, score_feed, load_tracker, limiter_for, release_request, CONTROL_PATHS, RETRY_AFTER_SECONDS, OVERLOAD_MESSAGE,
+                 ongoing_view, ongoing_game, known_games, known_missing, hot_keys, hot_keys_report,
+                 REQUESTS_REJECTED, GAME_PROJECTION, NDJSON_MIMETYPE, STREAM_BATCH_SIZE, BULK_CHUNK_SIZE,
+                 game_payload, snapshot_delta, deleted_delta, score_update_document, score_updated,
+                 drop_cached_events, parse_bulk_body, split_bulk_events, bulk_chunk_results, bulk_response,
+                 parse_score_update)
+from cache import TwoTierCache
+from indexes import ONGOING_EVENT_PROJECTION, CATEGORY_PROJECTION
+from instrumentation import instrument_quart
+from singleflight import AsyncSingleFlight
+from batch_loader import AsyncBatchLoader
+from mongo_monitoring import mongo_client_options
+from slow_queries import SLOW_QUERY_SORT_KEYS
+from versions import bump_collection_version_async, collection_version_async, make_etag
+
+app = Quart(__name__)
+instrument_quart(app)
+
+client = None
+db = None
+# Same as app.game_lookups and app.game_loader, for this event loop
+game_lookups = AsyncSingleFlight('game')
+
+
+@app.before_serving
+async def connect_mongo():
+    # motor binds to the running event loop, so the client is created here
+    # rather than at import time.
+    global client, db
+    client = AsyncIOMotorClient(sports.MONGO_URL, event_listeners=sports.MONGO_LISTENERS, **mongo_client_options())
+    db = client['sports_database']
+
+
+async def cached(namespace, key, loader):
+    found, value = await cache_lookup(namespace, key)
+    if found:
+        return value
+    value = await loader()
+    cache.set(namespace, key, value)
+    return value
+
+
+async def cache_lookup(namespace, key):
+    if not isinstance(cache, TwoTierCache):
+        return cache.get(namespace, key)
+    found, value = cache.get_local(namespace, key)
+    if found:
+        return found, value
+    # The Redis round trip blocks, so it runs off the event loop. Writes to
+    # the shared tier are queued and don't need this.
+    return await asyncio.get_running_loop().run_in_executor(None, cache.get_shared, namespace, key)
+
+
+async def load_ongoing_events():
+    version = await collection_version_async(db, 'events')
+    events = await db.events.find({"event_status": "ongoing"}, ONGOING_EVENT_PROJECTION).to_list(length=None)
+    return version, events
+
+
+async def load_categories():
+    return await db.categories.find({}, CATEGORY_PROJECTION).to_list(length=None)
+
+
+async def fetch_games(game_ids):
+    if len(game_ids) == 1:
+        game = await db.events.find_one({"event_id": game_ids[0]})
+        return {game_ids[0]: game} if game else {}
+    return {game["event_id"]: game async for game in db.events.find({"event_id": {"$in": game_ids}})}
+
+
+game_loader = AsyncBatchLoader('sports', 'game', fetch_games)
+
+
+async def load_game(game_id):
+    if known_missing(game_id):
+        return None
+    game = await game_lookups.do(game_id, lambda: game_loader.load(game_id))
+    if game is None and known_games.ready and known_games.might_exist(game_id):
+        KNOWN_GAMES_FALSE_POSITIVES.inc()
+    if not game:
+        return None
+    return game.get("version", 0), game_payload(game)
+
+
+async def invalidate_events(event_ids, versions=None):
+    seq = await bump_collection_version_async(db, 'events')
+    drop_cached_events(event_ids, versions)
+    return seq
+
+
+def wants_ndjson():
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def wants_stream():
+    return request.args.get('stream') == '1' or wants_ndjson()
+
+
+def stream_response(cursor):
+    cursor = cursor.batch_size(STREAM_BATCH_SIZE)
+    ndjson = wants_ndjson()
+
+    async def rows():
+        try:
+            if not ndjson:
+                yield '{"status":"success","data":['
+            separator = ''
+            async for row in cursor:
+                if ndjson:
+                    yield json.dumps(row, separators=(',', ':')) + '\n'
+                else:
+                    yield separator + json.dumps(row, separators=(',', ':'))
+                    separator = ','
+            if not ndjson:
+                yield ']}'
+        finally:
+            await cursor.close()
+
+    return Response(rows(), mimetype=NDJSON_MIMETYPE if ndjson else 'application/json')
+
+
+async def conditional_json(etag, data):
+    if request.if_none_match.contains_weak(etag):
+        response = Response('', status=304)
+    else:
+        response = jsonify({"status": "success", "data": data})
+    response.set_etag(etag)
+    return response
+
+
+def overloaded_response():
+    REQUESTS_REJECTED.labels('http').inc()
+    response = jsonify({"status": "error", "message": OVERLOAD_MESSAGE})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response
+
+
+class ReleasingBody(IterableBody):
+    """Streamed body that releases the request's limiter slot once it has
+    been sent, or abandoned."""
+
+    def __init__(self, body, admitted):
+        super().__init__(body.iter)
+        self.admitted = admitted
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        try:
+            await super().__aexit__(exc_type, exc_value, tb)
+        finally:
+            release_request(self.admitted)
+
+
+@app.before_request
+async def admit_request():
+    if request.path in CONTROL_PATHS:
+        return None
+    route_limiter = limiter_for(request.path)
+    if not route_limiter.try_acquire():
+        return overloaded_response()
+    g.admitted = (route_limiter, load_tracker.start())
+
+
+# As in app.py, a streamed body is sent after teardown and keeps the slot
+@app.after_request
+async def release_after_streaming(response):
+    if isinstance(response.response, IterableBody) and 'admitted' in g:
+        response.response = ReleasingBody(response.response, g.pop('admitted'))
+    return response
+
+
+@app.teardown_request
+async def finish_request(exc):
+    admitted = g.pop('admitted', None)
+    if admitted is not None:
+        release_request(admitted)
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    return Response(generate_latest(sports.metrics_registry()), mimetype="text/plain")
+
+
+@app.route('/status', methods=['GET'])
+async def status():
+    load = load_tracker.snapshot()
+    return jsonify({"status": "Sports Management Service is running", "current_load": load["load"], "load": load}), 200
+
+
+@app.route('/api/sports/ongoing-events', methods=['GET'])
+async def get_ongoing_events():
+    if wants_stream():
+        return stream_response(db.events.find({"event_status": "ongoing"}, ONGOING_EVENT_PROJECTION))
+    version, events_data = ongoing_view.listing() or await cached('ongoing', 'all', load_ongoing_events)
+    return await conditional_json(make_etag('ongoing', version), events_data)
+
+
+@app.route('/api/sports/events', methods=['POST'])
+async def add_event():
+    event_data = await request.get_json()
+
+    if 'event_id' not in event_data:
+        return jsonify({"status": "error", "message": "event_id is required"}), 400
+
+    event_data['version'] = await bump_collection_version_async(db, 'events')
+    try:
+        await db.events.insert_one(event_data)
+    except DuplicateKeyError:
+        return jsonify({"status": "error", "message": "event_id already exists"}), 409
+    known_games.add(event_data['event_id'])
+    await bump_collection_version_async(db, EVENT_INSERTS_COUNTER)
+    ongoing_view.apply(event_data)
+    seq = await invalidate_events([event_data['event_id']])
+    score_feed.publish(snapshot_delta(event_data, seq))
+
+    return jsonify({"status": "success", "message": "Event added", "event_id": event_data['event_id']}), 201
+
+
+@app.route('/api/sports/events:bulk', methods=['POST'])
+async def add_events_bulk():
+    events, results = parse_bulk_body(request.mimetype, await request.get_data(as_text=True))
+    if events is None:
+        return jsonify({"status": "error", "message": "Expected a JSON array or an NDJSON body"}), 400
+
+    valid = split_bulk_events(events, results)
+
+    if valid:
+        version = await bump_collection_version_async(db, 'events')
+        for start in range(0, len(valid), BULK_CHUNK_SIZE):
+            chunk = valid[start:start + BULK_CHUNK_SIZE]
+            for _, event in chunk:
+                event['version'] = version
+            try:
+                await db.events.insert_many([event for _, event in chunk], ordered=False)
+                failed = {}
+            except BulkWriteError as e:
+                failed = {error['index']: error['errmsg'] for error in e.details.get('writeErrors', [])}
+            bulk_chunk_results(chunk, failed, results)
+
+        await bump_collection_version_async(db, EVENT_INSERTS_COUNTER)
+        seq = await invalidate_events([event['event_id'] for _, event in valid])
+        for index, event in valid:
+            if results[index]["status"] == "success":
+                ongoing_view.apply(event)
+                score_feed.publish(snapshot_delta(event, seq))
+
+    body, status_code = bulk_response(results)
+    return jsonify(body), status_code
+
+
+@app.route('/api/sports/games/<string:game_id>/score', methods=['PATCH'])
+async def update_game_score(game_id):
+    try:
+        inc, set_fields = parse_score_update(await request.get_json(silent=True))
+        update = score_update_document(inc, set_fields)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    game = await db.events.find_one_and_update(
+        {"event_id": game_id},
+        update,
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if game is None:
+        return jsonify({"status": "error", "message": "Game not found"}), 404
+
+    seq = await invalidate_events([game_id])
+    score_updated(game, list(inc) + list(set_fields), seq)
+
+    response = jsonify({"status": "success", "data": dict(game_payload(game), version=game["version"])})
+    response.set_etag(make_etag(game_id, game["version"]))
+    return response
+
+
+@app.route('/api/sports/categories', methods=['GET'])
+async def get_sports_categories():
+    if wants_stream():
+        return stream_response(db.categories.find({}, CATEGORY_PROJECTION))
+    categories_data = await cached('categories', 'all', load_categories)
+    return jsonify({"status": "success", "data": categories_data}), 200
+
+
+@app.route('/api/sports/games/<string:game_id>', methods=['GET'])
+async def get_game_details(game_id):
+    hot_keys.record('game', game_id)
+    game = ongoing_game(game_id)
+    if game is None and not known_missing(game_id):
+        game = await cached('game', game_id, lambda: load_game(game_id))
+    if game:
+        version, game_data = game
+        return await conditional_json(make_etag(game_id, version), game_data)
+    return jsonify({"status": "error", "message": "Game not found"}), 404
+
+
+@app.route('/api/sports/events/<event_id>', methods=['DELETE'])
+async def delete_event(event_id):
+    try:
+        deleted = await db.events.find_one_and_delete({"_id": ObjectId(event_id)}, projection=GAME_PROJECTION)
+        if deleted:
+            ongoing_view.remove(ObjectId(event_id))
+            seq = await invalidate_events([deleted.get("event_id")], {deleted.get("event_id"): deleted.get("version")})
+            if deleted.get("event_id") is not None:
+                score_feed.publish(deleted_delta(deleted, seq))
+            return jsonify({"status": "success", "message": "Event deleted successfully"}), 200
+        else:
+            return jsonify({"status": "error", "message": "Event not found"}), 404
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Failed to delete event: {str(e)}"}), 500
+
+
+@app.route('/debug/hot-keys', methods=['GET'])
+async def get_hot_keys():
+    return jsonify({"status": "success", "data": hot_keys_report(request.args.get('limit', 20, type=int))}), 200
+
+
+@app.route('/debug/slow-queries', methods=['GET'])
+async def get_slow_queries():
+    sort = request.args.get('sort', 'worst_ms')
+    if sort not in SLOW_QUERY_SORT_KEYS:
+        return jsonify({"status": "error", "message": f"sort must be one of {', '.join(SLOW_QUERY_SORT_KEYS)}"}), 400
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({"status": "success", "threshold_ms": sports.slow_queries.threshold_ms,
+                    "data": sports.slow_queries.top(limit, sort)}), 200
+
+
+@app.route('/simulate-failure', methods=['GET'])
+async def simulate_failure():
+    return jsonify({"success": False, "message": "Simulated failure"}), 500
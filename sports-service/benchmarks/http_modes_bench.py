@@ -0,0 +1,102 @@
+# Head-to-head load test of the Flask (threaded) and the async (Quart on
+# hypercorn with motor) serving modes of the sports REST API.
+#
+# Start the service twice against the same MongoDB, e.g.
+#   SPORTS_HTTP_MODE=flask python app.py            (port 5001)
+#   hypercorn async_app:app --bind 0.0.0.0:5011
+# then run
+#   python benchmarks/http_modes_bench.py --flask-url http://localhost:5001 --async-url http://localhost:5011
+#
+# Every simulated client keeps its own connection open (reconnecting when the
+# server closes it, as the Werkzeug server does after every response) and,
+# with --think-time, idles between requests like a slow polling client.
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def _request(reader, writer, host, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed by server")
+    length = 0
+    keep_alive = True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+        elif name.lower() == 'connection' and value.strip().lower() == 'close':
+            keep_alive = False
+    await reader.readexactly(length)
+    return int(status_line.split()[1]), keep_alive
+
+
+async def _client(base_url, path, deadline, think_time, latencies, errors):
+    url = urlsplit(base_url)
+    writer = None
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+                status, keep_alive = await _request(reader, writer, url.netloc, path)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                errors.append('io')
+                return
+            if not keep_alive:
+                writer.close()
+                writer = None
+            if status >= 500:
+                errors.append(status)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if think_time:
+                await asyncio.sleep(think_time)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def run_load(base_url, path, concurrency, duration, think_time):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*[_client(base_url, path, deadline, think_time, latencies, errors)
+                           for _ in range(concurrency)])
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flask vs. async serving mode load test')
+    parser.add_argument('--flask-url', default='http://localhost:5001')
+    parser.add_argument('--async-url', default='http://localhost:5011')
+    parser.add_argument('--path', default='/api/sports/ongoing-events')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--think-time', type=float, default=0.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':>6} {'clients':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for concurrency in args.concurrency:
+        for mode, base_url in (('flask', args.flask_url), ('async', args.async_url)):
+            latencies, errors = asyncio.run(run_load(base_url, args.path, concurrency, args.duration, args.think_time))
+            print(f"{mode:>6} {concurrency:>8} {len(latencies) / args.duration:>9.0f} "
+                  f"{statistics.median(latencies) if latencies else float('nan'):>8.1f} "
+                  f"{percentile(latencies, 0.99):>8.1f} {len(errors):>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Compares the old collection-scan read of ongoing events with the covered,
+# projected query served by the event_status index.
+#
+# Usage (needs a running MongoDB, uses its own scratch database):
+#   python benchmarks/ongoing_events_bench.py --mongo-uri mongodb://localhost:27017/ --sizes 10000 100000 1000000
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from indexes import ONGOING_EVENTS_INDEX, ONGOING_EVENT_PROJECTION, ensure_indexes
+
+CATEGORIES = ["football", "tennis", "basketball", "hockey", "volleyball"]
+STATUSES = ["ongoing", "scheduled", "finished", "finished", "finished"]
+INSERT_BATCH = 10000
+
+
+def seed(db, size):
+    db.events.drop()
+    batch = []
+    for i in range(size):
+        batch.append({
+            "event_id": f"evt-{i}",
+            "sport_category": random.choice(CATEGORIES),
+            "team_1": f"team-{random.randint(0, 500)}",
+            "team_2": f"team-{random.randint(0, 500)}",
+            "score_team_1": random.randint(0, 5),
+            "score_team_2": random.randint(0, 5),
+            "event_status": random.choice(STATUSES),
+            "status": "Unknown",
+            # Padding that the endpoint never returns, like real feed payloads.
+            "commentary": "x" * 512,
+        })
+        if len(batch) == INSERT_BATCH:
+            db.events.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db.events.insert_many(batch, ordered=False)
+
+
+def full_scan(db):
+    # The original read path: no projection and no usable index.
+    events = list(db.events.find({"event_status": "ongoing"}).hint([("$natural", 1)]))
+    return [{"sport_category": event['sport_category'], "team_1": event['team_1'],
+             "team_2": event['team_2'], "score_team_1": event['score_team_1'],
+             "score_team_2": event['score_team_2']} for event in events]
+
+
+def covered(db):
+    return list(db.events.find({"event_status": "ongoing"}, ONGOING_EVENT_PROJECTION).hint(ONGOING_EVENTS_INDEX))
+
+
+def measure(fn, db, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(db)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def explain_stats(cursor):
+    stats = cursor.explain()["executionStats"]
+    return stats["totalDocsExamined"], stats["totalKeysExamined"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scan vs. covered query latency for ongoing events')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--database', default='sports_benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri)[args.database]
+
+    print(f"{'events':>10} {'scan p50 ms':>12} {'scan max ms':>12} {'docs':>9} "
+          f"{'covered p50 ms':>15} {'covered max ms':>15} {'docs':>6} {'keys':>9}")
+    for size in args.sizes:
+        seed(db, size)
+        db.events.drop_indexes()
+        scan_p50, scan_max = measure(full_scan, db, args.runs)
+        scan_docs, _ = explain_stats(db.events.find({"event_status": "ongoing"}).hint([("$natural", 1)]))
+
+        ensure_indexes(db)
+        covered_p50, covered_max = measure(covered, db, args.runs)
+        covered_docs, covered_keys = explain_stats(
+            db.events.find({"event_status": "ongoing"}, ONGOING_EVENT_PROJECTION).hint(ONGOING_EVENTS_INDEX))
+
+        print(f"{size:>10} {scan_p50:>12.1f} {scan_max:>12.1f} {scan_docs:>9} "
+              f"{covered_p50:>15.1f} {covered_max:>15.1f} {covered_docs:>6} {covered_keys:>9}")
+
+    db.client.drop_database(args.database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from prometheus_client import Counter, Gauge
+from pymongo.errors import PyMongoError
+from versions import collection_version
+
+KNOWN_GAMES_FALSE_POSITIVE_RATE = Gauge('sports_known_games_false_positive_rate',
+                                        'Estimated false positive rate of the known game id filter',
+                                        multiprocess_mode='liveall')
+KNOWN_GAMES_ENTRIES = Gauge('sports_known_games_entries', 'Game ids added to the known game id filter',
+                            multiprocess_mode='liveall')
+KNOWN_GAMES_REJECTED = Counter('sports_known_games_rejected_total',
+                               'Game lookups answered as not found by the filter without a query')
+KNOWN_GAMES_UNCONFIRMED = Counter('sports_known_games_unconfirmed_total',
+                                   'Game lookups rejected by the filter that were still sent to Mongo, because '
+                                   'games inserted by other replicas may be missing from it')
+KNOWN_GAMES_FALSE_POSITIVES = Counter('sports_known_games_false_positives_total',
+                                      'Game lookups the filter let through that found nothing')
+
+# Set KNOWN_GAMES_FILTER=0 to send every game lookup to Mongo again
+KNOWN_GAMES_FILTER_ENABLED = os.environ.get('KNOWN_GAMES_FILTER', '1') != '0'
+KNOWN_GAMES_CAPACITY = int(os.environ.get('KNOWN_GAMES_CAPACITY', 100000))
+KNOWN_GAMES_ERROR_RATE = float(os.environ.get('KNOWN_GAMES_ERROR_RATE', 0.01))
+# Deleted games stay in the filter until the next rebuild, in seconds
+KNOWN_GAMES_REBUILD_INTERVAL = float(os.environ.get('KNOWN_GAMES_REBUILD_INTERVAL', 300))
+KNOWN_GAMES_RETRY_INTERVAL = 5
+# How often, in seconds, the insert counter is read to find out whether the
+# filter is still complete
+KNOWN_GAMES_CHECK_INTERVAL = float(os.environ.get('KNOWN_GAMES_CHECK_INTERVAL', 1))
+# Counter (in `counters`, like the collection versions) bumped after every
+# insert into events. Score updates bump the events version, not this one.
+EVENT_INSERTS_COUNTER = 'event_inserts'
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives.
+
+    Sized for `capacity` keys at `error_rate`; the k bit positions of a key
+    come from one blake2b digest by double hashing.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+        self._bits_set = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(str(key).encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not self._bits[byte] & mask:
+                self._bits[byte] |= mask
+                self._bits_set += 1
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def false_positive_rate(self):
+        # Chance that all k positions of an unknown key are set
+        return (self._bits_set / self.size) ** self.hashes
+
+
+class KnownGames:
+    """Bloom filter of the event_ids in the events collection.
+
+    Built at start and rebuilt every `rebuild_interval` seconds, which is
+    when deleted games drop out. New games are added as they are written
+    here or announced by other replicas on the score feed. Until the first
+    build has finished every id may exist. `request_rebuild` asks for an
+    early rebuild.
+
+    Other replicas announce their games at most once, so the filter can miss
+    some. Its negatives are only trusted (`rules_out`) while every insert
+    since the build is known to have been added: while the ongoing view
+    follows a change stream opened before the build, or, without change
+    streams, while the insert counter (read every `check_interval` seconds)
+    hasn't moved since the build. When it moves the filter is rebuilt.
+    """
+
+    def __init__(self, capacity=KNOWN_GAMES_CAPACITY, error_rate=KNOWN_GAMES_ERROR_RATE,
+                 rebuild_interval=KNOWN_GAMES_REBUILD_INTERVAL, check_interval=KNOWN_GAMES_CHECK_INTERVAL):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self.check_interval = check_interval
+        self._filter = None
+        # Events version and insert count read just before the last build
+        # scanned the collection, and the insert count last read
+        self.built_version = None
+        self.built_inserts = None
+        self.inserts = None
+        # Ids added while a rebuild reads the collection, replayed into the new filter
+        self._added_during_rebuild = None
+        self._lock = threading.Lock()
+        self._rebuild_requested = threading.Event()
+
+    @property
+    def ready(self):
+        return self._filter is not None
+
+    def might_exist(self, event_id):
+        bloom = self._filter
+        return bloom is None or event_id in bloom
+
+    def rules_out(self, event_id, complete_since):
+        """True when `event_id` is certainly not a game. `complete_since` is
+        the events version from which every insert has been passed to `add`,
+        or None when that isn't known."""
+        if self.might_exist(event_id):
+            return False
+        if self.covers(complete_since):
+            KNOWN_GAMES_REJECTED.inc()
+            return True
+        KNOWN_GAMES_UNCONFIRMED.inc()
+        return False
+
+    def covers(self, complete_since):
+        if self.built_inserts is not None and self.inserts == self.built_inserts:
+            return True
+        built_version = self.built_version
+        if complete_since is None or built_version is None:
+            return False
+        if built_version >= complete_since:
+            return True
+        # Built before the inserts were followed: a new build will be covered
+        self.request_rebuild()
+        return False
+
+    def add(self, event_id):
+        if event_id is None:
+            return
+        with self._lock:
+            if self._added_during_rebuild is not None:
+                self._added_during_rebuild.append(event_id)
+            if self._filter is not None:
+                self._filter.add(event_id)
+                self._export(self._filter)
+
+    def start(self, db):
+        threading.Thread(target=self._run, args=(db,), name='known-games', daemon=True).start()
+
+    def request_rebuild(self):
+        self._rebuild_requested.set()
+
+    def rebuild(self, db):
+        with self._lock:
+            self._added_during_rebuild = []
+        try:
+            version = collection_version(db, 'events')
+            inserts = collection_version(db, EVENT_INSERTS_COUNTER)
+            event_ids = [event["event_id"] for event in db.events.find({"event_id": {"$exists": True}},
+                                                                        {"_id": 0, "event_id": 1})]
+        except BaseException:
+            with self._lock:
+                self._added_during_rebuild = None
+            raise
+        # Room to grow until the next rebuild
+        bloom = BloomFilter(max(self.capacity, 2 * len(event_ids)), self.error_rate)
+        for event_id in event_ids:
+            bloom.add(event_id)
+        with self._lock:
+            for event_id in self._added_during_rebuild:
+                bloom.add(event_id)
+            self._added_during_rebuild = None
+            self._filter = bloom
+            self.built_version = version
+            self.built_inserts = self.inserts = inserts
+            self._export(bloom)
+
+    def check(self, db):
+        """Reads the insert counter; asks for a rebuild if it has moved."""
+        try:
+            self.inserts = collection_version(db, EVENT_INSERTS_COUNTER)
+        except BaseException:
+            self.inserts = None
+            raise
+        if self.inserts != self.built_inserts:
+            self.request_rebuild()
+
+    def _export(self, bloom):
+        KNOWN_GAMES_ENTRIES.set(bloom.count)
+        KNOWN_GAMES_FALSE_POSITIVE_RATE.set(bloom.false_positive_rate())
+
+    def _run(self, db):
+        rebuilt_at = None
+        while True:
+            try:
+                if (rebuilt_at is None or self._rebuild_requested.is_set()
+                        or time.monotonic() - rebuilt_at >= self.rebuild_interval):
+                    self._rebuild_requested.clear()
+                    self.rebuild(db)
+                    rebuilt_at = time.monotonic()
+                else:
+                    self.check(db)
+            except PyMongoError as e:
+                print(f"WARNING: Failed to update the known game id filter: {e}")
+                time.sleep(KNOWN_GAMES_RETRY_INTERVAL)
+                continue
+            self._rebuild_requested.wait(self.check_interval)
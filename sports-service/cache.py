@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import OrderedDict
+from prometheus_client import Counter, Gauge
+from batch_loader import BatchLoader
+
+CACHE_HITS = Counter('sports_cache_hits_total', 'Number of cache hits', ['namespace'])
+CACHE_MISSES = Counter('sports_cache_misses_total', 'Number of cache misses', ['namespace'])
+CACHE_EVICTIONS = Counter('sports_cache_evictions_total', 'Number of entries evicted to stay within the size bound')
+CACHE_ENTRIES = Gauge('sports_cache_entries', 'Number of entries currently held in the cache')
+CACHE_PINNED = Gauge('sports_cache_pinned', 'Number of keys pinned in the cache', ['namespace'])
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire after a per-namespace TTL.
+
+    Keys are (namespace, key) pairs so that each endpoint can have its own TTL
+    and can be invalidated on its own. Pinned keys are never evicted to make
+    room; they still expire and are invalidated like any other entry.
+    """
+
+    def __init__(self, maxsize, ttls):
+        self.maxsize = maxsize
+        self.ttls = ttls
+        self._entries = OrderedDict()
+        self._pinned = set()
+        self._lock = threading.Lock()
+
+    def set(self, namespace, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttls[namespace] if ttl is None else ttl)
+        with self._lock:
+            self._entries[(namespace, key)] = (expires_at, value)
+            self._entries.move_to_end((namespace, key))
+            if len(self._entries) > self.maxsize:
+                self._evict()
+            CACHE_ENTRIES.set(len(self._entries))
+
+    def _evict(self):
+        # Least recently used first, passing over pinned keys
+        excess = len(self._entries) - self.maxsize
+        victims = []
+        for entry_key in self._entries:
+            if entry_key not in self._pinned:
+                victims.append(entry_key)
+                if len(victims) == excess:
+                    break
+        for entry_key in victims:
+            del self._entries[entry_key]
+            CACHE_EVICTIONS.inc()
+
+    def get(self, namespace, key):
+        """Returns (found, value) and counts the lookup as a hit or a miss."""
+        value = self._lookup(namespace, key)
+        if value is _MISSING:
+            CACHE_MISSES.labels(namespace).inc()
+            return False, None
+        CACHE_HITS.labels(namespace).inc()
+        return True, value
+
+    def get_or_load(self, namespace, key, loader):
+        """Read-through lookup: on a miss `loader()` is called and its result cached.
+
+        `None` results are cached as well, so repeated lookups of unknown keys
+        don't reach the database either.
+        """
+        found, value = self.get(namespace, key)
+        if found:
+            return value
+        value = loader()
+        self.set(namespace, key, value)
+        return value
+
+    def expires_in(self, namespace, key):
+        """Seconds until the entry expires, or None if there is no entry."""
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+        return None if entry is None else entry[0] - time.monotonic()
+
+    def pin(self, namespace, keys):
+        """Makes `keys` the pinned keys of `namespace`."""
+        with self._lock:
+            self._pinned = {k for k in self._pinned if k[0] != namespace} | {(namespace, key) for key in keys}
+        CACHE_PINNED.labels(namespace).set(len(keys))
+
+    def invalidate(self, namespace, key=None, version=None):
+        """Drop one entry, or every entry of the namespace when no key is given.
+
+        `version` is only used by the shared tier of TwoTierCache.
+        """
+        with self._lock:
+            if key is not None:
+                self._entries.pop((namespace, key), None)
+            else:
+                for entry_key in [k for k in self._entries if k[0] == namespace]:
+                    del self._entries[entry_key]
+            CACHE_ENTRIES.set(len(self._entries))
+
+    def invalidate_local(self, namespace, key=None, version=None):
+        """Like invalidate, but leaves the shared tier of a TwoTierCache alone."""
+        TTLCache.invalidate(self, namespace, key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            CACHE_ENTRIES.set(0)
+
+    def _lookup(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[(namespace, key)]
+                CACHE_ENTRIES.set(len(self._entries))
+                return _MISSING
+            self._entries.move_to_end((namespace, key))
+            return value
+
+
+class TwoTierCache(TTLCache):
+    """TTLCache in front of a SharedCache (shared_cache.py).
+
+    The per-process LRU answers first; its misses are looked up in the
+    shared tier, with the lookups of concurrent threads batched into one
+    pipeline, and hits are kept locally for what is left of their TTL.
+    Writes (except of None, a miss) and invalidations go to both tiers, so
+    a replica that starts with an empty LRU serves what the others have
+    already loaded.
+
+    Values of the `versioned` namespaces are (version, data) pairs; their
+    version goes to the shared tier with them, which keeps an older value
+    from replacing a newer one (see SharedCache).
+    """
+
+    def __init__(self, maxsize, ttls, shared, versioned=()):
+        super().__init__(maxsize, ttls)
+        self.shared = shared
+        self.versioned = frozenset(versioned)
+        self._shared_lookups = BatchLoader('sports', 'shared_cache', shared.get_many)
+
+    def get(self, namespace, key):
+        found, value = self.get_local(namespace, key)
+        if found:
+            return True, value
+        return self.get_shared(namespace, key)
+
+    def get_local(self, namespace, key):
+        return super().get(namespace, key)
+
+    def get_shared(self, namespace, key):
+        entry = self._shared_lookups.load((namespace, key))
+        if entry is None:
+            return False, None
+        value, written_at = entry
+        remaining = self.ttls[namespace] - (time.time() - written_at)
+        if remaining <= 0:
+            # Redis expires keys in whole seconds, so it can return an entry
+            # that is already past its TTL
+            return False, None
+        super().set(namespace, key, value, ttl=remaining)
+        return True, value
+
+    def set(self, namespace, key, value, ttl=None):
+        super().set(namespace, key, value, ttl)
+        # A miss stays local: shared, it would hide a game created meanwhile
+        # from every replica until it expired
+        if value is not None:
+            self.shared.set(namespace, key, value, value[0] if namespace in self.versioned else None)
+
+    def invalidate(self, namespace, key=None, version=None):
+        super().invalidate(namespace, key)
+        if key is None:
+            self.shared.invalidate_namespace(namespace)
+        else:
+            self.shared.delete(namespace, key, version)
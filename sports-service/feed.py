@@ -0,0 +1,299 @@
+import heapq
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from prometheus_client import Counter
+
+DELTAS_PUBLISHED = Counter('sports_score_deltas_published_total', 'Number of score deltas published')
+DELTAS_DROPPED = Counter('sports_score_deltas_dropped_total',
+                         'Number of score deltas not relayed to Redis, because the relay queue was full or Redis failed')
+DELTAS_RECEIVED = Counter('sports_score_deltas_received_total', 'Number of score deltas received from other replicas')
+
+# Comma separated host:port list of the Redis cluster. When unset, deltas are
+# only delivered to subscribers inside this process.
+REDIS_STARTUP_NODES = os.environ.get('REDIS_STARTUP_NODES', '')
+SCORE_DELTA_CHANNEL = os.environ.get('SCORE_DELTA_CHANNEL', 'score_deltas')
+RELAY_QUEUE_SIZE = 10000
+# Delay before reconnecting to Redis, in seconds, doubled after every failure
+RECONNECT_INITIAL_DELAY = 1
+RECONNECT_MAX_DELAY = 30
+# Number of recent deltas kept so that watchers can resume after a reconnect
+HISTORY_SIZE = int(os.environ.get('SCORE_DELTA_HISTORY', 5000))
+# How long a delta is held back, in milliseconds, while a lower seq may still
+# arrive; 0 dispatches every delta as it comes
+REORDER_WINDOW = float(os.environ.get('SCORE_DELTA_REORDER_MS', 50)) / 1000
+
+
+def encode_delta(delta):
+    return json.dumps(delta, separators=(',', ':'))
+
+
+def redis_client(startup_nodes, decode_responses=True, **options):
+    from rediscluster import RedisCluster
+
+    nodes = []
+    for node in startup_nodes.split(','):
+        host, _, port = node.strip().partition(':')
+        nodes.append({"host": host, "port": port or "6379"})
+    return RedisCluster(startup_nodes=nodes, decode_responses=decode_responses, **options)
+
+
+class ScoreFeed:
+    """Fan-out of score deltas.
+
+    In-process subscribers are called synchronously from `publish`, so they
+    must not block. Deltas are also relayed to a Redis channel from a
+    background thread, for consumers outside this process such as the
+    websocket service, and deltas published by other replicas are picked up
+    from the same channel.
+
+    Every delta carries `seq`, the events collection version after the write.
+    The feed remembers the last HISTORY_SIZE deltas; all deltas with a seq
+    above `horizon` are in that history, so a watcher that last saw seq N can
+    resume without a gap as long as N >= horizon.
+
+    Seqs are taken after the write, so concurrent writers (and other
+    replicas, through Redis) deliver them out of order. A delta that skips a
+    seq is held back for up to REORDER_WINDOW, and released in seq order as
+    soon as the gap is filled. Some seqs are never published at all (a
+    failed insert, the version of a new game), so the window does expire.
+    A delta that still arrives below the highest seq dispatched may have
+    been missed by watchers that already saw that seq: the horizon moves
+    above it, and those watchers get a snapshot when they resume.
+
+    Redis pub/sub delivers at most once: when the subscription to the channel
+    drops, deltas published meanwhile by other replicas are lost. After
+    resubscribing the feed calls `resynchronise`: resuming is disabled until
+    the next delta, open subscribers with a `resync` method are told to start
+    over, and each of `resync_listeners` is called.
+
+    Deltas received from other replicas are first passed to each of
+    `remote_listeners`, so that they can drop what those writes made stale
+    before any subscriber sees them.
+    """
+
+    def __init__(self, redis_startup_nodes=REDIS_STARTUP_NODES, channel=SCORE_DELTA_CHANNEL, history_size=HISTORY_SIZE):
+        self.channel = channel
+        self.origin = uuid.uuid4().hex[:8]
+        self._redis_startup_nodes = redis_startup_nodes
+        self._subscribers = []
+        self._history = deque()
+        self._history_size = history_size
+        # Nothing is known to be complete until start_history is called
+        self._horizon = None
+        # Set after a gap: the next delta dispatched becomes the horizon
+        self._restart_horizon = False
+        # Highest seq dispatched, and the deltas held back above a gap after it
+        self._last_seq = None
+        self._held = []
+        self._held_order = itertools.count()
+        self._reorder_thread = None
+        self._lock = threading.Lock()
+        self._held_changed = threading.Condition(self._lock)
+        # Keeps subscribers seeing deltas in the order of the history
+        self._deliver_lock = threading.Lock()
+        self._relay_queue = None
+        self.resync_listeners = []
+        self.remote_listeners = []
+
+    def start_history(self, seq):
+        """Marks the history as complete from `seq` on (None leaves resuming
+        disabled) and starts listening for deltas from other replicas."""
+        with self._lock:
+            self._horizon = seq
+            self._last_seq = seq
+        if self._redis_startup_nodes:
+            threading.Thread(target=self._listen_worker, daemon=True).start()
+
+    def subscribe(self, callback):
+        return self.subscribe_from(None, callback)[1]
+
+    def subscribe_from(self, since_seq, callback, predicate=None):
+        """Subscribes `callback` and returns (backlog, unsubscribe).
+
+        The backlog holds the buffered deltas with a seq above `since_seq`
+        that match `predicate`, or is None when the history no longer reaches
+        back that far. Subscribing and taking the backlog happen under the
+        same lock as publishing, so no delta is missed or delivered twice.
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+            backlog = None
+            if since_seq is not None and self._horizon is not None and since_seq >= self._horizon:
+                backlog = [delta for delta in self._history
+                           if delta["seq"] > since_seq and (predicate is None or predicate(delta))]
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return backlog, unsubscribe
+
+    def publish(self, delta):
+        DELTAS_PUBLISHED.inc()
+        self._dispatch(delta)
+        if self._redis_startup_nodes:
+            self._relay(delta)
+
+    def _dispatch(self, delta):
+        with self._deliver_lock:
+            with self._lock:
+                ready = self._order(delta)
+            for delta in ready:
+                self._deliver(delta)
+
+    def _order(self, delta):
+        # Returns the deltas that can go out now, in order
+        seq = delta["seq"]
+        if self._last_seq is not None and seq <= self._last_seq:
+            if self._horizon is not None:
+                self._horizon = max(self._horizon, self._last_seq + 1)
+            return [delta]
+        if self._last_seq is not None and seq > self._last_seq + 1 and REORDER_WINDOW > 0:
+            heapq.heappush(self._held, (seq, next(self._held_order), time.monotonic() + REORDER_WINDOW, delta))
+            if self._reorder_thread is None:
+                self._reorder_thread = threading.Thread(target=self._reorder_worker, name='score-feed-reorder',
+                                                        daemon=True)
+                self._reorder_thread.start()
+            self._held_changed.notify()
+            return []
+        self._last_seq = seq
+        return [delta] + self._release_held(None)
+
+    def _release_held(self, up_to):
+        # Held deltas up to seq `up_to`, then those following on without a gap
+        ready = []
+        while self._held and ((up_to is not None and self._held[0][0] <= up_to)
+                              or self._held[0][0] <= self._last_seq + 1):
+            seq, _, _, delta = heapq.heappop(self._held)
+            self._last_seq = max(self._last_seq, seq)
+            ready.append(delta)
+        return ready
+
+    def _reorder_worker(self):
+        while True:
+            with self._lock:
+                while True:
+                    now = time.monotonic()
+                    expired = [seq for seq, _, deadline, _ in self._held if deadline <= now]
+                    if expired:
+                        break
+                    deadlines = [deadline for _, _, deadline, _ in self._held]
+                    self._held_changed.wait(min(deadlines) - now if deadlines else None)
+            with self._deliver_lock:
+                with self._lock:
+                    ready = self._release_held(max(expired))
+                for delta in ready:
+                    self._deliver(delta)
+
+    def _deliver(self, delta):
+        with self._lock:
+            self._history.append(delta)
+            if self._restart_horizon:
+                self._horizon = delta["seq"]
+                self._restart_horizon = False
+            if len(self._history) > self._history_size:
+                evicted = self._history.popleft()
+                if self._horizon is not None:
+                    self._horizon = max(self._horizon, evicted["seq"])
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(delta)
+            except Exception as e:
+                print(f"WARNING: Score delta subscriber failed: {e}")
+
+    def resynchronise(self):
+        """Called when deltas from other replicas may have been lost."""
+        with self._lock:
+            if self._horizon is not None:
+                self._horizon = None
+                self._restart_horizon = True
+            # Whatever was missed won't arrive: don't wait for it
+            self._last_seq = None
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            resync = getattr(callback, 'resync', None)
+            if resync is not None:
+                resync()
+        for listener in self.resync_listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"WARNING: Score feed resync listener failed: {e}")
+
+    def _relay(self, delta):
+        if self._relay_queue is None:
+            with self._lock:
+                if self._relay_queue is None:
+                    self._relay_queue = queue.Queue(maxsize=RELAY_QUEUE_SIZE)
+                    threading.Thread(target=self._relay_worker, daemon=True).start()
+        try:
+            self._relay_queue.put_nowait(encode_delta(dict(delta, origin=self.origin)))
+        except queue.Full:
+            DELTAS_DROPPED.inc()
+
+    def _relay_worker(self):
+        client = None
+        delay = RECONNECT_INITIAL_DELAY
+        while True:
+            try:
+                if client is None:
+                    client = redis_client(self._redis_startup_nodes)
+                    print(f"Relaying score deltas to Redis channel {self.channel}")
+            except Exception as e:
+                # Deltas queue up meanwhile, and are dropped once the queue is full
+                print(f"WARNING: Cannot connect to Redis to relay score deltas, retrying in {delay}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+
+            message = self._relay_queue.get()
+            try:
+                client.publish(self.channel, message)
+                delay = RECONNECT_INITIAL_DELAY
+            except Exception as e:
+                DELTAS_DROPPED.inc()
+                print(f"WARNING: Failed to relay score delta to Redis, reconnecting in {delay}s: {e}")
+                client = None
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def _listen_worker(self):
+        missed = False
+        delay = RECONNECT_INITIAL_DELAY
+        while True:
+            try:
+                pubsub = redis_client(self._redis_startup_nodes).pubsub()
+                pubsub.subscribe(self.channel)
+                print(f"Listening for score deltas on Redis channel {self.channel}")
+                if missed:
+                    self.resynchronise()
+                delay = RECONNECT_INITIAL_DELAY
+                for message in pubsub.listen():
+                    self._receive(message)
+                print(f"WARNING: Subscription to Redis channel {self.channel} closed, reconnecting in {delay}s")
+            except Exception as e:
+                print(f"WARNING: Lost Redis channel {self.channel}, reconnecting in {delay}s: {e}")
+            missed = True
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def _receive(self, message):
+        if message['type'] != 'message':
+            return
+        try:
+            delta = json.loads(message['data'])
+        except ValueError:
+            return
+        if delta.pop("origin", None) == self.origin:
+            return
+        DELTAS_RECEIVED.inc()
+        for listener in self.remote_listeners:
+            listener(delta)
+        self._dispatch(delta)
@@ -0,0 +1,196 @@
+# grpc.aio flavour of the SportsService gRPC server.
+#
+# All RPCs run as coroutines on one event loop: watch streams wait on an
+# asyncio queue instead of holding a thread each, and the blocking Mongo work
+# of the unary RPCs runs on a separate, bounded thread pool. Start app.py with
+# SPORTS_GRPC_MODE=aio to use it.
+import asyncio
+import os
+import signal
+import threading
+from concurrent import futures
+import grpc
+
+import sports_service_pb2_grpc
+from app import (SportsService, GameWatch, OngoingWatch, RpcAbort, update_score_rpc, get_games_rpc,
+                 list_ongoing_events_rpc, load_tracker, load_report, load_report_interval, limiter,
+                 GRPC_SERVER_OPTIONS, GRPC_SHUTDOWN_GRACE, RETRY_AFTER_SECONDS, UNLIMITED_RPCS, CONTROL_RPCS,
+                 WATCH_QUEUE_SIZE, WATCHER_OVERFLOW_MESSAGE)
+from load import AsyncLoadInterceptor
+from instrumentation import AsyncMetricsInterceptor
+from limiter import AsyncAdmissionInterceptor
+
+GRPC_PORT = int(os.environ.get('GRPC_PORT', 50051))
+# Calls beyond this limit are rejected with RESOURCE_EXHAUSTED instead of queueing
+MAX_CONCURRENT_RPCS = int(os.environ.get('GRPC_MAX_CONCURRENT_RPCS', 10000))
+# Threads for the blocking Mongo calls made by unary RPCs
+DB_WORKERS = int(os.environ.get('GRPC_DB_WORKERS', 32))
+MAX_MESSAGE_BYTES = int(os.environ.get('GRPC_MAX_MESSAGE_BYTES', 4 * 1024 * 1024))
+KEEPALIVE_TIME_MS = int(os.environ.get('GRPC_KEEPALIVE_TIME_MS', 30000))
+KEEPALIVE_TIMEOUT_MS = int(os.environ.get('GRPC_KEEPALIVE_TIMEOUT_MS', 10000))
+# Default compression for responses: none, gzip or deflate
+DEFAULT_COMPRESSION = os.environ.get('GRPC_COMPRESSION', 'none')
+# Metadata key a client can send to pick the compression of a single call
+COMPRESSION_METADATA_KEY = 'sports-compression'
+
+COMPRESSION_ALGORITHMS = {
+    'none': grpc.Compression.NoCompression,
+    'gzip': grpc.Compression.Gzip,
+    'deflate': grpc.Compression.Deflate,
+}
+
+
+def server_options():
+    return GRPC_SERVER_OPTIONS + [
+        ('grpc.max_send_message_length', MAX_MESSAGE_BYTES),
+        ('grpc.max_receive_message_length', MAX_MESSAGE_BYTES),
+        ('grpc.keepalive_time_ms', KEEPALIVE_TIME_MS),
+        ('grpc.keepalive_timeout_ms', KEEPALIVE_TIMEOUT_MS),
+        # Watch streams can be idle for long stretches between goals
+        ('grpc.keepalive_permit_without_calls', 1),
+        ('grpc.http2.max_pings_without_data', 0),
+        ('grpc.http2.min_ping_interval_without_data_ms', KEEPALIVE_TIME_MS // 2),
+    ]
+
+
+def apply_call_compression(context):
+    for key, value in context.invocation_metadata():
+        if key == COMPRESSION_METADATA_KEY and value in COMPRESSION_ALGORITHMS:
+            context.set_compression(COMPRESSION_ALGORITHMS[value])
+
+
+class AsyncDeltaQueue:
+    """Buffer between the score feed and one watch stream on the event loop.
+
+    The feed calls it from whatever thread published the delta, so deltas are
+    handed over to the loop with call_soon_threadsafe.
+    """
+
+    def __init__(self, matches, loop):
+        self.matches = matches
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=WATCH_QUEUE_SIZE)
+        self.overflowed = False
+
+    def __call__(self, delta):
+        if self.matches(delta):
+            self.loop.call_soon_threadsafe(self._put, delta)
+
+    def _put(self, delta):
+        try:
+            self.queue.put_nowait(delta)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            # Wake up the stream so it notices the overflow
+            self.queue.get_nowait()
+            self.queue.put_nowait(delta)
+
+    def resync(self):
+        self.loop.call_soon_threadsafe(self._resync)
+
+    def _resync(self):
+        # Deltas were lost upstream: end the stream so the client resumes
+        self.overflowed = True
+        if self.queue.empty():
+            self.queue.put_nowait(None)
+
+    async def deltas(self, context):
+        while True:
+            delta = await self.queue.get()
+            if self.overflowed:
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, WATCHER_OVERFLOW_MESSAGE)
+            yield delta
+
+
+class AsyncSportsService(sports_service_pb2_grpc.SportsServiceServicer):
+    def __init__(self):
+        # Ping only reads the load tracker, so it can run on the event loop
+        self._servicer = SportsService()
+
+    async def Ping(self, request, context):
+        apply_call_compression(context)
+        return self._servicer.Ping(request, context)
+
+    async def UpdateScore(self, request, context):
+        return await self._unary(context, update_score_rpc, request)
+
+    async def GetGames(self, request, context):
+        return await self._unary(context, get_games_rpc, request)
+
+    async def ListOngoingEvents(self, request, context):
+        return await self._unary(context, list_ongoing_events_rpc, request)
+
+    async def WatchGame(self, request, context):
+        async for message in self._watch(context, GameWatch(request.game_id, request.since_version)):
+            yield message
+
+    async def WatchOngoing(self, request, context):
+        async for message in self._watch(context, OngoingWatch(request.sport_category, request.since_seq)):
+            yield message
+
+    async def WatchLoad(self, request, context):
+        apply_call_compression(context)
+        interval = load_report_interval(request)
+        while True:
+            yield load_report()
+            await asyncio.sleep(interval)
+
+    async def _unary(self, context, fn, request):
+        apply_call_compression(context)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, fn, request)
+        except RpcAbort as e:
+            await context.abort(e.code, e.details)
+
+    async def _watch(self, context, watch):
+        apply_call_compression(context)
+        loop = asyncio.get_running_loop()
+        deltas = AsyncDeltaQueue(watch.matches, loop)
+        unsubscribe = watch.subscribe(deltas)
+        try:
+            try:
+                initial = await loop.run_in_executor(None, watch.start)
+            except RpcAbort as e:
+                await context.abort(e.code, e.details)
+            for message in initial:
+                yield message
+            async for delta in deltas.deltas(context):
+                message, done = watch.accept(delta)
+                if message is not None:
+                    yield message
+                if done:
+                    return
+        finally:
+            # Also runs when the client goes away and the call is cancelled
+            unsubscribe()
+
+
+def create_server(port=GRPC_PORT):
+    """Returns the server and the bound port; must be called on the loop that will run it."""
+    asyncio.get_running_loop().set_default_executor(futures.ThreadPoolExecutor(max_workers=DB_WORKERS))
+    server = grpc.aio.server(
+        options=server_options(),
+        interceptors=[AsyncMetricsInterceptor(),
+                      AsyncAdmissionInterceptor(limiter, RETRY_AFTER_SECONDS, UNLIMITED_RPCS),
+                      AsyncLoadInterceptor(load_tracker, CONTROL_RPCS)],
+        maximum_concurrent_rpcs=MAX_CONCURRENT_RPCS,
+        compression=COMPRESSION_ALGORITHMS[DEFAULT_COMPRESSION]
+    )
+    sports_service_pb2_grpc.add_SportsServiceServicer_to_server(AsyncSportsService(), server)
+    return server, server.add_insecure_port(f'[::]:{port}')
+
+
+async def serve(port=GRPC_PORT):
+    server, port = create_server(port)
+    print(f"Starting grpc.aio SportsService on port {port} "
+          f"(max concurrent RPCs: {MAX_CONCURRENT_RPCS}, compression: {DEFAULT_COMPRESSION})...")
+    await server.start()
+    if threading.current_thread() is threading.main_thread():
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, lambda: asyncio.ensure_future(server.stop(GRPC_SHUTDOWN_GRACE)))
+    await server.wait_for_termination()
+
+
+def serve_grpc_aio():
+    asyncio.run(serve())
@@ -0,0 +1,52 @@
+# Prefork serving mode for the sports REST API:
+#   gunicorn -c gunicorn.conf.py app:app
+# or start app.py with SPORTS_HTTP_MODE=prefork to run it next to the gRPC server.
+#
+# The app is imported once in the master and the workers are forked from it,
+# so they share its memory pages until they write to them.
+import gc
+import os
+import shutil
+import tempfile
+import uuid
+
+bind = os.environ.get('HTTP_BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('HTTP_WORKER_THREADS', 4))
+preload_app = True
+timeout = 30
+keepalive = 5
+
+# prometheus_client picks its value store when it is first imported, which
+# happens while the app is preloaded, so the directory has to be ready before
+# that. Samples of earlier runs are cleared.
+METRICS_DIR = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'sports-service-metrics'))
+shutil.rmtree(METRICS_DIR, ignore_errors=True)
+os.makedirs(METRICS_DIR, exist_ok=True)
+
+# No collections in the master while the app is imported: they would only
+# shuffle reference counts on pages the workers are about to share.
+gc.disable()
+
+
+def pre_fork(server, worker):
+    # Objects that exist now are never collected in the workers, so the
+    # collector doesn't write to (and un-share) their pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+    import app
+    # The score feed was created in the master; with its origin every worker
+    # would drop its siblings' deltas from Redis as its own echoes
+    app.score_feed.origin = uuid.uuid4().hex[:8]
+    app.connect_mongo()
+    app.startup()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,138 @@
+import hashlib
+import heapq
+import os
+import threading
+import time
+from array import array
+
+HOT_KEYS_TOP_K = int(os.environ.get('HOT_KEYS_TOP_K', 50))
+HOT_KEYS_SKETCH_WIDTH = int(os.environ.get('HOT_KEYS_SKETCH_WIDTH', 2048))
+HOT_KEYS_SKETCH_DEPTH = int(os.environ.get('HOT_KEYS_SKETCH_DEPTH', 4))
+# Counts are halved this often (seconds), so the ranking follows recent traffic
+HOT_KEYS_DECAY_INTERVAL = float(os.environ.get('HOT_KEYS_DECAY_INTERVAL', 60))
+
+
+class CountMinSketch:
+    """Approximate counts in fixed memory: `depth` rows of `width` counters.
+
+    Estimates never undercount; they overcount by at most a small fraction
+    of the total when keys collide in every row.
+    """
+
+    def __init__(self, width=HOT_KEYS_SKETCH_WIDTH, depth=HOT_KEYS_SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self._rows = [array('L', bytes(array('L').itemsize * width)) for _ in range(depth)]
+
+    def _columns(self, key):
+        digest = hashlib.blake2b(str(key).encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, key, count=1):
+        """Counts `key` and returns its new estimate."""
+        estimate = None
+        for row, column in zip(self._rows, self._columns(key)):
+            row[column] += count
+            estimate = row[column] if estimate is None else min(estimate, row[column])
+        return estimate
+
+    def estimate(self, key):
+        return min(row[column] for row, column in zip(self._rows, self._columns(key)))
+
+    def decay(self):
+        for row in self._rows:
+            for column in range(self.width):
+                row[column] >>= 1
+
+
+class HeavyHitters:
+    """The `k` most requested keys, by count-min estimate.
+
+    The current top keys live in a dict; a min-heap over them finds the one
+    to displace. A key is pushed onto the heap when it enters the top and
+    its count is updated in the dict only, so heap entries can be lower
+    than the current count: those are corrected when they come up. The
+    heap therefore holds about one entry per top key, and is rebuilt if
+    it ever grows past twice that.
+    """
+
+    def __init__(self, k=HOT_KEYS_TOP_K, width=HOT_KEYS_SKETCH_WIDTH, depth=HOT_KEYS_SKETCH_DEPTH):
+        self.k = k
+        self.sketch = CountMinSketch(width, depth)
+        self._top = {}
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def add(self, key):
+        with self._lock:
+            estimate = self.sketch.add(key)
+            if key in self._top:
+                self._top[key] = estimate
+                return
+            if len(self._top) >= self.k:
+                weakest, weakest_count = self._weakest()
+                if estimate <= weakest_count:
+                    return
+                heapq.heappop(self._heap)
+                del self._top[weakest]
+            self._top[key] = estimate
+            heapq.heappush(self._heap, (estimate, key))
+            if len(self._heap) > 2 * self.k:
+                self._rebuild_heap()
+
+    def _weakest(self):
+        while True:
+            count, key = self._heap[0]
+            current = self._top.get(key)
+            if current == count:
+                return key, count
+            if current is None:
+                # Displaced since it was pushed
+                heapq.heappop(self._heap)
+            else:
+                heapq.heapreplace(self._heap, (current, key))
+
+    def _rebuild_heap(self):
+        self._heap = [(count, key) for key, count in self._top.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, n=None):
+        """[(key, estimate)] with the largest estimates first."""
+        with self._lock:
+            ranked = sorted(self._top.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:n] if n is not None else ranked
+
+    def decay(self):
+        with self._lock:
+            self.sketch.decay()
+            self._top = {key: count >> 1 for key, count in self._top.items() if count >> 1}
+            self._rebuild_heap()
+
+
+class HotKeys:
+    """HeavyHitters per namespace ('game', 'category', ...), decayed in the
+    background once `start` has been called."""
+
+    def __init__(self, namespaces, k=HOT_KEYS_TOP_K, decay_interval=HOT_KEYS_DECAY_INTERVAL):
+        self.decay_interval = decay_interval
+        self._trackers = {namespace: HeavyHitters(k) for namespace in namespaces}
+
+    def record(self, namespace, key):
+        if key:
+            self._trackers[namespace].add(key)
+
+    def top(self, namespace, n=None):
+        return self._trackers[namespace].top(n)
+
+    def estimate(self, namespace, key):
+        return self._trackers[namespace].sketch.estimate(key)
+
+    def start(self):
+        threading.Thread(target=self._decay_worker, name='hot-keys-decay', daemon=True).start()
+
+    def _decay_worker(self):
+        while True:
+            time.sleep(self.decay_interval)
+            for tracker in self._trackers.values():
+                tracker.decay()
@@ -0,0 +1,76 @@
+import argparse
+import sys
+from collections import namedtuple
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+# One declared index. `keys` is a list of (field, direction) pairs as taken
+# by create_index.
+IndexSpec = namedtuple('IndexSpec', ['name', 'keys', 'unique'], defaults=[False])
+
+
+def apply_indexes(db, required):
+    """Builds every declared index that is missing. Existing indexes are left
+    alone, so this is cheap to run on every start."""
+    for collection, specs in required.items():
+        for spec in specs:
+            try:
+                db[collection].create_index(spec.keys, name=spec.name, unique=spec.unique, background=True)
+                print(f"Index {spec.name} is in place on {collection}")
+            except PyMongoError as e:
+                print(f"WARNING: Failed to create index {spec.name} on {collection}: {e}")
+
+
+def index_drift(db, required):
+    """Compares the declared indexes with the ones in the database.
+
+    Returns {collection: {"missing": [...], "mismatched": [...], "extra": [...]}}
+    for collections that differ: declared indexes that don't exist, indexes
+    whose keys or uniqueness differ from the declaration, and indexes nobody
+    declared (the default _id index aside).
+    """
+    drift = {}
+    for collection, specs in required.items():
+        existing = {index["name"]: index for index in db[collection].list_indexes()}
+        report = {"missing": [], "mismatched": [], "extra": []}
+        for spec in specs:
+            index = existing.get(spec.name)
+            if index is None:
+                report["missing"].append(spec.name)
+            elif list(index["key"].items()) != list(spec.keys) or bool(index.get("unique")) != spec.unique:
+                report["mismatched"].append(spec.name)
+        declared = {spec.name for spec in specs}
+        report["extra"] = sorted(name for name in existing if name != "_id_" and name not in declared)
+        if any(report.values()):
+            drift[collection] = report
+    return drift
+
+
+def report_drift(db, required):
+    try:
+        drift = index_drift(db, required)
+    except PyMongoError as e:
+        print(f"WARNING: Could not check indexes: {e}")
+        return None
+    for collection, report in drift.items():
+        for kind, names in report.items():
+            if names:
+                print(f"WARNING: Index drift on {collection}: {kind} {', '.join(names)}")
+    return drift
+
+
+def main(database, required, default_mongo_url, argv=None):
+    """CLI: `check` reports drift (exit status 1 if there is any), `apply`
+    builds missing indexes and then reports what still differs."""
+    parser = argparse.ArgumentParser(description=f'Manage the indexes of {database}')
+    parser.add_argument('command', choices=['check', 'apply'])
+    parser.add_argument('--mongo-url', default=default_mongo_url)
+    args = parser.parse_args(argv)
+
+    db = MongoClient(args.mongo_url)[database]
+    if args.command == 'apply':
+        apply_indexes(db, required)
+    drift = report_drift(db, required)
+    if drift == {}:
+        print(f"Indexes of {database} match the declaration")
+    sys.exit(0 if drift == {} else 1)
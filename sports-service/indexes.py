@@ -0,0 +1,43 @@
+import os
+from pymongo import ASCENDING
+from index_manager import IndexSpec, apply_indexes, report_drift, main
+
+# Fields returned by /api/sports/ongoing-events. They are part of the index
+# below so Mongo can answer the ongoing-events query from the index alone.
+ONGOING_EVENT_FIELDS = ["sport_category", "team_1", "team_2", "score_team_1", "score_team_2"]
+
+# Projection for the ongoing-events read path. `_id` has to be excluded
+# explicitly, otherwise the query can no longer be covered by the index.
+ONGOING_EVENT_PROJECTION = dict({"_id": 0}, **{field: 1 for field in ONGOING_EVENT_FIELDS})
+
+CATEGORY_PROJECTION = {"_id": 0, "category_id": 1, "category_name": 1}
+
+ONGOING_EVENTS_INDEX = "event_status_1_ongoing_fields"
+ONGOING_EVENTS_KEYS = [("event_status", ASCENDING)] + [(field, ASCENDING) for field in ONGOING_EVENT_FIELDS]
+
+# Keyset pagination of ongoing events by category (ListOngoingEvents)
+ONGOING_PAGES_INDEX = "event_status_1_sport_category_1_event_id_1"
+ONGOING_PAGES_KEYS = [("event_status", ASCENDING), ("sport_category", ASCENDING), ("event_id", ASCENDING)]
+
+EVENT_ID_INDEX = "event_id_1"
+
+
+# Declared indexes of sports_database; see index_manager.py for the CLI:
+#   python indexes.py check|apply [--mongo-url URL]
+REQUIRED_INDEXES = {
+    "events": [
+        IndexSpec(ONGOING_EVENTS_INDEX, ONGOING_EVENTS_KEYS),
+        IndexSpec(ONGOING_PAGES_INDEX, ONGOING_PAGES_KEYS),
+        # Game lookups, score updates and GetGames ($in) by event_id
+        IndexSpec(EVENT_ID_INDEX, [("event_id", ASCENDING)], unique=True),
+    ],
+}
+
+
+def ensure_indexes(db):
+    apply_indexes(db, REQUIRED_INDEXES)
+    report_drift(db, REQUIRED_INDEXES)
+
+
+if __name__ == '__main__':
+    main('sports_database', REQUIRED_INDEXES, os.environ.get('MONGO_URL', 'mongodb://mongo:27017/'))
@@ -0,0 +1,201 @@
+import asyncio
+import time
+import grpc
+from prometheus_client import Counter, Gauge, Histogram, Summary
+
+# From 1ms cache hits up to multi-second Mongo scans
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_COUNT = Counter('sports_requests_total', 'Total number of requests to sports service', ['method', 'endpoint'])
+HTTP_LATENCY = Histogram('sports_http_request_duration_seconds', 'Time to produce the HTTP response',
+                         ['method', 'endpoint', 'status'], buckets=LATENCY_BUCKETS)
+HTTP_IN_FLIGHT = Gauge('sports_http_requests_in_flight', 'HTTP requests currently being handled',
+                       ['method', 'endpoint'], multiprocess_mode='livesum')
+HTTP_REQUEST_SIZE = Summary('sports_http_request_size_bytes', 'Size of HTTP request bodies', ['method', 'endpoint'])
+HTTP_RESPONSE_SIZE = Summary('sports_http_response_size_bytes', 'Size of HTTP response bodies (streamed responses excluded)',
+                             ['method', 'endpoint'])
+
+GRPC_LATENCY = Histogram('sports_grpc_request_duration_seconds', 'Duration of gRPC calls (whole stream for streaming calls)',
+                         ['method', 'code'], buckets=LATENCY_BUCKETS)
+GRPC_IN_FLIGHT = Gauge('sports_grpc_requests_in_flight', 'gRPC calls currently open', ['method'], multiprocess_mode='livesum')
+GRPC_RESPONSE_SIZE = Summary('sports_grpc_response_size_bytes', 'Serialized size of gRPC response messages', ['method'])
+
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+
+# HTTP: endpoints are labelled with the route template (/api/sports/games/<game_id>
+# rather than every game id) to keep the number of series bounded.
+
+def _endpoint(request):
+    return request.url_rule.rule if request.url_rule is not None else UNMATCHED_ENDPOINT
+
+
+def start_http_request(request):
+    endpoint = _endpoint(request)
+    REQUEST_COUNT.labels(request.method, endpoint).inc()
+    HTTP_IN_FLIGHT.labels(request.method, endpoint).inc()
+    if request.content_length:
+        HTTP_REQUEST_SIZE.labels(request.method, endpoint).observe(request.content_length)
+    return time.perf_counter(), request.method, endpoint
+
+
+def record_http_response(state, response):
+    started, method, endpoint = state
+    HTTP_LATENCY.labels(method, endpoint, str(response.status_code)).observe(time.perf_counter() - started)
+    if response.content_length is not None:
+        HTTP_RESPONSE_SIZE.labels(method, endpoint).observe(response.content_length)
+
+
+def finish_http_request(state):
+    _, method, endpoint = state
+    HTTP_IN_FLIGHT.labels(method, endpoint).dec()
+
+
+def instrument_flask(app):
+    """Registers the hooks on a Flask app. Register before any hook that can
+    answer a request early (admission control), or those responses are missed."""
+    from flask import g, request
+
+    @app.before_request
+    def start_instrumentation():
+        g.instrumentation = start_http_request(request)
+
+    @app.after_request
+    def record_instrumentation(response):
+        state = g.get('instrumentation')
+        if state is not None:
+            record_http_response(state, response)
+        return response
+
+    @app.teardown_request
+    def finish_instrumentation(exc):
+        state = g.pop('instrumentation', None)
+        if state is not None:
+            finish_http_request(state)
+
+
+def instrument_quart(app):
+    from quart import g, request
+
+    @app.before_request
+    async def start_instrumentation():
+        g.instrumentation = start_http_request(request)
+
+    @app.after_request
+    async def record_instrumentation(response):
+        state = g.get('instrumentation')
+        if state is not None:
+            record_http_response(state, response)
+        return response
+
+    @app.teardown_request
+    async def finish_instrumentation(exc):
+        state = g.pop('instrumentation', None)
+        if state is not None:
+            finish_http_request(state)
+
+
+# gRPC: the method label is the short method name (Ping, WatchGame, ...).
+
+def _method_name(handler_call_details):
+    return handler_call_details.method.rsplit('/', 1)[-1]
+
+
+def _record_grpc(method, started, context, outcome):
+    # A code set by the servicer (abort, set_code) wins over the outcome seen here
+    code = context.code() or outcome
+    GRPC_IN_FLIGHT.labels(method).dec()
+    GRPC_LATENCY.labels(method, code.name).observe(time.perf_counter() - started)
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return handler
+        method = _method_name(handler_call_details)
+
+        if handler.unary_unary is not None:
+            behavior = handler.unary_unary
+
+            def unary_unary(request, context):
+                started, outcome = time.perf_counter(), grpc.StatusCode.UNKNOWN
+                GRPC_IN_FLIGHT.labels(method).inc()
+                try:
+                    response = behavior(request, context)
+                    if response is not None:
+                        GRPC_RESPONSE_SIZE.labels(method).observe(response.ByteSize())
+                    outcome = grpc.StatusCode.OK
+                    return response
+                finally:
+                    _record_grpc(method, started, context, outcome)
+
+            return handler._replace(unary_unary=unary_unary)
+
+        if handler.unary_stream is not None:
+            behavior = handler.unary_stream
+
+            def unary_stream(request, context):
+                started, outcome = time.perf_counter(), grpc.StatusCode.UNKNOWN
+                GRPC_IN_FLIGHT.labels(method).inc()
+                try:
+                    for response in behavior(request, context):
+                        GRPC_RESPONSE_SIZE.labels(method).observe(response.ByteSize())
+                        yield response
+                    outcome = grpc.StatusCode.OK
+                except GeneratorExit:
+                    # The client went away; watch streams usually end this way
+                    outcome = grpc.StatusCode.CANCELLED
+                    raise
+                finally:
+                    _record_grpc(method, started, context, outcome)
+
+            return handler._replace(unary_stream=unary_stream)
+
+        return handler
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return handler
+        method = _method_name(handler_call_details)
+
+        if handler.unary_unary is not None:
+            behavior = handler.unary_unary
+
+            async def unary_unary(request, context):
+                started, outcome = time.perf_counter(), grpc.StatusCode.UNKNOWN
+                GRPC_IN_FLIGHT.labels(method).inc()
+                try:
+                    response = await behavior(request, context)
+                    if response is not None:
+                        GRPC_RESPONSE_SIZE.labels(method).observe(response.ByteSize())
+                    outcome = grpc.StatusCode.OK
+                    return response
+                finally:
+                    _record_grpc(method, started, context, outcome)
+
+            return handler._replace(unary_unary=unary_unary)
+
+        if handler.unary_stream is not None:
+            behavior = handler.unary_stream
+
+            async def unary_stream(request, context):
+                started, outcome = time.perf_counter(), grpc.StatusCode.UNKNOWN
+                GRPC_IN_FLIGHT.labels(method).inc()
+                try:
+                    async for response in behavior(request, context):
+                        GRPC_RESPONSE_SIZE.labels(method).observe(response.ByteSize())
+                        yield response
+                    outcome = grpc.StatusCode.OK
+                except (GeneratorExit, asyncio.CancelledError):
+                    outcome = grpc.StatusCode.CANCELLED
+                    raise
+                finally:
+                    _record_grpc(method, started, context, outcome)
+
+            return handler._replace(unary_stream=unary_stream)
+
+        return handler
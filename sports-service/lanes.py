@@ -0,0 +1,209 @@
+import os
+import queue
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from prometheus_client import Counter, Gauge
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+CONTROL_WORKERS = int(os.environ.get('HTTP_CONTROL_WORKERS', 2))
+DATA_WORKERS = int(os.environ.get('HTTP_DATA_WORKERS', 32))
+# Data requests accepted beyond the busy workers; more are answered with 503
+DATA_QUEUE_SIZE = int(os.environ.get('HTTP_DATA_QUEUE_SIZE', 64))
+DATA_RETRY_AFTER_SECONDS = int(os.environ.get('HTTP_DATA_RETRY_AFTER', 1))
+# How long a connection may take to send its request line before it is sent
+# to the data lane unclassified
+PEEK_TIMEOUT = float(os.environ.get('HTTP_LANE_PEEK_TIMEOUT', 0.05))
+PEEK_SIZE = 1024
+# A connection that has sent part of its request line stays readable, so it
+# is peeked at again on this interval (in seconds) instead of selected on
+PEEK_RETRY = 0.005
+
+_LANE_METRICS = {}
+
+
+def _lane_metrics(prefix):
+    if prefix not in _LANE_METRICS:
+        _LANE_METRICS[prefix] = (
+            Gauge(f'{prefix}_http_data_lane_requests', 'Data requests running or queued for a worker',
+                  multiprocess_mode='liveall'),
+            Counter(f'{prefix}_http_data_lane_rejected_total', 'Data requests answered with 503 because the queue was full')
+        )
+    return _LANE_METRICS[prefix]
+
+
+def overloaded_response(retry_after):
+    body = b'Service overloaded, retry later\n'
+    return (b'HTTP/1.0 503 Service Unavailable\r\nContent-Type: text/plain\r\n'
+            b'Retry-After: %d\r\nContent-Length: %d\r\nConnection: close\r\n\r\n' % (retry_after, len(body)) + body)
+
+
+class OneRequestHandler(WSGIRequestHandler):
+    # Werkzeug's handler closes every connection after one response, whatever
+    # the protocol version, because it can't drain a request body before the
+    # next request line. Werkzeug would announce HTTP/1.1 for a threaded
+    # server and chunk streamed bodies; HTTP/1.0 says up front that there is
+    # no keep-alive, and ends streamed bodies by closing the connection.
+    protocol_version = "HTTP/1.0"
+
+
+class LaneWSGIServer(BaseWSGIServer):
+    """WSGI server with separate worker pools for control and data requests.
+
+    Each accepted connection is classified by peeking at its request line:
+    requests for one of `control_paths` (health checks, metrics) run on a
+    small pool of their own, everything else on the data pool. However
+    backed up the data pool gets, a health check never waits behind it.
+
+    The accept loop only hands connections to a sorter thread, which waits
+    for all of them at once (up to PEEK_TIMEOUT each) with a selector, so a
+    client that connects and sends nothing delays no one. The data pool
+    takes at most `data_queue_size` requests beyond its workers; the rest
+    are answered with 503 and Retry-After right away.
+
+    A connection is classified once, as soon as its request line has
+    arrived: one that has only sent part of it by the deadline goes to the
+    data lane. A connection carries exactly one request (see
+    OneRequestHandler), so the lane can't be wrong for a later one. The cost
+    is a new TCP connection per request; clients that need keep-alive have
+    to reach the app through a server that offers it.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, control_paths, prefix='http', control_workers=CONTROL_WORKERS,
+                 data_workers=DATA_WORKERS, data_queue_size=DATA_QUEUE_SIZE):
+        super().__init__(host, port, app, handler=OneRequestHandler)
+        self.control_paths = tuple(control_paths)
+        self.control_workers = control_workers
+        self.data_workers = data_workers
+        self.control_lane = ThreadPoolExecutor(max_workers=control_workers, thread_name_prefix='http-control')
+        self.data_lane = ThreadPoolExecutor(max_workers=data_workers, thread_name_prefix='http-data')
+        self._data_slots = threading.BoundedSemaphore(data_workers + data_queue_size)
+        self._data_requests, self._data_rejected = _lane_metrics(prefix)
+        # Accepted connections on their way to the sorter thread
+        self._unsorted = queue.SimpleQueue()
+        self._wakeup, self._wakeup_send = socket.socketpair()
+        self._closed = False
+        threading.Thread(target=self._sort_worker, name='http-lane-sorter', daemon=True).start()
+
+    def process_request(self, request, client_address):
+        self._unsorted.put((request, client_address, time.monotonic() + PEEK_TIMEOUT))
+        self._wakeup_send.send(b'\0')
+
+    def _sort_worker(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup, selectors.EVENT_READ)
+        waiting = {}
+        # Waiting connections with part of a request line, not in the selector
+        undecided = set()
+
+        def forget(request):
+            if request in undecided:
+                undecided.discard(request)
+            else:
+                selector.unregister(request)
+            return waiting.pop(request)[0]
+
+        while not self._closed:
+            timeout = None
+            if waiting:
+                timeout = max(0, min(deadline for _, deadline in waiting.values()) - time.monotonic())
+            if undecided:
+                timeout = min(timeout, PEEK_RETRY)
+            ready = list(undecided)
+            for key, _ in selector.select(timeout):
+                if key.fileobj is self._wakeup:
+                    self._wakeup.recv(4096)
+                    while not self._unsorted.empty():
+                        request, client_address, deadline = self._unsorted.get()
+                        try:
+                            selector.register(request, selectors.EVENT_READ)
+                        except (OSError, ValueError):
+                            self.shutdown_request(request)
+                            continue
+                        waiting[request] = (client_address, deadline)
+                else:
+                    ready.append(key.fileobj)
+            for request in ready:
+                control = self.is_control(request)
+                if control is not None:
+                    self._dispatch(request, forget(request), control)
+                elif request not in undecided:
+                    selector.unregister(request)
+                    undecided.add(request)
+            now = time.monotonic()
+            for request, (client_address, deadline) in list(waiting.items()):
+                if deadline <= now:
+                    self._dispatch(request, forget(request), False)
+        for request in waiting:
+            self.shutdown_request(request)
+        selector.close()
+        self._wakeup.close()
+
+    def _dispatch(self, request, client_address, control):
+        if control:
+            self.control_lane.submit(self.process_request_thread, request, client_address)
+        elif self._data_slots.acquire(blocking=False):
+            self._data_requests.inc()
+            self.data_lane.submit(self.process_data_request, request, client_address)
+        else:
+            self._data_rejected.inc()
+            self._reject(request)
+
+    def _reject(self, request):
+        # The response fits in the socket buffer; never wait for a slow client here
+        try:
+            request.setblocking(False)
+            request.send(overloaded_response(DATA_RETRY_AFTER_SECONDS))
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def process_data_request(self, request, client_address):
+        try:
+            self.process_request_thread(request, client_address)
+        finally:
+            self._data_requests.dec()
+            self._data_slots.release()
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def is_control(self, request):
+        """Whether the request is for a control path, or None while its
+        request line has only partly arrived. Only called once the request is
+        readable, so this doesn't block."""
+        try:
+            head = request.recv(PEEK_SIZE, socket.MSG_PEEK)
+        except OSError:
+            return False
+        parts = head.split(b' ', 2)
+        if len(parts) < 3:
+            # The path may still be growing, unless the line can't be a request line
+            if head and len(head) < PEEK_SIZE and b'\n' not in head:
+                return None
+            return False
+        path = parts[1].split(b'?', 1)[0].decode('latin-1')
+        return path in self.control_paths
+
+    def server_close(self):
+        super().server_close()
+        self._closed = True
+        self._wakeup_send.send(b'\0')
+        self.control_lane.shutdown(wait=False)
+        self.data_lane.shutdown(wait=False)
+
+
+def serve_lanes(app, host, port, control_paths, prefix='http'):
+    server = LaneWSGIServer(host, port, app, control_paths, prefix)
+    print(f"Serving on {host}:{port} with {server.control_workers} control "
+          f"and {server.data_workers} data workers...")
+    server.serve_forever()
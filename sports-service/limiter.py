@@ -0,0 +1,120 @@
+import threading
+import time
+import grpc
+from prometheus_client import Counter, Gauge
+
+CONCURRENCY_LIMIT = Gauge('sports_concurrency_limit', 'Current adaptive concurrency limit', ['limiter'])
+REQUESTS_REJECTED = Counter('sports_requests_rejected_total', 'Number of requests shed by the concurrency limiter', ['transport'])
+
+OVERLOAD_MESSAGE = "Service overloaded, retry later"
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit driven by observed latency.
+
+    Work is admitted while fewer than `limit` requests are in flight. Each
+    request that completes within `target_latency` grows the limit by one
+    (only while the limit is actually being used, so an idle replica doesn't
+    drift up to max_limit), and a slower one shrinks it by `backoff`, at most
+    once per round trip: requests that were already in flight when the limit
+    last shrank saw the same overload and don't shrink it again. Under
+    overload the limit settles where latency stays around the target, and
+    excess requests are rejected right away instead of queueing.
+    """
+
+    def __init__(self, initial_limit=20, min_limit=1, max_limit=1000, target_latency=0.25, backoff=0.9,
+                 name='api'):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._decreased_at = float('-inf')
+        self._lock = threading.Lock()
+        CONCURRENCY_LIMIT.labels(name).set(int(self._limit))
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def try_acquire(self):
+        with self._lock:
+            if self._in_flight >= int(self._limit):
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, latency):
+        now = time.monotonic()
+        with self._lock:
+            in_flight = self._in_flight
+            self._in_flight -= 1
+            if latency > self.target_latency:
+                if now - latency >= self._decreased_at:
+                    self._limit = max(self.min_limit, self._limit * self.backoff)
+                    self._decreased_at = now
+            elif in_flight * 2 >= self._limit:
+                self._limit = min(self.max_limit, self._limit + 1)
+            CONCURRENCY_LIMIT.labels(self.name).set(int(self._limit))
+
+
+# Only unary RPCs go through the limiter, as with load accounting; `exempt`
+# lists full method names that are always admitted (e.g. Ping, which the
+# gateway uses to pick the least loaded replica).
+
+def _retry_metadata(retry_after):
+    return (('retry-after', str(retry_after)), ('grpc-retry-pushback-ms', str(int(retry_after * 1000))))
+
+
+class AdmissionInterceptor(grpc.ServerInterceptor):
+    def __init__(self, limiter, retry_after, exempt=()):
+        self.limiter = limiter
+        self.retry_after = retry_after
+        self.exempt = exempt
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None or handler_call_details.method in self.exempt:
+            return handler
+        behavior = handler.unary_unary
+
+        def admitted(request, context):
+            if not self.limiter.try_acquire():
+                REQUESTS_REJECTED.labels('grpc').inc()
+                context.set_trailing_metadata(_retry_metadata(self.retry_after))
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, OVERLOAD_MESSAGE)
+            started = time.monotonic()
+            try:
+                return behavior(request, context)
+            finally:
+                self.limiter.release(time.monotonic() - started)
+
+        return handler._replace(unary_unary=admitted)
+
+
+class AsyncAdmissionInterceptor(grpc.aio.ServerInterceptor):
+    def __init__(self, limiter, retry_after, exempt=()):
+        self.limiter = limiter
+        self.retry_after = retry_after
+        self.exempt = exempt
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None or handler_call_details.method in self.exempt:
+            return handler
+        behavior = handler.unary_unary
+
+        async def admitted(request, context):
+            if not self.limiter.try_acquire():
+                REQUESTS_REJECTED.labels('grpc').inc()
+                context.set_trailing_metadata(_retry_metadata(self.retry_after))
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, OVERLOAD_MESSAGE)
+            started = time.monotonic()
+            try:
+                return await behavior(request, context)
+            finally:
+                self.limiter.release(time.monotonic() - started)
+
+        return handler._replace(unary_unary=admitted)
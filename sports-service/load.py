@@ -0,0 +1,127 @@
+import math
+import threading
+import time
+import grpc
+from prometheus_client import Gauge
+
+IN_FLIGHT = Gauge('sports_requests_in_flight', 'Number of requests currently being handled', multiprocess_mode='livesum')
+REQUEST_RATE = Gauge('sports_request_rate', 'Requests per second over the load window')
+LATENCY_EWMA = Gauge('sports_request_latency_ewma_seconds', 'Exponentially weighted moving average of request latency')
+
+
+class LoadTracker:
+    """Load accounting shared by the HTTP and gRPC paths of one process.
+
+    Tracks the number of requests in flight, the completion rate over a
+    sliding window of `window` one-second buckets and an EWMA of latency.
+    `load()` is the figure replicas are compared on: the larger of the
+    current in-flight count and the concurrency implied by rate x latency
+    (Little's law), so a replica that just finished a burst doesn't look
+    idle for a moment.
+    """
+
+    def __init__(self, window=10, alpha=0.2, clock=time.monotonic):
+        self.window = window
+        self.alpha = alpha
+        self._clock = clock
+        self._in_flight = 0
+        self._buckets = [0] * window
+        self._bucket_start = [0] * window
+        self._latency = 0.0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self._in_flight += 1
+        IN_FLIGHT.inc()
+        return self._clock()
+
+    def finish(self, started):
+        """Records a completed request and returns its latency."""
+        now = self._clock()
+        latency = max(now - started, 0.0)
+        second = int(now)
+        slot = second % self.window
+        IN_FLIGHT.dec()
+        with self._lock:
+            self._in_flight -= 1
+            if self._bucket_start[slot] != second:
+                self._bucket_start[slot] = second
+                self._buckets[slot] = 0
+            self._buckets[slot] += 1
+            if self._latency == 0.0:
+                self._latency = latency
+            else:
+                self._latency += self.alpha * (latency - self._latency)
+        return latency
+
+    def request_rate(self):
+        oldest = int(self._clock()) - self.window
+        with self._lock:
+            completed = sum(count for count, second in zip(self._buckets, self._bucket_start) if second > oldest)
+        return completed / self.window
+
+    def snapshot(self):
+        rate = self.request_rate()
+        with self._lock:
+            in_flight, latency = self._in_flight, self._latency
+        return {
+            "in_flight": in_flight,
+            "request_rate": round(rate, 3),
+            "latency_ewma_ms": round(latency * 1000, 3),
+            "load": max(in_flight, math.ceil(rate * latency)),
+        }
+
+    def load(self):
+        return self.snapshot()["load"]
+
+    def export_metrics(self):
+        # Callback gauges are read in the scraping process only, so in
+        # multiprocess (prefork) mode they are left out of /metrics.
+        REQUEST_RATE.set_function(self.request_rate)
+        LATENCY_EWMA.set_function(lambda: self._latency)
+
+
+# Only unary RPCs are counted: a watch stream stays open for as long as the
+# client is interested and says nothing about how busy the replica is.
+
+class LoadInterceptor(grpc.ServerInterceptor):
+    def __init__(self, tracker, exempt=()):
+        self.tracker = tracker
+        self.exempt = frozenset(exempt)
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None or handler_call_details.method in self.exempt:
+            return handler
+        behavior = handler.unary_unary
+
+        def tracked(request, context):
+            started = self.tracker.start()
+            try:
+                return behavior(request, context)
+            finally:
+                self.tracker.finish(started)
+
+        return handler._replace(unary_unary=tracked)
+
+
+class AsyncLoadInterceptor(grpc.aio.ServerInterceptor):
+    def __init__(self, tracker, exempt=()):
+        self.tracker = tracker
+        self.exempt = frozenset(exempt)
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None or handler_call_details.method in self.exempt:
+            return handler
+        behavior = handler.unary_unary
+
+        async def tracked(request, context):
+            started = self.tracker.start()
+            try:
+                return await behavior(request, context)
+            finally:
+                self.tracker.finish(started)
+
+        return handler._replace(unary_unary=tracked)
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from pymongo import monitoring
+from prometheus_client import Counter, Gauge, Histogram
+
+CHECKOUT_BUCKETS = (.0001, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5)
+COMMAND_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+
+# Commands whose first field names the collection they work on
+COLLECTION_COMMANDS = {'find', 'insert', 'update', 'delete', 'findAndModify', 'aggregate', 'count',
+                       'distinct', 'getMore', 'createIndexes', 'listIndexes', 'explain'}
+
+
+def mongo_client_options():
+    """Pool and timeout settings for MongoClient, from the environment."""
+    options = {
+        'maxPoolSize': int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+        'minPoolSize': int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+        # Fail fast instead of piling up requests when the pool is exhausted
+        'waitQueueTimeoutMS': int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000)),
+        'serverSelectionTimeoutMS': int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+        'connectTimeoutMS': int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+    }
+    if os.environ.get('MONGO_SOCKET_TIMEOUT_MS'):
+        options['socketTimeoutMS'] = int(os.environ['MONGO_SOCKET_TIMEOUT_MS'])
+    return options
+
+
+def command_collection(command_name, command):
+    if command_name in COLLECTION_COMMANDS:
+        if command_name == 'getMore':
+            return command.get('collection', '')
+        if command_name == 'explain':
+            explained = command.get('explain', {})
+            return command_collection(next(iter(explained), ''), explained)
+        value = command.get(command_name)
+        if isinstance(value, str):
+            return value
+    return ''
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Exports checkout wait time and pool occupancy.
+
+    Checkouts run on the thread that needs the connection, so the start of a
+    checkout is remembered per thread and paired with its outcome.
+    """
+
+    def __init__(self, prefix):
+        self.checkout_seconds = Histogram(f'{prefix}_mongo_pool_checkout_seconds',
+                                          'Time spent waiting for a connection from the Mongo pool',
+                                          buckets=CHECKOUT_BUCKETS)
+        self.checkout_failures = Counter(f'{prefix}_mongo_pool_checkout_failures_total',
+                                         'Failed Mongo connection checkouts', ['reason'])
+        self.connections = Gauge(f'{prefix}_mongo_pool_connections', 'Open connections in the Mongo pool',
+                                 multiprocess_mode='livesum')
+        self.checked_out = Gauge(f'{prefix}_mongo_pool_checked_out', 'Mongo connections currently in use',
+                                 multiprocess_mode='livesum')
+        self._local = threading.local()
+
+    def _checkout_time(self):
+        started = getattr(self._local, 'checkout_started', None)
+        self._local.checkout_started = None
+        return None if started is None else time.perf_counter() - started
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = self._checkout_time()
+        if waited is not None:
+            self.checkout_seconds.observe(waited)
+        self.checked_out.inc()
+
+    def connection_check_out_failed(self, event):
+        self._checkout_time()
+        self.checkout_failures.labels(str(event.reason)).inc()
+
+    def connection_checked_in(self, event):
+        self.checked_out.dec()
+
+    def connection_created(self, event):
+        self.connections.inc()
+
+    def connection_closed(self, event):
+        self.connections.dec()
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Exports per-command latency by collection and operation."""
+
+    def __init__(self, prefix):
+        self.duration = Histogram(f'{prefix}_mongo_command_duration_seconds', 'Mongo command round-trip time',
+                                  ['collection', 'command'], buckets=COMMAND_BUCKETS)
+        self.failures = Counter(f'{prefix}_mongo_command_failures_total', 'Failed Mongo commands',
+                                ['collection', 'command'])
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = command_collection(event.command_name, event.command)
+        with self._lock:
+            self._collections[event.request_id] = collection
+
+    def _collection(self, event):
+        with self._lock:
+            return self._collections.pop(event.request_id, '')
+
+    def succeeded(self, event):
+        self.duration.labels(self._collection(event), event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collection(event)
+        self.duration.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        self.failures.labels(collection, event.command_name).inc()
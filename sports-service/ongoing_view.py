@@ -0,0 +1,319 @@
+import bisect
+import os
+import threading
+import time
+from prometheus_client import Counter, Gauge
+from pymongo.errors import OperationFailure, PyMongoError
+from indexes import ONGOING_EVENT_FIELDS
+from versions import collection_version
+
+VIEW_EVENTS = Gauge('sports_ongoing_view_events', 'Ongoing events held in the in-memory view',
+                    multiprocess_mode='liveall')
+VIEW_CHANGES = Counter('sports_ongoing_view_changes_total', 'Changes applied to the in-memory view of ongoing events',
+                       ['source'])
+VIEW_FOLLOWING = Gauge('sports_ongoing_view_change_stream',
+                       '1 while the ongoing events view follows a change stream, 0 while it polls',
+                       multiprocess_mode='liveall')
+
+# Set ONGOING_VIEW=0 to read ongoing events from Mongo (through the cache) again
+ONGOING_VIEW_ENABLED = os.environ.get('ONGOING_VIEW', '1') != '0'
+# Reload interval, in seconds, when change streams are unavailable (standalone mongod)
+ONGOING_VIEW_POLL_INTERVAL = float(os.environ.get('ONGOING_VIEW_POLL_INTERVAL', 1))
+ONGOING_VIEW_RETRY_INTERVAL = 5
+
+EVENT_FIELDS = ('event_id', 'version', 'sport_category', 'team_1', 'team_2', 'score_team_1', 'score_team_2',
+                'status', 'event_status')
+VIEW_PROJECTION = {field: 1 for field in EVENT_FIELDS}
+# Changes to the events collection, and bumps of its version counter (the ETag)
+CHANGE_PIPELINE = [{"$match": {"$or": [{"ns.coll": "events"},
+                                       {"ns.coll": "counters", "documentKey._id": "events"}]}}]
+# Operations after which the stream can't be followed any further
+RELOAD_OPERATIONS = ('drop', 'rename', 'dropDatabase', 'invalidate')
+
+_UNSET = object()
+
+
+def valid_event_id(event_id):
+    # Ids are kept in sorted lists, so they must all be of one type
+    return isinstance(event_id, str)
+
+
+class OngoingEvent:
+    """One ongoing event. Fields missing from the document stay unset."""
+    __slots__ = ('doc_id',) + EVENT_FIELDS
+
+    def __init__(self, doc):
+        self.doc_id = doc.get('_id')
+        for field in EVENT_FIELDS:
+            if field in doc:
+                setattr(self, field, doc[field])
+
+    def get(self, field, default=None):
+        value = getattr(self, field, _UNSET)
+        return default if value is _UNSET else value
+
+    def to_dict(self, fields=EVENT_FIELDS):
+        row = {}
+        for field in fields:
+            value = getattr(self, field, _UNSET)
+            if value is not _UNSET:
+                row[field] = value
+        return row
+
+
+class OngoingView:
+    """In-memory replica of the ongoing events.
+
+    Loaded once, then kept current from a change stream on the database (or,
+    when change streams are unavailable, by reloading every `poll_interval`
+    seconds). Events are indexed by event_id and by sport_category; both
+    indexes keep their ids sorted, so pages in event_id order are a bisect
+    away. Until the first load has finished `ready` is False and callers
+    should read from Mongo instead.
+
+    The change stream also carries the bumps of the events version counter.
+    Those are written after the event itself, so the version the view reports
+    never runs ahead of its data.
+
+    Writes made by this process are applied right away as well, so its own
+    readers never see an older state than the one a write returned. Writes
+    applied while a reload is reading are applied again on top of what it
+    read.
+    """
+
+    def __init__(self, poll_interval=ONGOING_VIEW_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.version = 0
+        self.ready = False
+        self._events = {}
+        self._ids = []
+        self._by_category = {}
+        self._by_doc_id = {}
+        self._listing = None
+        self._resume_token = None
+        # Events version from which every insert has gone to insert_listeners,
+        # while the change stream is followed without a gap; None otherwise
+        self.followed_since = None
+        # Updates applied since the current reload started reading, or None
+        self._updates_during_reload = None
+        self._lock = threading.Lock()
+        # Called with every event document inserted by anyone, while the
+        # change stream is followed
+        self.insert_listeners = []
+
+    def start(self, db):
+        threading.Thread(target=self._run, args=(db,), name='ongoing-view', daemon=True).start()
+
+    # Reads
+
+    def listing(self):
+        """(version, rows) for /api/sports/ongoing-events, or None if not ready."""
+        with self._lock:
+            if not self.ready:
+                return None
+            if self._listing is None:
+                self._listing = (self.version, [self._events[event_id].to_dict(ONGOING_EVENT_FIELDS)
+                                                for event_id in self._ids])
+            return self._listing
+
+    def game(self, event_id):
+        with self._lock:
+            return self._events.get(event_id) if self.ready else None
+
+    def page(self, category, after, limit):
+        """Up to `limit` events of `category` (all if empty) with an event_id
+        above `after`, in event_id order, as dicts."""
+        with self._lock:
+            ids = self._by_category.get(category, []) if category else self._ids
+            start = bisect.bisect_right(ids, after) if after else 0
+            return [self._events[event_id].to_dict() for event_id in ids[start:start + limit]]
+
+    # Updates
+
+    def replace(self, version, docs):
+        # Built aside and swapped in at once, so a failure leaves the old
+        # state intact
+        events = {}
+        for doc in docs:
+            if valid_event_id(doc.get('event_id')):
+                events[doc['event_id']] = OngoingEvent(doc)
+        by_category = {}
+        for event_id, event in events.items():
+            by_category.setdefault(event.get('sport_category'), []).append(event_id)
+        for category_ids in by_category.values():
+            category_ids.sort()
+        by_doc_id = {event.doc_id: event for event in events.values() if event.doc_id is not None}
+        ids = sorted(events)
+        skipped = len(docs) - len(events)
+        if skipped:
+            print(f"WARNING: Ongoing events view skipped {skipped} events without a string event_id")
+
+        with self._lock:
+            self._events, self._ids, self._by_category, self._by_doc_id = events, ids, by_category, by_doc_id
+            for update in self._updates_during_reload or ():
+                update()
+            self._updates_during_reload = None
+            self.version = version
+            self._listing = None
+            self.ready = True
+            VIEW_EVENTS.set(len(events))
+
+    def invalidate(self):
+        """Stops serving until the next successful reload."""
+        with self._lock:
+            self.ready = False
+            self._listing = None
+
+    def apply(self, doc):
+        """Takes the current state of an event document: adds or refreshes it
+        while it is ongoing and drops it otherwise."""
+        with self._lock:
+            self._update(lambda: self._apply(doc))
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._update(lambda: self._remove_doc(doc_id))
+
+    def _update(self, update):
+        if self._updates_during_reload is not None:
+            self._updates_during_reload.append(update)
+        update()
+        self._listing = None
+        VIEW_EVENTS.set(len(self._events))
+
+    def _apply(self, doc):
+        event_id = doc.get('event_id')
+        current = self._events.get(event_id)
+        if current is not None and current.get('version', 0) > doc.get('version', 0):
+            return
+        if current is not None:
+            self._remove(current)
+        if valid_event_id(event_id) and doc.get('event_status') == 'ongoing':
+            event = OngoingEvent(doc)
+            if event.doc_id is None and current is not None:
+                # Written back without its _id (a projection)
+                event.doc_id = current.doc_id
+            self._add(event)
+
+    def _remove_doc(self, doc_id):
+        current = self._by_doc_id.get(doc_id)
+        if current is not None:
+            self._remove(current)
+
+    def set_version(self, version):
+        with self._lock:
+            if version > self.version:
+                self.version = version
+                self._listing = None
+
+    def _add(self, event):
+        self._events[event.event_id] = event
+        bisect.insort(self._ids, event.event_id)
+        bisect.insort(self._by_category.setdefault(event.get('sport_category'), []), event.event_id)
+        if event.doc_id is not None:
+            self._by_doc_id[event.doc_id] = event
+
+    def _remove(self, event):
+        del self._events[event.event_id]
+        self._ids.pop(bisect.bisect_left(self._ids, event.event_id))
+        category_ids = self._by_category[event.get('sport_category')]
+        category_ids.pop(bisect.bisect_left(category_ids, event.event_id))
+        if not category_ids:
+            del self._by_category[event.get('sport_category')]
+        self._by_doc_id.pop(event.doc_id, None)
+
+    # Background sync
+
+    def reload(self, db):
+        # Version first, as in load_ongoing_events: data newer than the
+        # version only costs a client one extra full response.
+        with self._lock:
+            self._updates_during_reload = []
+        try:
+            version = collection_version(db, 'events')
+            docs = list(db.events.find({"event_status": "ongoing", "event_id": {"$exists": True}}, VIEW_PROJECTION))
+        except BaseException:
+            with self._lock:
+                self._updates_during_reload = None
+            raise
+        self.replace(version, docs)
+
+    def apply_change(self, change):
+        """Applies one change stream event. Returns False when the stream
+        can't be followed any further and the view has to be reloaded."""
+        operation = change['operationType']
+        if operation in RELOAD_OPERATIONS:
+            return False
+        if change['ns']['coll'] == 'counters':
+            if change.get('fullDocument'):
+                self.set_version(change['fullDocument'].get('version', 0))
+        elif operation == 'delete' or change.get('fullDocument') is None:
+            # An update whose document was deleted before it could be looked up
+            self.remove(change['documentKey']['_id'])
+        else:
+            self.apply(change['fullDocument'])
+            if operation == 'insert':
+                for listener in self.insert_listeners:
+                    listener(change['fullDocument'])
+        VIEW_CHANGES.labels('change_stream').inc()
+        return True
+
+    def _run(self, db):
+        follow = True
+        while True:
+            try:
+                if follow:
+                    follow = self._follow(db)
+                    if not follow:
+                        print(f"Change streams unavailable, reloading ongoing events every {self.poll_interval}s")
+                else:
+                    self._poll(db)
+            except PyMongoError as e:
+                # Resuming from the last token picks up where the stream
+                # stopped; meanwhile reads are served from what is in memory.
+                print(f"WARNING: Ongoing events view interrupted: {e}")
+                time.sleep(ONGOING_VIEW_RETRY_INTERVAL)
+            except Exception as e:
+                # The view may no longer match the database: read from Mongo
+                # until a full reload has succeeded
+                print(f"ERROR: Ongoing events view failed, falling back to Mongo: {e!r}")
+                self.invalidate()
+                self._resume_token = None
+                self.followed_since = None
+                time.sleep(ONGOING_VIEW_RETRY_INTERVAL)
+
+    def _follow(self, db):
+        """Follows the change stream until it has to be reopened (returns
+        True) or returns False right away if change streams are unsupported."""
+        try:
+            stream = db.watch(CHANGE_PIPELINE, full_document='updateLookup', resume_after=self._resume_token)
+        except OperationFailure as e:
+            if self._resume_token is not None:
+                # The token fell off the oplog; start over from a fresh load
+                print(f"WARNING: Cannot resume ongoing events change stream: {e}")
+                self._resume_token = None
+                self.followed_since = None
+                return True
+            return False
+        with stream:
+            VIEW_FOLLOWING.set(1)
+            if self._resume_token is None:
+                # Loaded after the stream is open, so no change falls in between;
+                # changes already in the load are applied again harmlessly.
+                self.reload(db)
+                self.followed_since = self.version
+                print(f"Ongoing events view loaded: {len(self._events)} events, following changes")
+            for change in stream:
+                if not self.apply_change(change):
+                    self._resume_token = None
+                    self.followed_since = None
+                    return True
+                self._resume_token = stream.resume_token
+        return True
+
+    def _poll(self, db):
+        VIEW_FOLLOWING.set(0)
+        while True:
+            self.reload(db)
+            VIEW_CHANGES.labels('poll').inc()
+            time.sleep(self.poll_interval)
@@ -0,0 +1,213 @@
+import os
+import queue
+import threading
+import time
+import msgpack
+from prometheus_client import Counter
+from feed import redis_client, REDIS_STARTUP_NODES
+
+SHARED_CACHE_HITS = Counter('sports_shared_cache_hits_total', 'Lookups answered by the Redis cache tier', ['namespace'])
+SHARED_CACHE_MISSES = Counter('sports_shared_cache_misses_total', 'Lookups the Redis cache tier could not answer',
+                              ['namespace'])
+SHARED_CACHE_ERRORS = Counter('sports_shared_cache_errors_total', 'Failed calls to the Redis cache tier', ['operation'])
+SHARED_CACHE_DROPPED = Counter('sports_shared_cache_writes_dropped_total',
+                               'Writes to the Redis cache tier dropped because the write queue was full')
+
+# The Redis tier is used when REDIS_STARTUP_NODES is set, unless SHARED_CACHE=0
+SHARED_CACHE_ENABLED = bool(REDIS_STARTUP_NODES) and os.environ.get('SHARED_CACHE', '1') != '0'
+# Part of every key: bump it when the cached payloads change shape, and
+# entries written by older releases are simply never read again
+SHARED_CACHE_FORMAT = os.environ.get('SHARED_CACHE_FORMAT', 'v2')
+SHARED_CACHE_TIMEOUT = float(os.environ.get('SHARED_CACHE_TIMEOUT_MS', 50)) / 1000
+# After a failed call the tier is skipped for this long, in seconds, so a
+# Redis outage doesn't add a timeout to every request
+SHARED_CACHE_BACKOFF = 5
+WRITE_QUEUE_SIZE = 10000
+
+# KEYS[1]: entry hash; ARGV: entry, version ('' when unversioned), ttl.
+# An entry never replaces a newer version of itself, and never replaces a
+# tombstone of its own version: it was read before the write that removed it.
+SET_IF_NEWER = """
+local version = tonumber(ARGV[2])
+if version then
+  local stored = redis.call('HMGET', KEYS[1], 'version', 'entry')
+  local stored_version = tonumber(stored[1])
+  if stored_version and (stored_version > version or (stored_version == version and not stored[2])) then
+    return 0
+  end
+  redis.call('HSET', KEYS[1], 'entry', ARGV[1], 'version', version)
+else
+  redis.call('HSET', KEYS[1], 'entry', ARGV[1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+# KEYS[1]: entry hash; ARGV: version ('' when unknown), ttl. Drops the entry
+# but keeps the highest version seen, so that values read before the delete
+# can't be written back.
+DELETE_KEEPING_VERSION = """
+local version = tonumber(ARGV[1])
+local stored = tonumber(redis.call('HGET', KEYS[1], 'version'))
+if stored and (not version or stored > version) then
+  version = stored
+end
+if not version then
+  return redis.call('DEL', KEYS[1])
+end
+redis.call('HDEL', KEYS[1], 'entry')
+redis.call('HSET', KEYS[1], 'version', version)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+class SharedCache:
+    """Cache tier in the Redis cluster, shared by every replica.
+
+    Entries are msgpack-encoded [generation, written_at, value], in the
+    `entry` field of a hash under `<prefix>:<format>:<namespace>:<key>`.
+    Entries written with a version (the document version of a game) keep it
+    in the `version` field, and are only stored if it is not older than the
+    one already there; deleting such an entry leaves the version behind as
+    a tombstone until the TTL runs out. A lookup that read a game before a
+    write therefore can't put it back after the write's invalidation,
+    whichever order the replicas' queues send them in. Each namespace has a generation
+    counter; invalidating a whole namespace increments it, which turns every
+    entry written under an older generation into a miss without touching
+    them. Lookups read the generation in the same pipeline as the entries.
+
+    Reads block the caller for one round trip. Writes and invalidations are
+    queued and sent by a background thread in order, so they never delay a
+    response.
+    """
+
+    def __init__(self, ttls, startup_nodes=REDIS_STARTUP_NODES, prefix='sports:cache', client=None):
+        self.ttls = ttls
+        self.prefix = f'{prefix}:{SHARED_CACHE_FORMAT}'
+        self._startup_nodes = startup_nodes
+        self._client = client
+        # Last generation seen per namespace. Entries are written with it; if
+        # it is outdated they are misses, never stale hits.
+        self._generations = {}
+        self._down_until = 0
+        self._writes = None
+        self._scripts = None
+        self._lock = threading.Lock()
+
+    def _key(self, namespace, key):
+        return f'{self.prefix}:{namespace}:{key}'
+
+    def _generation_key(self, namespace):
+        return f'{self.prefix}:generation:{namespace}'
+
+    def _redis(self):
+        if self._client is None:
+            self._client = redis_client(self._startup_nodes, decode_responses=False,
+                                        socket_timeout=SHARED_CACHE_TIMEOUT,
+                                        socket_connect_timeout=SHARED_CACHE_TIMEOUT)
+        return self._client
+
+    def _script(self, name):
+        if self._scripts is None:
+            redis = self._redis()
+            self._scripts = {'set': redis.register_script(SET_IF_NEWER),
+                             'delete': redis.register_script(DELETE_KEEPING_VERSION)}
+        return self._scripts[name]
+
+    def _failed(self, operation, error):
+        SHARED_CACHE_ERRORS.labels(operation).inc()
+        if time.monotonic() >= self._down_until:
+            print(f"WARNING: Redis cache tier unavailable for {SHARED_CACHE_BACKOFF}s: {error}")
+        self._down_until = time.monotonic() + SHARED_CACHE_BACKOFF
+
+    def get_many(self, pairs):
+        """Looks up (namespace, key) pairs in one pipeline. Returns
+        {(namespace, key): (value, written_at)} for the entries found."""
+        if not pairs or time.monotonic() < self._down_until:
+            return {}
+        namespaces = sorted({namespace for namespace, _ in pairs})
+        try:
+            pipeline = self._redis().pipeline()
+            for namespace in namespaces:
+                pipeline.get(self._generation_key(namespace))
+            for namespace, key in pairs:
+                pipeline.hget(self._key(namespace, key), 'entry')
+            replies = pipeline.execute()
+        except Exception as e:
+            self._failed('get', e)
+            return {}
+
+        generations = {namespace: int(reply or 0) for namespace, reply in zip(namespaces, replies)}
+        self._generations.update(generations)
+        found = {}
+        for (namespace, key), reply in zip(pairs, replies[len(namespaces):]):
+            if reply is not None:
+                try:
+                    generation, written_at, value = msgpack.unpackb(reply, raw=False)
+                except (TypeError, ValueError):
+                    generation = None
+                if generation == generations[namespace]:
+                    found[(namespace, key)] = (value, written_at)
+                    SHARED_CACHE_HITS.labels(namespace).inc()
+                    continue
+            SHARED_CACHE_MISSES.labels(namespace).inc()
+        return found
+
+    def set(self, namespace, key, value, version=None):
+        try:
+            entry = msgpack.packb([self._generations.get(namespace), time.time(), value], use_bin_type=True)
+        except (TypeError, ValueError) as e:
+            print(f"WARNING: Cannot store {namespace}/{key} in the Redis cache tier: {e}")
+            return
+        self._queue(('set', namespace, key, entry, version))
+
+    def delete(self, namespace, key, version=None):
+        """`version` is the version the entry must not be written back at
+        or below, if the caller knows one (e.g. of a deleted game)."""
+        self._queue(('delete', namespace, key, None, version))
+
+    def invalidate_namespace(self, namespace):
+        self._queue(('invalidate', namespace, None, None, None))
+
+    def _queue(self, write):
+        if self._writes is None:
+            with self._lock:
+                if self._writes is None:
+                    self._writes = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+                    threading.Thread(target=self._write_worker, name='shared-cache-writer', daemon=True).start()
+        try:
+            self._writes.put_nowait(write)
+        except queue.Full:
+            SHARED_CACHE_DROPPED.inc()
+
+    def _write_worker(self):
+        while True:
+            write = self._writes.get()
+            try:
+                if time.monotonic() < self._down_until:
+                    SHARED_CACHE_DROPPED.inc()
+                else:
+                    self._write(*write)
+            except Exception as e:
+                self._failed(write[0], e)
+            finally:
+                self._writes.task_done()
+
+    def _write(self, operation, namespace, key, entry, version):
+        redis = self._redis()
+        ttl = max(1, round(self.ttls[namespace]))
+        version = '' if version is None else version
+        if operation == 'delete':
+            self._script('delete')(keys=[self._key(namespace, key)], args=[version, ttl])
+        elif operation == 'invalidate':
+            self._generations[namespace] = redis.incr(self._generation_key(namespace))
+        else:
+            generation, written_at, value = msgpack.unpackb(entry, raw=False)
+            if generation is None:
+                # Nothing had been read from this namespace when the entry was
+                # made; tag it with the current generation
+                if self._generations.get(namespace) is None:
+                    self._generations[namespace] = int(redis.get(self._generation_key(namespace)) or 0)
+                entry = msgpack.packb([self._generations[namespace], written_at, value], use_bin_type=True)
+            self._script('set')(keys=[self._key(namespace, key)], args=[entry, version, ttl])
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from prometheus_client import Counter
+
+SINGLEFLIGHT_CALLS = Counter('sports_singleflight_calls_total',
+                             'Lookups by whether they issued the query or waited for an identical one in flight',
+                             ['name', 'outcome'])
+
+
+class SingleFlight:
+    """Coalesces identical concurrent lookups.
+
+    The first caller for a key runs `fn`; callers that arrive while it is
+    running wait for it and get the same result (or exception) instead of
+    issuing the query again. Nothing is kept once the call has finished, so
+    this only removes duplicate work, it never serves stale data.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            SINGLEFLIGHT_CALLS.labels(self.name, 'coalesced').inc()
+            return future.result()
+
+        SINGLEFLIGHT_CALLS.labels(self.name, 'issued').inc()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines; `fn` returns an awaitable. All callers
+    must run on the same event loop.
+
+    The call runs in a task of its own that every caller awaits through a
+    shield, so a caller that is cancelled (a client that went away) stops
+    waiting without cancelling the call for the others.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is not None:
+            SINGLEFLIGHT_CALLS.labels(self.name, 'coalesced').inc()
+        else:
+            SINGLEFLIGHT_CALLS.labels(self.name, 'issued').inc()
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        del self._calls[key]
+        if not task.cancelled():
+            # Marks it retrieved, so asyncio doesn't complain when every
+            # waiter had gone
+            task.exception()
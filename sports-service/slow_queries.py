@@ -0,0 +1,159 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import monitoring
+from prometheus_client import Counter
+
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+# Number of distinct query shapes remembered; the least recently seen go first
+SLOW_QUERY_SHAPES = int(os.environ.get('SLOW_QUERY_SHAPES', 200))
+# Share of slow commands that may trigger an explain of their shape...
+EXPLAIN_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1))
+# ...at most once per shape per interval, in seconds
+EXPLAIN_INTERVAL = float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', 300))
+
+# Where the filter of each explainable command lives
+FILTER_FIELDS = {
+    'find': lambda command: command.get('filter'),
+    'count': lambda command: command.get('query'),
+    'distinct': lambda command: command.get('query'),
+    'findAndModify': lambda command: command.get('query'),
+    'update': lambda command: (command.get('updates') or [{}])[0].get('q'),
+    'delete': lambda command: (command.get('deletes') or [{}])[0].get('q'),
+    'aggregate': lambda command: next((stage['$match'] for stage in command.get('pipeline', [])
+                                       if isinstance(stage, dict) and '$match' in stage), None),
+}
+# Session and routing fields the driver adds; explain gets its own
+DRIVER_FIELDS = ('lsid', 'txnNumber', 'autocommit', 'startTransaction')
+LOGICAL_OPERATORS = ('$and', '$or', '$nor')
+SLOW_QUERY_SORT_KEYS = ('worst_ms', 'count', 'total_ms', 'mean_ms')
+
+
+def normalize(value):
+    """Replaces literal values by '?' so queries that differ only in their
+    arguments share one shape."""
+    if not isinstance(value, dict):
+        return '?'
+    shape = {}
+    for key, item in value.items():
+        if key in LOGICAL_OPERATORS and isinstance(item, list):
+            shape[key] = [normalize(clause) for clause in item]
+        elif isinstance(item, dict):
+            shape[key] = normalize(item)
+        else:
+            shape[key] = '?'
+    return shape
+
+
+def plan_summary(plan):
+    """Stage chain of a winning plan, e.g. 'FETCH <- IXSCAN event_id_1'."""
+    stages = []
+    while plan:
+        stage = plan.get('stage', '?')
+        if plan.get('indexName'):
+            stage += f" {plan['indexName']}"
+        stages.append(stage)
+        plan = plan.get('inputStage') or (plan.get('inputStages') or [None])[0]
+    return ' <- '.join(stages)
+
+
+class SlowQueryRecorder(monitoring.CommandListener):
+    """Keeps the slowest Mongo query shapes of this process.
+
+    Every command that takes at least `threshold_ms` is folded into an entry
+    for its normalized shape (database, collection, command, filter) with a
+    count, total and worst latency. Now and then the shape is explained in the
+    background, so the entry also shows which plan the server picked (a
+    COLLSCAN is the usual culprit).
+    """
+
+    def __init__(self, prefix, threshold_ms=SLOW_QUERY_THRESHOLD_MS, capacity=SLOW_QUERY_SHAPES,
+                 explain_sample_rate=EXPLAIN_SAMPLE_RATE, explain_interval=EXPLAIN_INTERVAL):
+        self.threshold_ms = threshold_ms
+        self.capacity = capacity
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_interval = explain_interval
+        self.slow_commands = Counter(f'{prefix}_mongo_slow_commands_total',
+                                     'Mongo commands slower than the slow query threshold', ['collection', 'command'])
+        self._client_getter = None
+        self._pending = {}
+        self._shapes = OrderedDict()
+        self._lock = threading.Lock()
+        self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+
+    def bind(self, client_getter):
+        """Explains run through the client returned by `client_getter`."""
+        self._client_getter = client_getter
+
+    def started(self, event):
+        if event.command_name == 'explain':
+            return
+        with self._lock:
+            self._pending[event.request_id] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        with self._lock:
+            pending = self._pending.pop(event.request_id, None)
+        duration_ms = event.duration_micros / 1000
+        if pending is None or duration_ms < self.threshold_ms:
+            return
+        self.record(pending[0], event.command_name, pending[1], duration_ms)
+
+    def record(self, database, command_name, command, duration_ms):
+        collection = command.get(command_name) if isinstance(command.get(command_name), str) else ''
+        filter_fn = FILTER_FIELDS.get(command_name)
+        shape = normalize(filter_fn(command) or {}) if filter_fn else None
+        key = (database, collection, command_name, json.dumps(shape, sort_keys=True))
+        self.slow_commands.labels(collection, command_name).inc()
+
+        now = time.time()
+        with self._lock:
+            entry = self._shapes.get(key)
+            if entry is None:
+                entry = {"database": database, "collection": collection, "command": command_name, "shape": shape,
+                         "count": 0, "total_ms": 0.0, "worst_ms": 0.0, "last_seen": now,
+                         "plan": None, "explained_at": None}
+                self._shapes[key] = entry
+                while len(self._shapes) > self.capacity:
+                    self._shapes.popitem(last=False)
+            self._shapes.move_to_end(key)
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["worst_ms"] = max(entry["worst_ms"], duration_ms)
+            entry["last_seen"] = now
+            explain = (filter_fn is not None and self._client_getter is not None
+                       and (entry["explained_at"] is None or now - entry["explained_at"] >= self.explain_interval)
+                       and random.random() < self.explain_sample_rate)
+            if explain:
+                entry["explained_at"] = now
+        if explain:
+            self._explainer.submit(self._explain, entry, database, command)
+
+    def _explain(self, entry, database, command):
+        explained = {key: value for key, value in command.items()
+                     if not key.startswith('$') and key not in DRIVER_FIELDS}
+        try:
+            result = self._client_getter()[database].command({'explain': explained, 'verbosity': 'queryPlanner'})
+        except Exception as e:
+            plan = f"explain failed: {e}"
+        else:
+            planner = result.get('queryPlanner', {})
+            plan = plan_summary(planner.get('winningPlan', {}))
+        with self._lock:
+            entry["plan"] = plan
+
+    def top(self, limit=20, sort='worst_ms'):
+        with self._lock:
+            entries = [dict(entry, mean_ms=entry["total_ms"] / entry["count"]) for entry in self._shapes.values()]
+        entries.sort(key=lambda entry: entry.get(sort, 0), reverse=True)
+        return entries[:limit]
@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x14sports_service.proto\x12\rsportsservice\"\x1e\n\x0bPingRequest\x12\x0f\n\x07message\x18\x01 \x01(\t\".\n\x0cPingResponse\x12\x10\n\x08response\x18\x01 \x01(\t\x12\x0c\n\x04load\x18\x02 \x01(\x05\x32P\n\rSportsService\x12?\n\x04Ping\x12\x1a.sportsservice.PingRequest\x1a\x1b.sportsservice.PingResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x14sports_service.proto\x12\rsportsservice\"\x1e\n\x0bPingRequest\x12\x0f\n\x07message\x18\x01 \x01(\t\".\n\x0cPingResponse\x12\x10\n\x08response\x18\x01 \x01(\t\x12\x0c\n\x04load\x18\x02 \x01(\x05\"\xf1\x01\n\x12UpdateScoreRequest\x12\x0f\n\x07game_id\x18\x01 \x01(\t\x12\x12\n\ninc_team_1\x18\x02 \x01(\x05\x12\x12\n\ninc_team_2\x18\x03 \x01(\x05\x12\x19\n\x0cscore_team_1\x18\x04 \x01(\x05H\x00\x88\x01\x01\x12\x19\n\x0cscore_team_2\x18\x05 \x01(\x05H\x01\x88\x01\x01\x12\x13\n\x06status\x18\x06 \x01(\tH\x02\x88\x01\x01\x12\x19\n\x0c\x65vent_status\x18\x07 \x01(\tH\x03\x88\x01\x01\x42\x0f\n\r_score_team_1B\x0f\n\r_score_team_2B\t\n\x07_statusB\x0f\n\r_event_status\"\xb2\x01\n\x04Game\x12\x0f\n\x07game_id\x18\x01 \x01(\t\x12\x0e\n\x06team_1\x18\x02 \x01(\t\x12\x0e\n\x06team_2\x18\x03 \x01(\t\x12\x14\n\x0cscore_team_1\x18\x04 \x01(\x05\x12\x14\n\x0cscore_team_2\x18\x05 \x01(\x05\x12\x0e\n\x06status\x18\x06 \x01(\t\x12\x16\n\x0esport_category\x18\x07 \x01(\t\x12\x14\n\x0c\x65vent_status\x18\x08 \x01(\t\x12\x0f\n\x07version\x18\t \x01(\x03\":\n\x10WatchGameRequest\x12\x0f\n\x07game_id\x18\x01 \x01(\t\x12\x15\n\rsince_version\x18\x02 \x01(\x03\"@\n\x13WatchOngoingRequest\x12\x16\n\x0esport_category\x18\x01 \x01(\t\x12\x11\n\tsince_seq\x18\x02 \x01(\x03\"\xda\x02\n\nScoreDelta\x12\x0f\n\x07game_id\x18\x01 \x01(\t\x12\x0f\n\x07version\x18\x02 \x01(\x03\x12\x0b\n\x03seq\x18\x03 \x01(\x03\x12\x16\n\x0esport_category\x18\x04 \x01(\t\x12\x19\n\x0cscore_team_1\x18\x05 \x01(\x05H\x00\x88\x01\x01\x12\x19\n\x0cscore_team_2\x18\x06 \x01(\x05H\x01\x88\x01\x01\x12\x13\n\x06status\x18\x07 \x01(\tH\x02\x88\x01\x01\x12\x19\n\x0c\x65vent_status\x18\x08 \x01(\tH\x03\x88\x01\x01\x12\x13\n\x06team_1\x18\t \x01(\tH\x04\x88\x01\x01\x12\x13\n\x06team_2\x18\n \x01(\tH\x05\x88\x01\x01\x12\x10\n\x08snapshot\x18\x0b \x01(\x08\x12\x0f\n\x07\x64\x65leted\x18\x0c \x01(\x08\x42\x0f\n\r_score_team_1B\x0f\n\r_score_team_2B\t\n\x07_statusB\x0f\n\r_event_statusB\t\n\x07_team_1B\t\n\x07_team_2\"#\n\x0fGetGamesRequest\x12\x10\n\x08game_ids\x18\x01 \x03(\t\"K\n\x10GetGamesResponse\x12\"\n\x05games\x18\x01 \x03(\x0b\x32\x13.sportsservice.Game\x12\x13\n\x0bmissing_ids\x18\x02 \x03(\t\"Y\n\x18ListOngoingEventsRequest\x12\x16\n\x0esport_category\x18\x01 \x01(\t\x12\x12\n\npage_token\x18\x02 \x01(\t\x12\x11\n\tpage_size\x18\x03 \x01(\x05\"X\n\x19ListOngoingEventsResponse\x12\"\n\x05games\x18\x01 \x03(\x0b\x32\x13.sportsservice.Game\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\"\'\n\x10WatchLoadRequest\x12\x13\n\x0binterval_ms\x18\x01 \x01(\x05\"\\\n\nLoadReport\x12\x11\n\tin_flight\x18\x01 \x01(\x05\x12\x14\n\x0crequest_rate\x18\x02 \x01(\x01\x12\x17\n\x0flatency_ewma_ms\x18\x03 \x01(\x01\x12\x0c\n\x04load\x18\x04 \x01(\x05\x32\xb3\x04\n\rSportsService\x12?\n\x04Ping\x12\x1a.sportsservice.PingRequest\x1a\x1b.sportsservice.PingResponse\x12\x45\n\x0bUpdateScore\x12!.sportsservice.UpdateScoreRequest\x1a\x13.sportsservice.Game\x12I\n\tWatchGame\x12\x1f.sportsservice.WatchGameRequest\x1a\x19.sportsservice.ScoreDelta0\x01\x12O\n\x0cWatchOngoing\x12\".sportsservice.WatchOngoingRequest\x1a\x19.sportsservice.ScoreDelta0\x01\x12K\n\x08GetGames\x12\x1e.sportsservice.GetGamesRequest\x1a\x1f.sportsservice.GetGamesResponse\x12\x66\n\x11ListOngoingEvents\x12\'.sportsservice.ListOngoingEventsRequest\x1a(.sportsservice.ListOngoingEventsResponse\x12I\n\tWatchLoad\x12\x1f.sportsservice.WatchLoadRequest\x1a\x19.sportsservice.LoadReport0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -35,6 +35,28 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_PINGREQUEST']._serialized_end=69
   _globals['_PINGRESPONSE']._serialized_start=71
   _globals['_PINGRESPONSE']._serialized_end=117
-  _globals['_SPORTSSERVICE']._serialized_start=119
-  _globals['_SPORTSSERVICE']._serialized_end=199
+  _globals['_UPDATESCOREREQUEST']._serialized_start=120
+  _globals['_UPDATESCOREREQUEST']._serialized_end=361
+  _globals['_GAME']._serialized_start=364
+  _globals['_GAME']._serialized_end=542
+  _globals['_WATCHGAMEREQUEST']._serialized_start=544
+  _globals['_WATCHGAMEREQUEST']._serialized_end=602
+  _globals['_WATCHONGOINGREQUEST']._serialized_start=604
+  _globals['_WATCHONGOINGREQUEST']._serialized_end=668
+  _globals['_SCOREDELTA']._serialized_start=671
+  _globals['_SCOREDELTA']._serialized_end=1017
+  _globals['_GETGAMESREQUEST']._serialized_start=1019
+  _globals['_GETGAMESREQUEST']._serialized_end=1054
+  _globals['_GETGAMESRESPONSE']._serialized_start=1056
+  _globals['_GETGAMESRESPONSE']._serialized_end=1131
+  _globals['_LISTONGOINGEVENTSREQUEST']._serialized_start=1133
+  _globals['_LISTONGOINGEVENTSREQUEST']._serialized_end=1222
+  _globals['_LISTONGOINGEVENTSRESPONSE']._serialized_start=1224
+  _globals['_LISTONGOINGEVENTSRESPONSE']._serialized_end=1312
+  _globals['_WATCHLOADREQUEST']._serialized_start=1314
+  _globals['_WATCHLOADREQUEST']._serialized_end=1353
+  _globals['_LOADREPORT']._serialized_start=1355
+  _globals['_LOADREPORT']._serialized_end=1447
+  _globals['_SPORTSSERVICE']._serialized_start=1450
+  _globals['_SPORTSSERVICE']._serialized_end=2013
 # @@protoc_insertion_point(module_scope)
@@ -39,6 +39,36 @@ class SportsServiceStub(object):
                 request_serializer=sports__service__pb2.PingRequest.SerializeToString,
                 response_deserializer=sports__service__pb2.PingResponse.FromString,
                 _registered_method=True)
+        self.UpdateScore = channel.unary_unary(
+                '/sportsservice.SportsService/UpdateScore',
+                request_serializer=sports__service__pb2.UpdateScoreRequest.SerializeToString,
+                response_deserializer=sports__service__pb2.Game.FromString,
+                _registered_method=True)
+        self.WatchGame = channel.unary_stream(
+                '/sportsservice.SportsService/WatchGame',
+                request_serializer=sports__service__pb2.WatchGameRequest.SerializeToString,
+                response_deserializer=sports__service__pb2.ScoreDelta.FromString,
+                _registered_method=True)
+        self.WatchOngoing = channel.unary_stream(
+                '/sportsservice.SportsService/WatchOngoing',
+                request_serializer=sports__service__pb2.WatchOngoingRequest.SerializeToString,
+                response_deserializer=sports__service__pb2.ScoreDelta.FromString,
+                _registered_method=True)
+        self.GetGames = channel.unary_unary(
+                '/sportsservice.SportsService/GetGames',
+                request_serializer=sports__service__pb2.GetGamesRequest.SerializeToString,
+                response_deserializer=sports__service__pb2.GetGamesResponse.FromString,
+                _registered_method=True)
+        self.ListOngoingEvents = channel.unary_unary(
+                '/sportsservice.SportsService/ListOngoingEvents',
+                request_serializer=sports__service__pb2.ListOngoingEventsRequest.SerializeToString,
+                response_deserializer=sports__service__pb2.ListOngoingEventsResponse.FromString,
+                _registered_method=True)
+        self.WatchLoad = channel.unary_stream(
+                '/sportsservice.SportsService/WatchLoad',
+                request_serializer=sports__service__pb2.WatchLoadRequest.SerializeToString,
+                response_deserializer=sports__service__pb2.LoadReport.FromString,
+                _registered_method=True)
 
 
 class SportsServiceServicer(object):
@@ -50,6 +80,42 @@ class SportsServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def UpdateScore(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchGame(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchOngoing(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetGames(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ListOngoingEvents(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchLoad(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_SportsServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -58,6 +124,36 @@ def add_SportsServiceServicer_to_server(servicer, server):
                     request_deserializer=sports__service__pb2.PingRequest.FromString,
                     response_serializer=sports__service__pb2.PingResponse.SerializeToString,
             ),
+            'UpdateScore': grpc.unary_unary_rpc_method_handler(
+                    servicer.UpdateScore,
+                    request_deserializer=sports__service__pb2.UpdateScoreRequest.FromString,
+                    response_serializer=sports__service__pb2.Game.SerializeToString,
+            ),
+            'WatchGame': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchGame,
+                    request_deserializer=sports__service__pb2.WatchGameRequest.FromString,
+                    response_serializer=sports__service__pb2.ScoreDelta.SerializeToString,
+            ),
+            'WatchOngoing': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchOngoing,
+                    request_deserializer=sports__service__pb2.WatchOngoingRequest.FromString,
+                    response_serializer=sports__service__pb2.ScoreDelta.SerializeToString,
+            ),
+            'GetGames': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetGames,
+                    request_deserializer=sports__service__pb2.GetGamesRequest.FromString,
+                    response_serializer=sports__service__pb2.GetGamesResponse.SerializeToString,
+            ),
+            'ListOngoingEvents': grpc.unary_unary_rpc_method_handler(
+                    servicer.ListOngoingEvents,
+                    request_deserializer=sports__service__pb2.ListOngoingEventsRequest.FromString,
+                    response_serializer=sports__service__pb2.ListOngoingEventsResponse.SerializeToString,
+            ),
+            'WatchLoad': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchLoad,
+                    request_deserializer=sports__service__pb2.WatchLoadRequest.FromString,
+                    response_serializer=sports__service__pb2.LoadReport.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'sportsservice.SportsService', rpc_method_handlers)
@@ -95,3 +191,165 @@ class SportsService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def UpdateScore(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/sportsservice.SportsService/UpdateScore',
+            sports__service__pb2.UpdateScoreRequest.SerializeToString,
+            sports__service__pb2.Game.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchGame(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/sportsservice.SportsService/WatchGame',
+            sports__service__pb2.WatchGameRequest.SerializeToString,
+            sports__service__pb2.ScoreDelta.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchOngoing(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/sportsservice.SportsService/WatchOngoing',
+            sports__service__pb2.WatchOngoingRequest.SerializeToString,
+            sports__service__pb2.ScoreDelta.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetGames(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/sportsservice.SportsService/GetGames',
+            sports__service__pb2.GetGamesRequest.SerializeToString,
+            sports__service__pb2.GetGamesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ListOngoingEvents(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/sportsservice.SportsService/ListOngoingEvents',
+            sports__service__pb2.ListOngoingEventsRequest.SerializeToString,
+            sports__service__pb2.ListOngoingEventsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchLoad(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/sportsservice.SportsService/WatchLoad',
+            sports__service__pb2.WatchLoadRequest.SerializeToString,
+            sports__service__pb2.LoadReport.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
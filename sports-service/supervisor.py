@@ -0,0 +1,122 @@
+# Process supervisor for the sports service (SPORTS_ROLE=supervisor).
+#
+# Runs the REST server and the gRPC server in separate processes so the two
+# protocol stacks don't compete for one GIL. GRPC_PROCESSES gRPC processes
+# all bind port 50051 with SO_REUSEPORT and the kernel spreads connections
+# over them. Children that die are restarted with exponential backoff; on
+# SIGTERM/SIGINT every child is asked to stop gracefully and killed if it is
+# still around after SHUTDOWN_GRACE_SECONDS.
+#
+# Score deltas reach watchers in other processes only through the Redis
+# relay, so REDIS_STARTUP_NODES should be set in this mode.
+import os
+import signal
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+GRPC_PROCESSES = int(os.environ.get('GRPC_PROCESSES', 2))
+SHUTDOWN_GRACE_SECONDS = float(os.environ.get('SHUTDOWN_GRACE_SECONDS', 10))
+CHECK_INTERVAL = 0.5
+MIN_RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 30.0
+# A child that ran at least this long is considered healthy again, and its
+# restart delay starts over
+STABLE_UPTIME = 30.0
+
+
+class Child:
+    def __init__(self, name, args, env=None):
+        self.name = name
+        self.args = args
+        self.env = env
+        self.process = None
+        self.started_at = None
+        self.restart_delay = MIN_RESTART_DELAY
+        self.restart_at = None
+
+    def start(self):
+        self.process = subprocess.Popen(self.args, env=self.env, cwd=APP_DIR)
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        print(f"Supervisor: started {self.name} (pid {self.process.pid})")
+
+    def exited(self):
+        return self.process is not None and self.process.poll() is not None
+
+    def schedule_restart(self, now):
+        if now - self.started_at >= STABLE_UPTIME:
+            self.restart_delay = MIN_RESTART_DELAY
+        self.restart_at = now + self.restart_delay
+        print(f"Supervisor: {self.name} exited with {self.process.returncode}, "
+              f"restarting in {self.restart_delay:.0f}s")
+        self.restart_delay = min(self.restart_delay * 2, MAX_RESTART_DELAY)
+
+    def signal(self, signum):
+        if self.process is not None and self.process.poll() is None:
+            self.process.send_signal(signum)
+
+
+class Supervisor:
+    def __init__(self, children, grace=SHUTDOWN_GRACE_SECONDS):
+        self.children = children
+        self.grace = grace
+        self.stopping = False
+
+    def start(self):
+        for child in self.children:
+            child.start()
+
+    def check(self, now=None):
+        """Restarts children that exited; called every CHECK_INTERVAL."""
+        now = time.monotonic() if now is None else now
+        for child in self.children:
+            if child.restart_at is not None:
+                if now >= child.restart_at:
+                    child.start()
+            elif child.exited():
+                child.schedule_restart(now)
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def shutdown(self):
+        for child in self.children:
+            child.signal(signal.SIGTERM)
+        deadline = time.monotonic() + self.grace
+        for child in self.children:
+            if child.process is None:
+                continue
+            try:
+                child.process.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                print(f"Supervisor: {child.name} did not stop in time, killing it")
+                child.process.kill()
+                child.process.wait()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.start()
+        try:
+            while not self.stopping:
+                self.check()
+                time.sleep(CHECK_INTERVAL)
+        finally:
+            self.shutdown()
+
+
+def service_children(grpc_processes=GRPC_PROCESSES):
+    app_args = [sys.executable, os.path.join(APP_DIR, 'app.py')]
+    children = [Child('http', app_args, dict(os.environ, SPORTS_ROLE='http'))]
+    for index in range(grpc_processes):
+        children.append(Child(f'grpc-{index}', app_args, dict(os.environ, SPORTS_ROLE='grpc')))
+    return children
+
+
+def supervise():
+    if not os.environ.get('REDIS_STARTUP_NODES'):
+        print("WARNING: REDIS_STARTUP_NODES is not set, gRPC watchers will miss updates made over REST")
+    print(f"Supervisor: running 1 HTTP and {GRPC_PROCESSES} gRPC processes")
+    Supervisor(service_children()).run()
@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+import async_app
+from app import cache
+from limiter import AdaptiveLimiter
+
+
+@pytest.fixture
+def mock_motor(mocker):
+    cache.clear()
+    mock_db = mocker.patch('async_app.db')
+    return mock_db
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_async_game_details_matches_flask_payload(mock_motor):
+    mock_motor.events.find_one = AsyncMock(return_value={"event_id": "a1", "team_1": "A", "team_2": "B",
+                                                         "score_team_1": 1, "score_team_2": 2, "version": 5})
+
+    async def scenario():
+        client = async_app.app.test_client()
+        first = await client.get('/api/sports/games/a1')
+        second = await client.get('/api/sports/games/a1', headers={'If-None-Match': '"a1-5"'})
+        return first.status_code, await first.get_json(), second.status_code
+
+    status_code, body, conditional_status = run(scenario())
+
+    assert status_code == 200
+    assert body == {"status": "success", "data": {"game_id": "a1", "team_1": "A", "team_2": "B",
+                                                  "score_team_1": 1, "score_team_2": 2, "status": "Unknown"}}
+    assert conditional_status == 304
+    mock_motor.events.find_one.assert_awaited_once()
+
+
+def test_async_update_game_score(mock_motor):
+    mock_motor.counters.find_one_and_update = AsyncMock(return_value={"_id": "events", "version": 3})
+    mock_motor.events.find_one_and_update = AsyncMock(return_value={"event_id": "a2", "team_1": "A", "team_2": "B",
+                                                                    "score_team_1": 0, "score_team_2": 1, "version": 2})
+
+    async def scenario():
+        client = async_app.app.test_client()
+        response = await client.patch('/api/sports/games/a2/score', json={"inc": {"score_team_2": 1}})
+        return response.status_code, await response.get_json()
+
+    status_code, body = run(scenario())
+
+    assert status_code == 200
+    assert body["data"]["version"] == 2
+    assert mock_motor.events.find_one_and_update.await_args.args[1] == {"$inc": {"score_team_2": 1, "version": 1}}
+
+
+def test_async_streamed_response_holds_its_slot_until_sent(mock_motor, mocker):
+    limiter = mocker.patch('app.limiter', AdaptiveLimiter(initial_limit=5, min_limit=1))
+    in_flight = []
+
+    class Cursor:
+        def batch_size(self, size):
+            return self
+
+        async def __aiter__(self):
+            in_flight.append(limiter._in_flight)
+            yield {"category_id": "1", "category_name": "football"}
+
+        async def close(self):
+            pass
+
+    mock_motor.categories.find.return_value = Cursor()
+
+    async def scenario():
+        client = async_app.app.test_client()
+        response = await client.get('/api/sports/categories?stream=1')
+        return await response.get_json()
+
+    body = run(scenario())
+
+    assert body == {"status": "success", "data": [{"category_id": "1", "category_name": "football"}]}
+    assert in_flight == [1]
+    assert limiter._in_flight == 0
@@ -0,0 +1,50 @@
+import asyncio
+import threading
+import pytest
+from batch_loader import BatchLoader, AsyncBatchLoader
+
+
+def test_concurrent_lookups_are_resolved_by_one_fetch():
+    fetched = []
+
+    def fetch(keys):
+        fetched.append(sorted(keys))
+        return {key: key.upper() for key in keys if key != "missing"}
+
+    # A long window; the batch is closed early once max_keys have joined
+    loader = BatchLoader('batch_test', 'threads', fetch, window=5, max_keys=4)
+    results = {}
+    threads = [threading.Thread(target=lambda key=key: results.update({key: loader.load(key)}))
+               for key in ["a", "b", "a", "missing", "c"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert results == {"a": "A", "b": "B", "c": "C", "missing": None}
+    assert fetched == [["a", "b", "c", "missing"]]
+
+
+def test_fetch_errors_reach_every_caller():
+    def fetch(keys):
+        raise RuntimeError("mongo down")
+
+    loader = BatchLoader('batch_test', 'errors', fetch, window=0.001)
+    with pytest.raises(RuntimeError):
+        loader.load("a")
+
+
+def test_async_lookups_of_one_loop_pass_share_a_fetch():
+    fetched = []
+
+    async def fetch(keys):
+        fetched.append(sorted(keys))
+        return {key: key * 2 for key in keys}
+
+    loader = AsyncBatchLoader('batch_test', 'async', fetch)
+
+    async def scenario():
+        return await asyncio.gather(loader.load("x"), loader.load("y"), loader.load("x"))
+
+    assert asyncio.run(scenario()) == ["xx", "yy", "xx"]
+    assert fetched == [["x", "y"]]
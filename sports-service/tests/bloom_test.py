@@ -0,0 +1,119 @@
+from unittest.mock import MagicMock
+import app as sports
+from bloom import BloomFilter, KnownGames
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f"game-{i}")
+
+    assert all(f"game-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+    assert 0.001 < bloom.false_positive_rate() < 0.03
+
+
+def test_known_games_keeps_ids_added_while_rebuilding():
+    known = KnownGames(capacity=100)
+    db = MagicMock()
+    assert known.might_exist("anything")
+
+    def find(*args):
+        # A game created while the rebuild reads the collection
+        known.add("new")
+        return [{"event_id": "g1"}, {"event_id": "g2"}]
+    db.events.find.side_effect = find
+    known.rebuild(db)
+
+    assert known.might_exist("g1") and known.might_exist("new")
+    assert not known.might_exist("unknown")
+
+
+def test_unknown_game_is_not_found_without_a_query(mocker):
+    known = KnownGames(capacity=100)
+    db = mocker.patch('app.db')
+    db.counters.find_one.return_value = {"_id": "events", "version": 4}
+    db.counters.find_one_and_update.return_value = {"_id": "events", "version": 5}
+    db.events.find.return_value = [{"event_id": "g1"}]
+    known.rebuild(db)
+    mocker.patch('app.known_games', known)
+    # Inserts have come through the change stream since version 3
+    mocker.patch('app.ongoing_view.followed_since', 3)
+    sports.cache.clear()
+
+    with sports.app.test_client() as client:
+        assert client.get('/api/sports/games/scraped-123').status_code == 404
+        db.events.find_one.assert_not_called()
+
+        client.post('/api/sports/events', json={"event_id": "g9", "team_1": "A", "team_2": "B"})
+        db.events.find_one.return_value = {"event_id": "g9", "team_1": "A", "team_2": "B"}
+        assert client.get('/api/sports/games/g9').status_code == 200
+
+
+def test_negatives_are_confirmed_while_inserts_may_be_missing(mocker):
+    known = KnownGames(capacity=100)
+    db = mocker.patch('app.db')
+    db.counters.find_one.return_value = {"_id": "events", "version": 4}
+    db.events.find.return_value = [{"event_id": "g1"}]
+    known.rebuild(db)
+    mocker.patch('app.known_games', known)
+    mocker.patch('app.ongoing_view.followed_since', None)
+    sports.cache.clear()
+    # Another replica inserted a game; its announcement was lost
+    db.counters.find_one.return_value = {"_id": "event_inserts", "version": 5}
+    known.check(db)
+    assert known._rebuild_requested.is_set()
+    db.events.find_one.return_value = {"event_id": "remote", "team_1": "A", "team_2": "B"}
+
+    with sports.app.test_client() as client:
+        assert client.get('/api/sports/games/remote').status_code == 200
+
+
+def test_filter_built_before_the_stream_was_followed_is_rebuilt():
+    known = KnownGames(capacity=100)
+    db = MagicMock()
+    db.counters.find_one.return_value = {"_id": "events", "version": 4}
+    db.events.find.return_value = [{"event_id": "g1"}]
+    known.rebuild(db)
+    # The insert counter can't be read
+    known.inserts = None
+
+    assert not known.rules_out("unknown", None)
+    assert not known.rules_out("unknown", 6)
+    assert known._rebuild_requested.is_set()
+    assert known.rules_out("unknown", 4)
+    assert not known.rules_out("g1", 4)
+
+
+def test_rejected_games_are_not_cached(mocker):
+    known = KnownGames(capacity=100)
+    db = mocker.patch('app.db')
+    db.counters.find_one.return_value = {"_id": "events", "version": 4}
+    db.events.find.return_value = []
+    known.rebuild(db)
+    mocker.patch('app.known_games', known)
+    mocker.patch('app.ongoing_view.followed_since', 3)
+    sports.cache.clear()
+
+    with sports.app.test_client() as client:
+        assert client.get('/api/sports/games/g5').status_code == 404
+
+    assert sports.cache.get('game', 'g5') == (False, None)
+
+
+def test_negatives_are_trusted_while_no_game_was_inserted():
+    known = KnownGames(capacity=100)
+    db = MagicMock()
+    db.counters.find_one.return_value = {"_id": "events", "version": 4}
+    db.events.find.return_value = [{"event_id": "g1"}]
+    known.rebuild(db)
+
+    # Polling: the change stream isn't followed
+    known.check(db)
+    assert known.rules_out("unknown", None)
+    db.counters.find_one.return_value = {"_id": "event_inserts", "version": 5}
+    known.check(db)
+    assert not known.rules_out("unknown", None)
+    known.rebuild(db)
+    assert known.rules_out("unknown", None)
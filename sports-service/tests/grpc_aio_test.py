@@ -0,0 +1,119 @@
+import asyncio
+import grpc
+import pytest
+import sports_service_pb2
+import sports_service_pb2_grpc
+from app import score_feed
+from grpc_aio import create_server
+from limiter import AdaptiveLimiter
+
+
+@pytest.fixture
+def mock_mongo(mocker):
+    mock_db = mocker.patch('app.db')
+    return mock_db
+
+
+def run_against_server(scenario):
+    async def main():
+        server, port = create_server(0)
+        await server.start()
+        try:
+            async with grpc.aio.insecure_channel(f'localhost:{port}') as channel:
+                return await scenario(sports_service_pb2_grpc.SportsServiceStub(channel))
+        finally:
+            await server.stop(None)
+
+    return asyncio.run(main())
+
+
+def test_aio_get_games_and_compressed_ping(mock_mongo):
+    mock_mongo.events.find.return_value = [{"event_id": "a", "team_1": "A", "team_2": "B", "version": 2}]
+
+    async def scenario(stub):
+        games = await stub.GetGames(sports_service_pb2.GetGamesRequest(game_ids=["a", "missing"]))
+        pong = await stub.Ping(sports_service_pb2.PingRequest(message="hi"),
+                               metadata=[('sports-compression', 'gzip')])
+        return games, pong
+
+    games, pong = run_against_server(scenario)
+
+    assert [game.game_id for game in games.games] == ["a"]
+    assert list(games.missing_ids) == ["missing"]
+    assert pong.response
+
+
+def test_aio_update_score_maps_missing_game_to_not_found(mock_mongo):
+    mock_mongo.events.find_one_and_update.return_value = None
+
+    async def scenario(stub):
+        with pytest.raises(grpc.aio.AioRpcError) as error:
+            await stub.UpdateScore(sports_service_pb2.UpdateScoreRequest(game_id="nope", inc_team_1=1))
+        return error.value.code()
+
+    assert run_against_server(scenario) == grpc.StatusCode.NOT_FOUND
+
+
+def test_aio_watch_game_streams_snapshot_then_live_delta(mock_mongo):
+    mock_mongo.events.find_one.return_value = {"event_id": "aw1", "team_1": "A", "team_2": "B",
+                                               "score_team_1": 0, "score_team_2": 0, "version": 3}
+
+    async def scenario(stub):
+        call = stub.WatchGame(sports_service_pb2.WatchGameRequest(game_id="aw1"))
+        snapshot = await call.read()
+        score_feed.publish({"game_id": "aw1", "version": 4, "seq": 40, "changes": {"score_team_1": 1}})
+        live = await call.read()
+        call.cancel()
+        return snapshot, live
+
+    snapshot, live = run_against_server(scenario)
+
+    assert snapshot.snapshot and snapshot.version == 3
+    assert live.version == 4 and live.score_team_1 == 1
+
+
+def test_aio_watch_load_streams_reports(mock_mongo):
+    async def scenario(stub):
+        call = stub.WatchLoad(sports_service_pb2.WatchLoadRequest(interval_ms=100))
+        reports = [await call.read(), await call.read()]
+        call.cancel()
+        return reports
+
+    reports = run_against_server(scenario)
+
+    assert len(reports) == 2
+    assert all(report.in_flight >= 0 for report in reports)
+
+
+def test_aio_sheds_unary_calls_over_the_limit_but_not_ping(mock_mongo, mocker):
+    limiter = mocker.patch('grpc_aio.limiter', AdaptiveLimiter(initial_limit=1, min_limit=1))
+    assert limiter.try_acquire()
+
+    async def scenario(stub):
+        with pytest.raises(grpc.aio.AioRpcError) as error:
+            await stub.GetGames(sports_service_pb2.GetGamesRequest(game_ids=["a"]))
+        pong = await stub.Ping(sports_service_pb2.PingRequest(message="hi"))
+        return error.value, pong
+
+    error, pong = run_against_server(scenario)
+
+    assert error.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert ('grpc-retry-pushback-ms', '1000') in tuple(error.trailing_metadata())
+    assert pong.response
+
+
+
+def test_aio_calls_are_recorded_with_status_code(mock_mongo):
+    from prometheus_client import REGISTRY
+    mock_mongo.events.find_one_and_update.return_value = None
+    before = REGISTRY.get_sample_value('sports_grpc_request_duration_seconds_count',
+                                       {'method': 'UpdateScore', 'code': 'NOT_FOUND'}) or 0
+
+    async def scenario(stub):
+        with pytest.raises(grpc.aio.AioRpcError):
+            await stub.UpdateScore(sports_service_pb2.UpdateScoreRequest(game_id="nope", inc_team_1=1))
+
+    run_against_server(scenario)
+
+    assert REGISTRY.get_sample_value('sports_grpc_request_duration_seconds_count',
+                                     {'method': 'UpdateScore', 'code': 'NOT_FOUND'}) == before + 1
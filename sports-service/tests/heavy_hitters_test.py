@@ -0,0 +1,66 @@
+import app as sports
+from cache import TTLCache
+from heavy_hitters import CountMinSketch, HeavyHitters
+
+
+def test_count_min_sketch_never_undercounts():
+    sketch = CountMinSketch(width=64, depth=4)
+    for i in range(500):
+        sketch.add(f"game-{i % 50}")
+
+    assert all(sketch.estimate(f"game-{i}") >= 10 for i in range(50))
+    sketch.decay()
+    assert sketch.estimate("game-0") >= 5
+
+
+def test_heavy_hitters_keeps_the_most_requested_keys():
+    hitters = HeavyHitters(k=3, width=1024, depth=4)
+    for key, count in [("a", 50), ("b", 30), ("c", 20), ("d", 5)]:
+        for _ in range(count):
+            hitters.add(key)
+    for i in range(100):
+        hitters.add(f"cold-{i}")
+
+    assert [key for key, _ in hitters.top()] == ["a", "b", "c"]
+    hitters.decay()
+    assert hitters.top(1) == [("a", 25)]
+
+
+def test_heavy_hitters_heap_stays_bounded():
+    hitters = HeavyHitters(k=3, width=1024, depth=4)
+    for i in range(5000):
+        hitters.add(f"key-{i % 4}" if i % 2 else "hot")
+
+    assert len(hitters._heap) <= 6
+    assert hitters.top(1)[0][0] == "hot"
+
+
+def test_pinned_entries_survive_eviction():
+    lru = TTLCache(maxsize=2, ttls={"game": 60})
+    lru.set("game", "hot", 1)
+    lru.pin("game", ["hot"])
+    lru.set("game", "b", 2)
+    lru.set("game", "c", 3)
+
+    assert lru.get("game", "hot") == (True, 1)
+    assert lru.get("game", "b") == (False, None)
+
+
+def test_hot_games_are_pinned_and_refreshed_before_expiry(mocker):
+    mocker.patch('app.hot_keys', sports.HotKeys(sports.HOT_KEY_NAMESPACES))
+    mock_db = mocker.patch('app.db')
+    mock_db.events.find.return_value = [{"event_id": "h1", "team_1": "A", "team_2": "B", "version": 3},
+                                        {"event_id": "h2", "team_1": "C", "team_2": "D", "version": 1}]
+    sports.cache.clear()
+    for game_id in ["h1", "h1", "h2"]:
+        sports.hot_keys.record('game', game_id)
+
+    sports.warm_hot_games()
+
+    assert mock_db.events.find.call_args.args[0]["event_id"]["$in"] == ["h1", "h2"]
+    assert sports.cache.get('game', 'h1')[1][0] == 3
+    with sports.app.test_client() as client:
+        assert client.get('/api/sports/games/h2').status_code == 200
+        report = client.get('/debug/hot-keys?limit=1').get_json()["data"]
+    mock_db.events.find_one.assert_not_called()
+    assert report["game"] == [{"key": "h1", "count": 2}]
@@ -0,0 +1,118 @@
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from flask import Flask
+from lanes import LaneWSGIServer
+
+
+def test_control_requests_do_not_wait_for_saturated_data_lane():
+    release = threading.Event()
+    app = Flask(__name__)
+
+    @app.route('/status')
+    def status():
+        return 'ok'
+
+    @app.route('/slow')
+    def slow():
+        release.wait(5)
+        return 'done'
+
+    server = LaneWSGIServer('127.0.0.1', 0, app, ['/status'], control_workers=1, data_workers=1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    try:
+        slow_requests = [threading.Thread(target=urllib.request.urlopen, args=(base_url + '/slow',)) for _ in range(2)]
+        for request in slow_requests:
+            request.start()
+
+        with urllib.request.urlopen(base_url + '/status?probe=1', timeout=2) as response:
+            assert response.read() == b'ok'
+    finally:
+        release.set()
+        for request in slow_requests:
+            request.join()
+        server.shutdown()
+
+
+def test_idle_connections_do_not_hold_up_others():
+    app = Flask(__name__)
+
+    @app.route('/status')
+    def status():
+        return 'ok'
+
+    server = LaneWSGIServer('127.0.0.1', 0, app, ['/status'], control_workers=1, data_workers=1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    idle = [socket.create_connection(('127.0.0.1', server.server_port)) for _ in range(20)]
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.server_port}/status', timeout=0.5) as response:
+            assert response.read() == b'ok'
+    finally:
+        for connection in idle:
+            connection.close()
+        server.shutdown()
+
+
+def test_data_requests_beyond_the_queue_get_503():
+    release = threading.Event()
+    app = Flask(__name__)
+
+    @app.route('/slow')
+    def slow():
+        release.wait(5)
+        return 'done'
+
+    server = LaneWSGIServer('127.0.0.1', 0, app, ['/status'], control_workers=1, data_workers=1, data_queue_size=1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/slow'
+    try:
+        queued = [threading.Thread(target=urllib.request.urlopen, args=(url,)) for _ in range(2)]
+        for request in queued:
+            request.start()
+            time.sleep(0.2)
+
+        try:
+            urllib.request.urlopen(url, timeout=2)
+            assert False, "expected 503"
+        except urllib.error.HTTPError as e:
+            assert e.code == 503
+            assert e.headers['Retry-After'] == '1'
+    finally:
+        release.set()
+        for request in queued:
+            request.join()
+        server.shutdown()
+
+
+def test_request_line_sent_in_pieces_is_still_classified():
+    release = threading.Event()
+    app = Flask(__name__)
+
+    @app.route('/status')
+    def status():
+        return 'ok'
+
+    @app.route('/slow')
+    def slow():
+        release.wait(5)
+        return 'done'
+
+    server = LaneWSGIServer('127.0.0.1', 0, app, ['/status'], control_workers=1, data_workers=1, data_queue_size=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    busy = threading.Thread(target=urllib.request.urlopen, args=(f'http://127.0.0.1:{server.server_port}/slow',))
+    busy.start()
+    time.sleep(0.2)
+    try:
+        # With the data lane full, a health check taken for a data request would get 503
+        with socket.create_connection(('127.0.0.1', server.server_port), timeout=2) as connection:
+            connection.sendall(b'GET /sta')
+            time.sleep(0.02)
+            connection.sendall(b'tus HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            assert connection.recv(1024).startswith(b'HTTP/1.0 200')
+    finally:
+        release.set()
+        busy.join()
+        server.shutdown()
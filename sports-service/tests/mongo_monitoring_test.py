@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+from prometheus_client import REGISTRY
+from mongo_monitoring import CommandMetricsListener, PoolMetricsListener, command_collection
+
+commands = CommandMetricsListener('monitoring_test')
+pool = PoolMetricsListener('monitoring_test')
+
+
+def test_command_listener_labels_latency_by_collection_and_operation():
+    commands.started(SimpleNamespace(command_name='find', request_id=7,
+                                     command={'find': 'events', 'filter': {'event_id': 'g1'}}))
+    commands.succeeded(SimpleNamespace(command_name='find', request_id=7, duration_micros=1500))
+
+    labels = {'collection': 'events', 'command': 'find'}
+    assert REGISTRY.get_sample_value('monitoring_test_mongo_command_duration_seconds_count', labels) == 1
+    assert REGISTRY.get_sample_value('monitoring_test_mongo_command_duration_seconds_sum', labels) == 0.0015
+
+
+def test_command_collection_handles_get_more_and_explain():
+    assert command_collection('getMore', {'getMore': 12, 'collection': 'events'}) == 'events'
+    assert command_collection('explain', {'explain': {'find': 'users', 'filter': {}}}) == 'users'
+    assert command_collection('ping', {'ping': 1}) == ''
+
+
+def test_pool_listener_tracks_checkout_wait_and_occupancy():
+    pool.connection_created(SimpleNamespace())
+    pool.connection_check_out_started(SimpleNamespace())
+    pool.connection_checked_out(SimpleNamespace())
+
+    assert REGISTRY.get_sample_value('monitoring_test_mongo_pool_checkout_seconds_count') == 1
+    assert REGISTRY.get_sample_value('monitoring_test_mongo_pool_checked_out') == 1
+    pool.connection_checked_in(SimpleNamespace())
+    pool.connection_check_out_failed(SimpleNamespace(reason='timeout'))
+
+    assert REGISTRY.get_sample_value('monitoring_test_mongo_pool_checked_out') == 0
+    assert REGISTRY.get_sample_value('monitoring_test_mongo_pool_connections') == 1
+    assert REGISTRY.get_sample_value('monitoring_test_mongo_pool_checkout_failures_total', {'reason': 'timeout'}) == 1
@@ -0,0 +1,146 @@
+import pytest
+from bson.objectid import ObjectId
+from unittest.mock import MagicMock
+import app as sports
+from ongoing_view import OngoingView
+
+
+def event(doc_id, event_id, category, version=1, status="ongoing", **fields):
+    return dict({"_id": doc_id, "event_id": event_id, "sport_category": category, "version": version,
+                 "event_status": status, "team_1": "A", "team_2": "B", "score_team_1": 0, "score_team_2": 0},
+                **fields)
+
+
+def change(operation, doc=None, coll="events", doc_id=None):
+    return {"operationType": operation, "ns": {"db": "sports_database", "coll": coll},
+            "documentKey": {"_id": doc["_id"] if doc else doc_id}, "fullDocument": doc}
+
+
+@pytest.fixture
+def view():
+    view = OngoingView()
+    view.replace(3, [event(1, "g2", "tennis"), event(2, "g1", "football"), event(3, "g3", "tennis")])
+    return view
+
+
+def test_view_is_not_ready_before_the_first_load():
+    view = OngoingView()
+    assert view.listing() is None
+    assert view.game("g1") is None
+
+
+def test_view_pages_by_category_in_event_id_order(view):
+    assert [game["event_id"] for game in view.page("", None, 10)] == ["g1", "g2", "g3"]
+    assert [game["event_id"] for game in view.page("tennis", "g2", 10)] == ["g3"]
+    assert view.page("curling", None, 10) == []
+
+    version, rows = view.listing()
+    assert version == 3
+    assert rows[0] == {"sport_category": "football", "team_1": "A", "team_2": "B", "score_team_1": 0, "score_team_2": 0}
+
+
+def test_view_follows_changes(view):
+    assert view.apply_change(change("update", event(1, "g2", "tennis", version=5, score_team_1=1)))
+    assert view.game("g2").score_team_1 == 1
+    # A lookup older than what the view holds is ignored
+    view.apply_change(change("update", event(1, "g2", "tennis", version=4)))
+    assert view.game("g2").get("score_team_1") == 1
+
+    view.apply_change(change("update", event(2, "g1", "football", version=6, status="finished")))
+    view.apply_change(change("delete", doc_id=3))
+    view.apply_change(change("insert", event(4, "g4", "tennis")))
+    assert [game["event_id"] for game in view.page("", None, 10)] == ["g2", "g4"]
+
+    view.apply_change(change("update", {"_id": "events", "version": 9}, coll="counters"))
+    assert view.listing()[0] == 9
+    assert not view.apply_change({"operationType": "invalidate"})
+
+
+def test_routes_are_answered_from_the_view(mocker, view):
+    mocker.patch('app.ongoing_view', view)
+    mock_db = mocker.patch('app.db')
+    sports.cache.clear()
+
+    with sports.app.test_client() as client:
+        listing = client.get('/api/sports/ongoing-events')
+        game = client.get('/api/sports/games/g1')
+
+    assert listing.headers['ETag'] == '"ongoing-3"'
+    assert len(listing.get_json()["data"]) == 3
+    assert game.get_json()["data"]["game_id"] == "g1"
+    assert game.headers['ETag'] == '"g1-1"'
+    mock_db.events.find.assert_not_called()
+    mock_db.events.find_one.assert_not_called()
+
+
+def test_insert_listeners_see_inserts_only(view):
+    inserted = []
+    view.insert_listeners.append(lambda doc: inserted.append(doc["event_id"]))
+
+    view.apply_change(change("insert", event(7, "g7", "golf", status="scheduled")))
+    view.apply_change(change("update", event(1, "g2", "tennis", version=2)))
+
+    assert inserted == ["g7"]
+
+
+def test_reload_skips_events_without_a_string_id(view):
+    db = MagicMock()
+    db.counters.find_one.return_value = {"_id": "events", "version": 8}
+    db.events.find.return_value = [event(5, "g5", "golf"), event(6, 6, "golf"), {"_id": 7, "event_status": "ongoing"}]
+
+    view.reload(db)
+
+    assert db.events.find.call_args.args[0] == {"event_status": "ongoing", "event_id": {"$exists": True}}
+    assert [game["event_id"] for game in view.page("", None, 10)] == ["g5"]
+    assert view.listing()[0] == 8
+
+
+def test_failed_sync_falls_back_to_mongo(view, mocker):
+    mocker.patch('ongoing_view.time.sleep', side_effect=SystemExit)
+    db = MagicMock()
+    db.watch.side_effect = RuntimeError("unexpected")
+
+    with pytest.raises(SystemExit):
+        view._run(db)
+
+    assert not view.ready
+    assert view.listing() is None
+
+
+def test_local_writes_are_read_back_from_the_view(mocker):
+    view = OngoingView()
+    view.replace(3, [event(ObjectId("5f0000000000000000000001"), "g1", "tennis", version=5)])
+    mocker.patch('app.ongoing_view', view)
+    mock_db = mocker.patch('app.db')
+    mock_db.counters.find_one_and_update.return_value = {"_id": "events", "version": 7}
+    mock_db.events.find_one_and_update.return_value = dict(event(None, "g1", "tennis", version=6, score_team_1=1))
+    del mock_db.events.find_one_and_update.return_value["_id"]
+    mock_db.events.find_one_and_delete.return_value = {"event_id": "g1", "version": 6}
+    sports.cache.clear()
+
+    with sports.app.test_client() as client:
+        patched = client.patch('/api/sports/games/g1/score', json={"inc": {"score_team_1": 1}})
+        game = client.get('/api/sports/games/g1')
+        assert patched.headers['ETag'] == game.headers['ETag'] == '"g1-6"'
+        assert game.get_json()["data"]["score_team_1"] == 1
+
+        mock_db.events.find_one.return_value = None
+        assert client.delete('/api/sports/events/5f0000000000000000000001').status_code == 200
+        assert view.game("g1") is None
+
+
+def test_writes_during_a_reload_are_not_lost(view):
+    db = MagicMock()
+    db.counters.find_one.return_value = {"_id": "events", "version": 8}
+
+    def find(*args):
+        # Written while the reload reads: the documents read are older
+        view.apply(event(9, "g9", "golf", version=8))
+        view.apply(event(1, "g2", "tennis", version=8, score_team_1=4))
+        return [event(1, "g2", "tennis", version=7), event(2, "g1", "football")]
+    db.events.find.side_effect = find
+
+    view.reload(db)
+
+    assert [game["event_id"] for game in view.page("", None, 10)] == ["g1", "g2", "g9"]
+    assert view.game("g2").score_team_1 == 4
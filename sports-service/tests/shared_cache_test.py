@@ -0,0 +1,170 @@
+import msgpack
+import time
+from cache import TwoTierCache
+from shared_cache import SharedCache, SET_IF_NEWER, DELETE_KEEPING_VERSION
+
+TTLS = {"game": 60, "ongoing": 60}
+
+
+class FakeRedis:
+    """Just the commands and scripts the shared cache uses, in memory."""
+
+    def __init__(self):
+        self.data = {}
+        self.pipelines = 0
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def register_script(self, script):
+        run = {SET_IF_NEWER: self._set_if_newer, DELETE_KEEPING_VERSION: self._delete_keeping_version}[script]
+        return lambda keys, args: run(keys[0], *args)
+
+    def _set_if_newer(self, key, entry, version, ttl):
+        stored = self.data.get(key, {})
+        if version != '' and 'version' in stored:
+            if stored['version'] > version or (stored['version'] == version and 'entry' not in stored):
+                return 0
+        self.data[key] = dict(stored, entry=entry, **({} if version == '' else {'version': version}))
+        return 1
+
+    def _delete_keeping_version(self, key, version, ttl):
+        stored = self.data.pop(key, {})
+        versions = [v for v in (stored.get('version'), None if version == '' else version) if v is not None]
+        if versions:
+            self.data[key] = {'version': max(versions)}
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key) or 0) + 1).encode()
+        return int(self.data[key])
+
+    def pipeline(self):
+        self.pipelines += 1
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.keys = []
+
+    def get(self, key):
+        self.keys.append((key, None))
+
+    def hget(self, key, field):
+        self.keys.append((key, field))
+
+    def execute(self):
+        return [self.redis.get(key) if field is None else self.redis.hget(key, field) for key, field in self.keys]
+
+
+class BrokenRedis:
+    def pipeline(self):
+        raise ConnectionError("cluster down")
+
+
+def replica(redis):
+    shared = SharedCache(TTLS, client=redis)
+    return TwoTierCache(maxsize=100, ttls=TTLS, shared=shared, versioned=("game",)), shared
+
+
+def test_fresh_replica_is_served_from_the_shared_tier():
+    redis = FakeRedis()
+    first, first_shared = replica(redis)
+    second, _ = replica(redis)
+
+    assert first.get_or_load("game", "g1", lambda: (3, {"game_id": "g1"})) == (3, {"game_id": "g1"})
+    first_shared._writes.join()
+
+    loaded = []
+    assert second.get_or_load("game", "g1", lambda: loaded.append(1)) == [3, {"game_id": "g1"}]
+    assert loaded == []
+    # Now held locally as well
+    pipelines = redis.pipelines
+    assert second.get("game", "g1") == (True, [3, {"game_id": "g1"}])
+    assert redis.pipelines == pipelines
+
+
+def test_namespace_invalidation_bumps_the_generation():
+    redis = FakeRedis()
+    writer, writer_shared = replica(redis)
+    writer.set("ongoing", "all", (1, []))
+    writer.set("game", "g2", (2, {"game_id": "g2"}))
+    writer_shared._writes.join()
+
+    writer.invalidate("ongoing")
+    writer_shared._writes.join()
+
+    reader, _ = replica(redis)
+    assert reader.get("ongoing", "all") == (False, None)
+    # Other namespaces keep their entries
+    assert reader.get("game", "g2") == (True, [2, {"game_id": "g2"}])
+
+
+def test_redis_errors_are_misses():
+    broken = SharedCache(TTLS, client=BrokenRedis())
+    cache = TwoTierCache(maxsize=10, ttls=TTLS, shared=broken)
+
+    assert cache.get_or_load("game", "g1", lambda: "from mongo") == "from mongo"
+    assert broken.get_many([("game", "g2")]) == {}
+
+
+def test_misses_are_not_shared():
+    redis = FakeRedis()
+    writer, writer_shared = replica(redis)
+    writer.set("game", "g1", None)
+
+    assert writer.get("game", "g1") == (True, None)
+    assert writer_shared._writes is None
+    assert redis.data == {}
+
+
+def test_expired_shared_entries_are_misses():
+    redis = FakeRedis()
+    cache, _ = replica(redis)
+    redis.data["sports:cache:v2:game:g1"] = {"entry": msgpack.packb([0, time.time() - 61, "old"], use_bin_type=True)}
+
+    assert cache.get("game", "g1") == (False, None)
+    assert cache.get_or_load("game", "g1", lambda: "fresh") == "fresh"
+
+
+def test_values_read_before_a_write_are_not_stored_after_it():
+    redis = FakeRedis()
+    writer, writer_shared = replica(redis)
+    reader, reader_shared = replica(redis)
+    writer.set("game", "g1", (5, {"home": 1}))
+    writer_shared._writes.join()
+
+    # The writer updates g1 to version 6; the reader loaded version 5 before
+    # that and its write reaches Redis last
+    writer.invalidate("game", "g1")
+    writer.set("game", "g1", (6, {"home": 2}))
+    writer_shared._writes.join()
+    reader.set("game", "g1", (5, {"home": 1}))
+    reader_shared._writes.join()
+
+    fresh, _ = replica(redis)
+    assert fresh.get("game", "g1") == (True, [6, {"home": 2}])
+
+
+def test_deleted_games_are_not_written_back():
+    redis = FakeRedis()
+    writer, writer_shared = replica(redis)
+    reader, reader_shared = replica(redis)
+
+    # Deleted at version 5 before anything was cached; a lookup that read it
+    # just before the delete stores it afterwards
+    writer.invalidate("game", "g1", version=5)
+    writer_shared._writes.join()
+    reader.set("game", "g1", (5, {"home": 1}))
+    reader_shared._writes.join()
+
+    fresh, _ = replica(redis)
+    assert fresh.get("game", "g1") == (False, None)
+    # A game created again later gets a newer version
+    reader.set("game", "g1", (7, {"home": 0}))
+    reader_shared._writes.join()
+    assert replica(redis)[0].get("game", "g1") == (True, [7, {"home": 0}])
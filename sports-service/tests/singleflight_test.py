@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+import pytest
+from singleflight import SingleFlight, AsyncSingleFlight, SINGLEFLIGHT_CALLS
+
+
+def calls(name, outcome):
+    return SINGLEFLIGHT_CALLS.labels(name, outcome)._value.get()
+
+
+def test_concurrent_identical_lookups_share_one_query():
+    flight = SingleFlight('test_threads')
+    release = threading.Event()
+    queries = []
+
+    def query():
+        queries.append(1)
+        release.wait(5)
+        return {"event_id": "g1"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("g1", query))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while calls('test_threads', 'coalesced') < 7 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(queries) == 1
+    assert results == [{"event_id": "g1"}] * 8
+    assert calls('test_threads', 'issued') == 1
+    # Nothing is remembered once the query is done
+    assert flight.do("g1", lambda: None) is None
+
+
+def test_errors_reach_every_waiter_and_are_not_kept():
+    flight = SingleFlight('test_errors')
+
+    def failing():
+        raise RuntimeError("mongo down")
+
+    with pytest.raises(RuntimeError):
+        flight.do("g1", failing)
+    assert flight.do("g1", lambda: "recovered") == "recovered"
+
+
+def test_async_lookups_share_one_query():
+    flight = AsyncSingleFlight('test_async')
+    queries = []
+
+    async def query():
+        queries.append(1)
+        await asyncio.sleep(0.01)
+        return "game"
+
+    async def scenario():
+        return await asyncio.gather(*[flight.do("g1", query) for _ in range(5)])
+
+    assert asyncio.run(scenario()) == ["game"] * 5
+    assert len(queries) == 1
+    assert calls('test_async', 'coalesced') == 4
+
+
+def test_cancelled_leader_does_not_cancel_the_others():
+    flight = AsyncSingleFlight('test_cancel')
+
+    async def query():
+        await asyncio.sleep(0.02)
+        return "game"
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.do("g1", query))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("g1", query))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower, leader.cancelled()
+
+    assert asyncio.run(scenario()) == ("game", True)
+    assert calls('test_cancel', 'issued') == 1
@@ -0,0 +1,50 @@
+from unittest.mock import MagicMock
+from slow_queries import SlowQueryRecorder, normalize, plan_summary
+
+recorder_count = 0
+
+
+def make_recorder(**kwargs):
+    global recorder_count
+    recorder_count += 1
+    return SlowQueryRecorder(f'slow_test_{recorder_count}', **kwargs)
+
+
+def test_normalize_keeps_fields_and_operators_but_drops_values():
+    assert normalize({"event_status": "ongoing", "event_id": {"$in": ["a", "b"]}}) == \
+        {"event_status": "?", "event_id": {"$in": "?"}}
+    assert normalize({"$or": [{"username": "x"}, {"email": "y"}]}) == {"$or": [{"username": "?"}, {"email": "?"}]}
+
+
+def test_plan_summary_walks_the_stage_chain():
+    plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "event_id_1"}}
+    assert plan_summary(plan) == "FETCH <- IXSCAN event_id_1"
+
+
+def test_recorder_groups_slow_commands_by_shape_and_explains_them():
+    client = MagicMock()
+    client.__getitem__.return_value.command.return_value = {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+    recorder = make_recorder(threshold_ms=50, explain_sample_rate=1.0)
+    recorder.bind(lambda: client)
+
+    for request_id, (game_id, micros) in enumerate([("g1", 80000), ("g2", 120000), ("g3", 10000)]):
+        command = {"find": "events", "filter": {"event_id": game_id}, "lsid": {"id": 1}, "$db": "sports_database"}
+        recorder.started(MagicMock(command_name="find", request_id=request_id, database_name="sports_database",
+                                   command=command))
+        recorder.succeeded(MagicMock(command_name="find", request_id=request_id, duration_micros=micros))
+    recorder._explainer.shutdown(wait=True)
+
+    [entry] = recorder.top()
+    assert entry["collection"] == "events" and entry["shape"] == {"event_id": "?"}
+    assert entry["count"] == 2 and entry["worst_ms"] == 120.0 and entry["mean_ms"] == 100.0
+    assert entry["plan"] == "COLLSCAN"
+    explain = client.__getitem__.return_value.command.call_args.args[0]
+    assert explain == {"explain": {"find": "events", "filter": {"event_id": "g1"}}, "verbosity": "queryPlanner"}
+
+
+def test_recorder_evicts_least_recently_seen_shapes():
+    recorder = make_recorder(threshold_ms=0, capacity=2)
+    for field in ("a", "b", "c"):
+        recorder.record("db", "find", {"find": "events", "filter": {field: 1}}, 5.0)
+
+    assert [entry["shape"] for entry in recorder.top(sort="count")] == [{"b": "?"}, {"c": "?"}]
@@ -0,0 +1,588 @@
+import grpc
+import json
+import queue
+import time
+import pytest
+from unittest.mock import MagicMock
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import sports_service_pb2
+from app import app, cache, score_feed, SportsService, drop_remote_update
+from cache import TTLCache
+from feed import ScoreFeed
+from indexes import (ensure_indexes, REQUIRED_INDEXES, ONGOING_EVENTS_INDEX, ONGOING_EVENTS_KEYS, ONGOING_PAGES_INDEX,
+                     EVENT_ID_INDEX, ONGOING_EVENT_PROJECTION)
+from index_manager import index_drift
+from load import LoadTracker, LoadInterceptor
+from limiter import AdaptiveLimiter
+
+@pytest.fixture
+def client():
+    cache.clear()
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def mock_mongo(mocker):
+    mock_db = mocker.patch('app.db')
+    mock_db.counters.find_one_and_update.return_value = {"_id": "events", "version": 1}
+    return mock_db
+
+
+def test_get_ongoing_events_uses_covered_projection(client, mock_mongo):
+    mock_mongo.events.find.return_value = [{
+        "sport_category": "football",
+        "team_1": "A",
+        "team_2": "B",
+        "score_team_1": 1,
+        "score_team_2": 0
+    }]
+
+    response = client.get('/api/sports/ongoing-events')
+
+    assert response.status_code == 200
+    assert response.get_json()["data"][0]["team_1"] == "A"
+    mock_mongo.events.find.assert_called_once_with({"event_status": "ongoing"}, ONGOING_EVENT_PROJECTION)
+    assert ONGOING_EVENT_PROJECTION["_id"] == 0
+
+
+def test_ensure_indexes_creates_compound_ongoing_index():
+    db = MagicMock()
+
+    ensure_indexes(db)
+
+    ongoing_index = db["events"].create_index.call_args_list[0]
+    keys = ongoing_index.args[0]
+    assert keys[0] == ("event_status", 1)
+    assert {field for field, _ in keys[1:]} == {field for field in ONGOING_EVENT_PROJECTION if field != "_id"}
+    assert ongoing_index.kwargs["name"] == ONGOING_EVENTS_INDEX
+
+
+def _cursor(rows):
+    cursor = MagicMock()
+    cursor.batch_size.return_value = cursor
+    cursor.__iter__.return_value = iter(rows)
+    return cursor
+
+
+def test_get_ongoing_events_streams_ndjson(client, mock_mongo):
+    rows = [{"sport_category": "football", "team_1": "A", "team_2": "B", "score_team_1": 1, "score_team_2": 0},
+            {"sport_category": "tennis", "team_1": "C", "team_2": "D", "score_team_1": 2, "score_team_2": 3}]
+    cursor = _cursor(rows)
+    mock_mongo.events.find.return_value = cursor
+
+    response = client.get('/api/sports/ongoing-events', headers={'Accept': 'application/x-ndjson'})
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.data.decode().splitlines()
+    response.close()
+    assert [json.loads(line) for line in lines] == rows
+    cursor.close.assert_called_once()
+
+
+def test_get_sports_categories_streams_json_envelope(client, mock_mongo):
+    rows = [{"category_id": "1", "category_name": "football"}, {"category_id": "2", "category_name": "tennis"}]
+    mock_mongo.categories.find.return_value = _cursor(rows)
+
+    response = client.get('/api/sports/categories?stream=1')
+
+    assert response.status_code == 200
+    assert json.loads(response.data) == {"status": "success", "data": rows}
+    response.close()
+
+
+def test_get_game_details_is_served_from_cache(client, mock_mongo):
+    mock_mongo.events.find_one.return_value = {"event_id": "g1", "team_1": "A", "team_2": "B",
+                                               "score_team_1": 1, "score_team_2": 0, "status": "live"}
+
+    first = client.get('/api/sports/games/g1')
+    second = client.get('/api/sports/games/g1')
+
+    assert first.status_code == 200
+    assert second.get_json() == first.get_json()
+    mock_mongo.events.find_one.assert_called_once_with({"event_id": "g1"})
+
+
+def test_add_event_invalidates_cached_game(client, mock_mongo):
+    mock_mongo.events.find_one.return_value = None
+    assert client.get('/api/sports/games/g2').status_code == 404
+
+    client.post('/api/sports/events', json={"event_id": "g2", "team_1": "A", "team_2": "B"})
+    mock_mongo.events.find_one.return_value = {"event_id": "g2", "team_1": "A", "team_2": "B"}
+
+    assert client.get('/api/sports/games/g2').status_code == 200
+    assert mock_mongo.events.find_one.call_count == 2
+
+
+def test_cache_evicts_least_recently_used_and_expires():
+    lru = TTLCache(maxsize=2, ttls={"game": 60, "ongoing": 0})
+
+    lru.set("game", "a", 1)
+    lru.set("game", "b", 2)
+    assert lru.get_or_load("game", "a", lambda: None) == 1
+    lru.set("game", "c", 3)
+
+    assert lru.get_or_load("game", "b", lambda: "reloaded") == "reloaded"
+    assert lru.get_or_load("game", "a", lambda: "reloaded") == "reloaded"
+    lru.set("ongoing", "all", [])
+    assert lru.get_or_load("ongoing", "all", lambda: "expired") == "expired"
+
+
+def test_get_game_details_answers_conditional_get_with_304(client, mock_mongo):
+    mock_mongo.events.find_one.return_value = {"event_id": "g3", "team_1": "A", "team_2": "B", "version": 4}
+
+    first = client.get('/api/sports/games/g3')
+    etag = first.headers['ETag']
+    second = client.get('/api/sports/games/g3', headers={'If-None-Match': etag})
+
+    assert first.status_code == 200
+    assert etag == '"g3-4"'
+    assert second.status_code == 304
+    assert second.data == b''
+    assert second.headers['ETag'] == etag
+
+
+def test_ongoing_events_etag_follows_collection_version(client, mock_mongo):
+    mock_mongo.counters.find_one.return_value = {"_id": "events", "version": 7}
+    mock_mongo.counters.find_one_and_update.return_value = {"_id": "events", "version": 8}
+    mock_mongo.events.find.return_value = []
+
+    first = client.get('/api/sports/ongoing-events')
+    assert first.headers['ETag'] == '"ongoing-7"'
+    assert client.get('/api/sports/ongoing-events', headers={'If-None-Match': '"ongoing-7"'}).status_code == 304
+
+    client.post('/api/sports/events', json={"event_id": "g4"})
+    mock_mongo.counters.find_one.return_value = {"_id": "events", "version": 9}
+
+    assert client.get('/api/sports/ongoing-events', headers={'If-None-Match': '"ongoing-7"'}).status_code == 200
+
+
+def test_add_events_bulk_reports_per_item_status(client, mock_mongo, mocker):
+    mocker.patch('app.BULK_CHUNK_SIZE', 2)
+    mock_mongo.events.insert_many.side_effect = [
+        None,
+        BulkWriteError({"writeErrors": [{"index": 0, "errmsg": "duplicate key"}]})
+    ]
+    events = [{"event_id": "b1"}, {"event_id": "b2"}, {"team_1": "no id"}, {"event_id": "b3"}, {"event_id": "b4"}]
+
+    response = client.post('/api/sports/events:bulk', json=events)
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert body["inserted"] == 3
+    assert [result["status"] for result in body["results"]] == ["success", "success", "error", "error", "success"]
+    assert mock_mongo.events.insert_many.call_count == 2
+    assert mock_mongo.events.insert_many.call_args.kwargs == {"ordered": False}
+
+
+def test_add_events_bulk_accepts_ndjson(client, mock_mongo):
+    body = '{"event_id": "n1"}\nnot json\n{"event_id": "n2"}\n'
+
+    response = client.post('/api/sports/events:bulk', data=body, content_type='application/x-ndjson')
+
+    assert response.status_code == 207
+    results = response.get_json()["results"]
+    assert [result["status"] for result in results] == ["success", "error", "success"]
+    inserted = mock_mongo.events.insert_many.call_args.args[0]
+    assert [event["event_id"] for event in inserted] == ["n1", "n2"]
+
+
+def test_update_game_score_applies_inc_and_publishes_delta(client, mock_mongo):
+    mock_mongo.counters.find_one_and_update.return_value = {"_id": "events", "version": 12}
+    mock_mongo.events.find_one_and_update.return_value = {
+        "event_id": "g5", "team_1": "A", "team_2": "B", "score_team_1": 2, "score_team_2": 0,
+        "sport_category": "football", "status": "live", "version": 6
+    }
+    deltas = []
+    unsubscribe = score_feed.subscribe(deltas.append)
+
+    try:
+        response = client.patch('/api/sports/games/g5/score', json={"inc": {"score_team_1": 1}})
+    finally:
+        unsubscribe()
+
+    assert response.status_code == 200
+    assert response.get_json()["data"]["score_team_1"] == 2
+    assert response.headers['ETag'] == '"g5-6"'
+    query, update = mock_mongo.events.find_one_and_update.call_args.args
+    assert query == {"event_id": "g5"}
+    assert update == {"$inc": {"score_team_1": 1, "version": 1}}
+    assert deltas == [{"game_id": "g5", "version": 6, "seq": 12, "sport_category": "football",
+                       "changes": {"score_team_1": 2}}]
+    # The updated state is served without another read
+    assert client.get('/api/sports/games/g5').get_json()["data"]["score_team_1"] == 2
+    mock_mongo.events.find_one.assert_not_called()
+
+
+def test_update_game_score_rejects_unknown_fields(client, mock_mongo):
+    response = client.patch('/api/sports/games/g5/score', json={"set": {"team_1": "X"}})
+
+    assert response.status_code == 400
+    mock_mongo.events.find_one_and_update.assert_not_called()
+
+
+def test_grpc_update_score_returns_game(mock_mongo):
+    mock_mongo.events.find_one_and_update.return_value = {
+        "event_id": "g6", "team_1": "A", "team_2": "B", "score_team_1": 0, "score_team_2": 3, "version": 2
+    }
+    context = MagicMock()
+    request = sports_service_pb2.UpdateScoreRequest(game_id="g6", inc_team_2=1, status="final")
+
+    game = SportsService().UpdateScore(request, context)
+
+    assert game.score_team_2 == 3
+    assert game.version == 2
+    update = mock_mongo.events.find_one_and_update.call_args.args[1]
+    assert update == {"$inc": {"score_team_2": 1, "version": 1}, "$set": {"status": "final"}}
+
+
+def test_watch_game_sends_snapshot_then_live_deltas(mock_mongo):
+    mock_mongo.events.find_one.return_value = {"event_id": "w1", "team_1": "A", "team_2": "B",
+                                               "score_team_1": 0, "score_team_2": 0, "version": 3}
+    context = MagicMock()
+    context.is_active.return_value = True
+    stream = SportsService().WatchGame(sports_service_pb2.WatchGameRequest(game_id="w1", since_version=1), context)
+
+    snapshot = next(stream)
+    score_feed.publish({"game_id": "other", "version": 9, "seq": 20, "changes": {"score_team_1": 1}})
+    score_feed.publish({"game_id": "w1", "version": 3, "seq": 21, "changes": {"score_team_1": 1}})
+    score_feed.publish({"game_id": "w1", "version": 4, "seq": 22, "changes": {"score_team_2": 1}})
+    live = next(stream)
+    stream.close()
+
+    assert snapshot.snapshot and snapshot.version == 3 and snapshot.team_1 == "A"
+    assert live.version == 4 and live.score_team_2 == 1
+    assert not live.HasField("score_team_1")
+
+
+def test_watch_streams_beyond_the_cap_are_rejected(mock_mongo):
+    mock_mongo.counters.find_one.return_value = {"_id": "events", "version": 5}
+    mock_mongo.events.find.return_value = [{"event_id": "c1", "version": 1, "sport_category": "chess"}]
+    context = MagicMock()
+    context.is_active.return_value = True
+    context.abort.side_effect = grpc.RpcError()
+    service = SportsService(max_watch_streams=1)
+    request = sports_service_pb2.WatchOngoingRequest(sport_category="chess")
+
+    first = service.WatchOngoing(request, context)
+    next(first)
+    with pytest.raises(grpc.RpcError):
+        next(service.WatchGame(sports_service_pb2.WatchGameRequest(game_id="c1"), context))
+    context.abort.assert_called_once_with(grpc.StatusCode.RESOURCE_EXHAUSTED, "Too many watch streams, retry later")
+
+    first.close()
+    second = service.WatchOngoing(request, context)
+    assert next(second).game_id == "c1"
+    second.close()
+
+
+def test_load_watch_streams_have_their_own_cap():
+    context = MagicMock()
+    context.is_active.return_value = True
+    context.abort.side_effect = grpc.RpcError()
+    service = SportsService(max_watch_streams=1, max_load_watch_streams=1)
+
+    first = service.WatchLoad(sports_service_pb2.WatchLoadRequest(interval_ms=100), context)
+    next(first)
+    with pytest.raises(grpc.RpcError):
+        next(service.WatchLoad(sports_service_pb2.WatchLoadRequest(interval_ms=100), context))
+    first.close()
+
+
+def test_pings_are_not_counted_as_load():
+    tracker = LoadTracker(window=10)
+    interceptor = LoadInterceptor(tracker, ['/sportsservice.SportsService/Ping'])
+    in_flight = []
+    handler = grpc.unary_unary_rpc_method_handler(lambda request, context: in_flight.append(tracker.load()))
+
+    for method in ('/sportsservice.SportsService/Ping', '/sportsservice.SportsService/GetGames'):
+        details = MagicMock(method=method)
+        interceptor.intercept_service(lambda _: handler, details).unary_unary(None, None)
+
+    assert in_flight[0] < in_flight[1]
+
+
+def test_score_feed_backlog_respects_history_horizon():
+    feed = ScoreFeed(redis_startup_nodes='')
+    feed.start_history(100)
+    feed.publish({"game_id": "a", "version": 2, "seq": 101, "sport_category": "tennis", "changes": {"score_team_1": 1}})
+    feed.publish({"game_id": "b", "version": 5, "seq": 102, "sport_category": "football", "changes": {"score_team_1": 2}})
+
+    backlog, unsubscribe = feed.subscribe_from(100, lambda delta: None, lambda delta: delta["sport_category"] == "football")
+    unsubscribe()
+    assert [delta["game_id"] for delta in backlog] == ["b"]
+
+    stale, unsubscribe = feed.subscribe_from(99, lambda delta: None)
+    unsubscribe()
+    assert stale is None
+
+
+def test_score_feed_relay_reconnects_to_redis(mocker):
+    mocker.patch('feed.time.sleep')
+    client = MagicMock()
+    client.publish.side_effect = [ConnectionError("reset"), None, SystemExit]
+    connect = mocker.patch('feed.redis_client', side_effect=[ConnectionError("refused"), client, client])
+    feed = ScoreFeed(redis_startup_nodes='redis:7000')
+    feed._relay_queue = queue.Queue()
+    for seq in (1, 2, 3):
+        feed._relay_queue.put(f'{{"seq":{seq}}}')
+
+    with pytest.raises(SystemExit):
+        feed._relay_worker()
+
+    assert connect.call_count == 3
+    assert [call.args[1] for call in client.publish.call_args_list] == ['{"seq":1}', '{"seq":2}', '{"seq":3}']
+
+
+def test_score_feed_resync_disables_resuming_until_the_next_delta():
+    feed = ScoreFeed(redis_startup_nodes='')
+    feed.start_history(100)
+    watcher = MagicMock()
+    feed.subscribe(watcher)
+    listener = MagicMock()
+    feed.resync_listeners.append(listener)
+
+    feed.resynchronise()
+    watcher.resync.assert_called_once_with()
+    listener.assert_called_once_with()
+    backlog, unsubscribe = feed.subscribe_from(100, lambda delta: None)
+    unsubscribe()
+    assert backlog is None
+
+    feed.publish({"game_id": "a", "version": 2, "seq": 105, "changes": {"score_team_1": 1}})
+    feed.publish({"game_id": "a", "version": 3, "seq": 106, "changes": {"score_team_1": 2}})
+    backlog, unsubscribe = feed.subscribe_from(105, lambda delta: None)
+    unsubscribe()
+    assert [delta["seq"] for delta in backlog] == [106]
+    stale, unsubscribe = feed.subscribe_from(104, lambda delta: None)
+    unsubscribe()
+    assert stale is None
+
+
+def test_score_feed_dispatches_in_seq_order():
+    feed = ScoreFeed(redis_startup_nodes='')
+    feed.start_history(10)
+    seen = []
+    feed.subscribe(lambda delta: seen.append(delta["seq"]))
+
+    for seq in (12, 11, 15):
+        feed.publish({"game_id": "a", "version": seq, "seq": seq, "changes": {}})
+    assert seen == [11, 12]
+    # 13 and 14 never come: 15 goes out once the window has passed
+    deadline = time.monotonic() + 2
+    while len(seen) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert seen == [11, 12, 15]
+
+    # Too late to be put in order: who saw 15 may have missed it
+    feed.publish({"game_id": "a", "version": 14, "seq": 14, "changes": {}})
+    stale, unsubscribe = feed.subscribe_from(15, lambda delta: None)
+    unsubscribe()
+    assert stale is None
+
+
+def test_score_feed_listener_resubscribes_and_resyncs(mocker):
+    mocker.patch('feed.time.sleep')
+    pubsub = MagicMock()
+    pubsub.listen.side_effect = [ConnectionError("reset"),
+                                 iter([{"type": "message", "data": '{"game_id":"r","version":1,"seq":7,"changes":{}}'}]),
+                                 SystemExit]
+    mocker.patch('feed.redis_client').return_value.pubsub.return_value = pubsub
+    feed = ScoreFeed(redis_startup_nodes='redis:7000')
+    received = []
+    feed.subscribe(received.append)
+    resync = mocker.patch.object(feed, 'resynchronise')
+
+    with pytest.raises(SystemExit):
+        feed._listen_worker()
+
+    assert pubsub.subscribe.call_count == 3
+    assert resync.call_count == 2
+    assert [delta["game_id"] for delta in received] == ["r"]
+
+
+def test_updates_from_other_replicas_drop_the_local_cache_entries():
+    feed = ScoreFeed()
+    feed.remote_listeners.append(drop_remote_update)
+    cache.set('game', 'r1', (1, {"game_id": "r1", "score_team_1": 0}))
+    cache.set('game', 'r2', (1, {"game_id": "r2", "score_team_1": 0}))
+
+    feed._receive({"type": "message", "data": json.dumps(
+        {"game_id": "r1", "version": 2, "seq": 8, "changes": {"score_team_1": 1}, "origin": "other"})})
+    feed._receive({"type": "message", "data": json.dumps(
+        {"game_id": "r2", "version": 2, "seq": 9, "changes": {"score_team_1": 1},
+         "origin": feed.origin})})
+
+    assert cache.get('game', 'r1') == (False, None)
+    # Echoes of this process's own writes were invalidated when written
+    assert cache.get('game', 'r2')[0]
+
+
+def test_grpc_get_games_resolves_batch_with_single_in_query(mock_mongo):
+    mock_mongo.events.find.return_value = [
+        {"event_id": "b", "team_1": "C", "team_2": "D", "version": 1},
+        {"event_id": "a", "team_1": "A", "team_2": "B", "version": 2}
+    ]
+    request = sports_service_pb2.GetGamesRequest(game_ids=["a", "b", "missing", "a"])
+
+    response = SportsService().GetGames(request, MagicMock())
+
+    assert [game.game_id for game in response.games] == ["a", "b"]
+    assert list(response.missing_ids) == ["missing"]
+    mock_mongo.events.find.assert_called_once()
+    assert mock_mongo.events.find.call_args.args[0] == {"event_id": {"$in": ["a", "b", "missing"]}}
+
+
+def test_grpc_list_ongoing_events_paginates_by_event_id(mock_mongo):
+    cursor = mock_mongo.events.find.return_value.sort.return_value.limit
+    cursor.return_value = [{"event_id": "e1"}, {"event_id": "e2"}, {"event_id": "e3"}]
+    servicer = SportsService()
+
+    first = servicer.ListOngoingEvents(sports_service_pb2.ListOngoingEventsRequest(sport_category="tennis", page_size=2), MagicMock())
+    cursor.return_value = [{"event_id": "e3"}]
+    second = servicer.ListOngoingEvents(sports_service_pb2.ListOngoingEventsRequest(
+        sport_category="tennis", page_size=2, page_token=first.next_page_token), MagicMock())
+
+    assert [game.game_id for game in first.games] == ["e1", "e2"]
+    assert second.next_page_token == ""
+    assert mock_mongo.events.find.call_args.args[0] == {"event_status": "ongoing", "sport_category": "tennis",
+                                                        "event_id": {"$gt": "e2"}}
+
+
+def test_load_tracker_combines_in_flight_rate_and_latency():
+    now = [100.0]
+    tracker = LoadTracker(window=10, alpha=0.5, clock=lambda: now[0])
+    for _ in range(20):
+        started = tracker.start()
+        now[0] += 0.5
+        tracker.finish(started)
+    in_flight = tracker.start()
+
+    snapshot = tracker.snapshot()
+    assert snapshot["in_flight"] == 1
+    # The first completion fell into the bucket that just left the window
+    assert snapshot["request_rate"] == 1.9
+    assert snapshot["latency_ewma_ms"] == 500.0
+    assert snapshot["load"] == 1
+
+    tracker.finish(in_flight)
+    now[0] += 60
+    assert tracker.snapshot()["request_rate"] == 0
+
+
+def test_status_reports_current_load_without_counting_itself(client):
+    response = client.get('/status')
+
+    body = response.get_json()
+    assert body["current_load"] == body["load"]["load"]
+    assert body["load"]["in_flight"] == 0
+
+
+def test_adaptive_limiter_grows_when_fast_and_backs_off_when_slow():
+    limiter = AdaptiveLimiter(initial_limit=4, min_limit=2, max_limit=5, target_latency=0.1, backoff=0.5)
+    assert all(limiter.try_acquire() for _ in range(4))
+    assert not limiter.try_acquire()
+
+    limiter.release(0.01)
+    assert limiter.limit == 5
+    limiter.release(0.5)
+    assert limiter.limit == 2
+    limiter.release(0.5)
+    assert limiter.limit == 2
+
+
+def test_requests_over_the_limit_are_shed_with_retry_after(client, mock_mongo, mocker):
+    limiter = mocker.patch('app.limiter', AdaptiveLimiter(initial_limit=1, min_limit=1))
+    assert limiter.try_acquire()
+
+    shed = client.get('/api/sports/games/g1')
+    status = client.get('/status')
+
+    assert shed.status_code == 503
+    assert shed.headers['Retry-After'] == '1'
+    mock_mongo.events.find_one.assert_not_called()
+    assert status.status_code == 200
+
+
+def test_limiter_backs_off_once_per_round_trip():
+    limiter = AdaptiveLimiter(initial_limit=10, min_limit=1, target_latency=0.01, backoff=0.5)
+    assert all(limiter.try_acquire() for _ in range(4))
+
+    # Three requests that were all in flight during the same slow spell
+    for _ in range(3):
+        limiter.release(0.5)
+    assert limiter.limit == 5
+    # A slow one that started after the back-off shrinks it again
+    time.sleep(0.03)
+    limiter.release(0.02)
+    assert limiter.limit == 2
+
+
+def test_bulk_ingest_has_its_own_budget(client, mock_mongo, mocker):
+    limiter = mocker.patch('app.limiter', AdaptiveLimiter(initial_limit=1, min_limit=1))
+    assert limiter.try_acquire()
+    bulk_limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_limit=1, name='bulk')
+    mocker.patch.dict('app.SEPARATELY_LIMITED_PATHS', {'/api/sports/events:bulk': bulk_limiter})
+
+    response = client.post('/api/sports/events:bulk', json=[{"event_id": "b1", "team_1": "A", "team_2": "B"}])
+
+    assert response.status_code == 201
+    assert limiter._in_flight == 1 and bulk_limiter._in_flight == 0
+    # The bulk budget is separate in both directions
+    assert bulk_limiter.try_acquire()
+    assert client.post('/api/sports/events:bulk', json=[]).status_code == 503
+
+
+def test_streamed_responses_hold_their_slot_until_closed(client, mock_mongo, mocker):
+    limiter = mocker.patch('app.limiter', AdaptiveLimiter(initial_limit=5, min_limit=1))
+    mock_mongo.events.find.return_value = _cursor([{"event_id": "g1"}])
+
+    response = client.get('/api/sports/ongoing-events?stream=1', buffered=False)
+    assert limiter._in_flight == 1
+    response.get_data()
+    response.close()
+    assert limiter._in_flight == 0
+
+
+
+def test_metrics_endpoint_exposes_route_latency_histograms(client, mock_mongo):
+    mock_mongo.events.find_one.return_value = None
+    client.get('/api/sports/games/unknown')
+
+    body = client.get('/metrics').data.decode()
+
+    assert 'sports_http_request_duration_seconds_bucket{endpoint="/api/sports/games/<string:game_id>",le="0.005",method="GET",status="404"}' in body
+    assert 'sports_requests_total{endpoint="/api/sports/games/<string:game_id>",method="GET"}' in body
+    assert 'sports_http_response_size_bytes_count' in body
+
+
+def test_debug_slow_queries_validates_sort(client):
+    assert client.get('/debug/slow-queries?sort=bogus').status_code == 400
+    response = client.get('/debug/slow-queries?sort=count&limit=5')
+    assert response.status_code == 200
+    assert response.get_json()["data"] == []
+
+
+def test_index_drift_reports_missing_mismatched_and_extra_indexes():
+    db = MagicMock()
+    db["events"].list_indexes.return_value = [
+        {"name": "_id_", "key": {"_id": 1}},
+        {"name": EVENT_ID_INDEX, "key": {"event_id": 1}},
+        {"name": ONGOING_EVENTS_INDEX, "key": dict(ONGOING_EVENTS_KEYS)},
+        {"name": "team_1_1", "key": {"team_1": 1}},
+    ]
+
+    drift = index_drift(db, REQUIRED_INDEXES)
+
+    assert drift == {"events": {"missing": [ONGOING_PAGES_INDEX], "mismatched": [EVENT_ID_INDEX], "extra": ["team_1_1"]}}
+
+
+def test_add_event_with_existing_event_id_is_a_conflict(client, mock_mongo):
+    mock_mongo.counters.find_one_and_update.return_value = {"_id": "events", "version": 4}
+    mock_mongo.events.insert_one.side_effect = DuplicateKeyError("E11000 duplicate key")
+
+    response = client.post('/api/sports/events', json={"event_id": "dup"})
+
+    assert response.status_code == 409
+
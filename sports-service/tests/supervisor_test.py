@@ -0,0 +1,35 @@
+import sys
+import time
+from supervisor import Child, Supervisor
+
+
+def test_supervisor_restarts_exited_child_with_backoff():
+    child = Child('crashing', [sys.executable, '-c', 'raise SystemExit(3)'])
+    supervisor = Supervisor([child], grace=1)
+    supervisor.start()
+    first = child.process
+    first.wait()
+
+    supervisor.check(now=child.started_at + 0.1)
+    assert child.restart_at == child.started_at + 1.1
+    assert child.restart_delay == 2.0
+    supervisor.check(now=child.restart_at)
+
+    assert child.restart_at is None
+    assert child.process is not first
+    supervisor.shutdown()
+
+
+def test_supervisor_shutdown_stops_children_gracefully_or_kills_them():
+    polite = Child('polite', [sys.executable, '-c', 'import time; time.sleep(30)'])
+    stubborn = Child('stubborn', [sys.executable, '-c',
+                                  'import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); '
+                                  'time.sleep(30)'])
+    supervisor = Supervisor([polite, stubborn], grace=0.5)
+    supervisor.start()
+    time.sleep(0.3)
+
+    supervisor.shutdown()
+
+    assert polite.process.returncode == -15
+    assert stubborn.process.returncode == -9
@@ -0,0 +1,40 @@
+from pymongo import ReturnDocument
+
+# Per-collection version counters live in the `counters` collection so every
+# replica sees the same sequence. Per-document versions are stored on the
+# documents themselves in a `version` field.
+
+
+def bump_collection_version(db, name):
+    counter = db.counters.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["version"]
+
+
+def collection_version(db, name):
+    counter = db.counters.find_one({"_id": name})
+    return counter["version"] if counter else 0
+
+
+def make_etag(*parts):
+    return '-'.join(str(part) for part in parts)
+
+
+# Same as above for motor (async) databases
+async def bump_collection_version_async(db, name):
+    counter = await db.counters.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["version"]
+
+
+async def collection_version_async(db, name):
+    counter = await db.counters.find_one({"_id": name})
+    return counter["version"] if counter else 0
@@ -1,21 +1,42 @@
 from flask import Flask, jsonify, request, Response
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 import jwt
 from functools import wraps
 import time
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import os
+import sys
 import unittest
-from prometheus_client import generate_latest, Counter, Gauge, CollectorRegistry
+from prometheus_client import generate_latest, multiprocess, Counter, Gauge, CollectorRegistry
 import threading
 from bson.objectid import ObjectId
+from lanes import serve_lanes
+from indexes import ensure_indexes
+from batch_loader import BatchLoader
+from mongo_monitoring import mongo_client_options, PoolMetricsListener, CommandMetricsListener
+from slow_queries import SlowQueryRecorder, SLOW_QUERY_SORT_KEYS
 
 
 app = Flask(__name__)
 
-client = MongoClient('mongodb://mongo:27017/')
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://mongo:27017/')
+client = None
+db = None
+# Slowest query shapes with their plans, see /debug/slow-queries
+slow_queries = SlowQueryRecorder('user')
+slow_queries.bind(lambda: client)
+# Pool and per-command metrics, shared by every client this process creates
+MONGO_LISTENERS = [PoolMetricsListener('user'), CommandMetricsListener('user'), slow_queries]
 
-db = client['user_database']
+def connect_mongo():
+    # Prefork workers reconnect after fork (see gunicorn.conf.py); a MongoClient
+    # must not be shared across processes.
+    global client, db
+    client = MongoClient(MONGO_URL, connect=False, event_listeners=MONGO_LISTENERS, **mongo_client_options())
+    db = client['user_database']
+
+connect_mongo()
 
 SECRET_KEY = 'your_secret_key'
 
@@ -23,10 +44,28 @@ executor = ThreadPoolExecutor(max_workers=2)
 
 REQUEST_COUNT = Counter('user_requests_total', 'Total number of requests to user service', ['method', 'endpoint'])
 CURRENT_LOAD = Gauge('user_current_load', 'Current load of user service')
+# Served by their own workers so that health checks and scrapes are answered
+# even when every data worker is busy
+CONTROL_PATHS = ('/status', '/metrics')
 
 @app.route('/metrics', methods=['GET'])
 def metrics():
-    return Response(generate_latest(), mimetype="text/plain")
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return Response(generate_latest(), mimetype="text/plain")
+    # Prefork mode: report the sum over all gunicorn workers
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), mimetype="text/plain")
+
+# Lookups of different users that arrive together are resolved by one $in
+# query; a batch of one stays a plain find_one.
+def fetch_users(usernames):
+    if len(usernames) == 1:
+        user = db.users.find_one({"username": usernames[0]})
+        return {usernames[0]: user} if user else {}
+    return {user["username"]: user for user in db.users.find({"username": {"$in": usernames}})}
+
+user_loader = BatchLoader('user', 'user', fetch_users)
 
 # token for authentication
 def token_required(f):
@@ -70,6 +109,8 @@ def register_user():
     try:
         result = future.result(timeout=5)
         return jsonify(result), 200
+    except DuplicateKeyError:
+        return jsonify({"status": "error", "message": "Username or email already registered"}), 409
     except FuturesTimeoutError:
         future.cancel()
         return jsonify({"status": "error", "message": "Task timed out"}), 504
@@ -78,7 +119,7 @@ def register_user():
 @app.route('/api/users/login', methods=['POST'])
 def login_user():
     login_data = request.get_json()
-    user = db.users.find_one({"username": login_data["username"]})
+    user = user_loader.load(login_data["username"])
 
     if user and user["password"] == login_data["password"]:
         token = jwt.encode({"username": user["username"]}, SECRET_KEY, algorithm="HS256")
@@ -91,7 +132,7 @@ def login_user():
 @token_required
 def fetch_user_profile(decoded_data):
     username = decoded_data['username']
-    user = db.users.find_one({"username": username})
+    user = user_loader.load(username)
 
     if user:
         return jsonify({
@@ -129,10 +170,23 @@ def delete_user(user_id):
     except Exception as e:
         return jsonify({"status": "error", "message": f"Failed to delete user: {str(e)}"}), 500
 
+# Top slow Mongo query shapes: ?limit=20&sort=worst_ms|count|total_ms|mean_ms
+@app.route('/debug/slow-queries', methods=['GET'])
+def get_slow_queries():
+    sort = request.args.get('sort', 'worst_ms')
+    if sort not in SLOW_QUERY_SORT_KEYS:
+        return jsonify({"status": "error", "message": f"sort must be one of {', '.join(SLOW_QUERY_SORT_KEYS)}"}), 400
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({"status": "success", "threshold_ms": slow_queries.threshold_ms,
+                    "data": slow_queries.top(limit, sort)}), 200
+
 @app.route('/status', methods=['GET'])
 def status():
     REQUEST_COUNT.labels('GET', '/status').inc()
     return jsonify({"status": "User Management Service is running"}), 200
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5002, debug=True)
\ No newline at end of file
+    if os.environ.get('USER_HTTP_MODE') == 'prefork':
+        os.execv(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'])
+    ensure_indexes(db)
+    serve_lanes(app, '0.0.0.0', 5002, CONTROL_PATHS, 'user')
\ No newline at end of file
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from prometheus_client import Histogram
+
+# How long the first lookup of a batch waits for others to join it, in
+# milliseconds; 0 disables batching
+BATCH_WINDOW_MS = float(os.environ.get('BATCH_WINDOW_MS', 2))
+BATCH_MAX_KEYS = int(os.environ.get('BATCH_MAX_KEYS', 100))
+BATCH_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_BATCH_KEYS = {}
+
+
+def _batch_keys_metric(prefix):
+    if prefix not in _BATCH_KEYS:
+        _BATCH_KEYS[prefix] = Histogram(f'{prefix}_batch_loader_keys', 'Distinct keys resolved per batched query',
+                                        ['loader'], buckets=BATCH_BUCKETS)
+    return _BATCH_KEYS[prefix]
+
+
+class BatchLoader:
+    """Turns concurrent point lookups into one query.
+
+    `fetch(keys)` takes a list of distinct keys and returns {key: value} for
+    the keys it found. The first `load` opens a batch and waits up to
+    `window` seconds (less if `max_keys` keys arrive) for other threads to
+    add their keys; then one `fetch` resolves them all. Keys that were not
+    found resolve to None.
+    """
+
+    def __init__(self, prefix, name, fetch, window=BATCH_WINDOW_MS / 1000, max_keys=BATCH_MAX_KEYS):
+        self.name = name
+        self.fetch = fetch
+        self.window = window
+        self.max_keys = max_keys
+        self._batch_keys = _batch_keys_metric(prefix).labels(name)
+        self._batch = None
+        self._lock = threading.Lock()
+
+    def load(self, key):
+        if self.window <= 0:
+            self._batch_keys.observe(1)
+            return self.fetch([key]).get(key)
+
+        with self._lock:
+            batch = self._batch
+            leader = batch is None
+            if leader:
+                batch = self._batch = _Batch()
+            future = batch.futures.get(key)
+            if future is None:
+                future = batch.futures[key] = Future()
+            if len(batch.futures) >= self.max_keys:
+                self._batch = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._batch is batch:
+                    self._batch = None
+            self._resolve(batch.futures)
+        return future.result()
+
+    def _resolve(self, futures):
+        self._batch_keys.observe(len(futures))
+        try:
+            results = self.fetch(list(futures))
+        except BaseException as e:
+            for future in futures.values():
+                future.set_exception(e)
+            return
+        for key, future in futures.items():
+            future.set_result(results.get(key))
+
+
+class _Batch:
+    def __init__(self):
+        self.futures = {}
+        self.full = threading.Event()
+
+
+class AsyncBatchLoader:
+    """BatchLoader for coroutines: `fetch(keys)` is awaitable and a batch holds
+    the keys requested during one pass of the event loop."""
+
+    def __init__(self, prefix, name, fetch):
+        self.name = name
+        self.fetch = fetch
+        self._batch_keys = _batch_keys_metric(prefix).labels(name)
+        self._batch = None
+        self._tasks = set()
+
+    async def load(self, key):
+        loop = asyncio.get_running_loop()
+        if self._batch is None:
+            self._batch = {}
+            loop.call_soon(self._dispatch)
+        future = self._batch.get(key)
+        if future is None:
+            future = self._batch[key] = loop.create_future()
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        futures, self._batch = self._batch, None
+        task = asyncio.ensure_future(self._resolve(futures))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, futures):
+        self._batch_keys.observe(len(futures))
+        try:
+            results = await self.fetch(list(futures))
+        except Exception as e:
+            for future in futures.values():
+                future.set_exception(e)
+                future.exception()
+            return
+        for key, future in futures.items():
+            future.set_result(results.get(key))
@@ -0,0 +1,48 @@
+# Prefork serving mode for the user API:
+#   gunicorn -c gunicorn.conf.py app:app
+# or start app.py with USER_HTTP_MODE=prefork.
+#
+# The app is imported once in the master and the workers are forked from it,
+# so they share its memory pages until they write to them.
+import gc
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get('HTTP_BIND', '0.0.0.0:5002')
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('HTTP_WORKER_THREADS', 4))
+preload_app = True
+timeout = 30
+keepalive = 5
+
+# prometheus_client picks its value store when it is first imported, which
+# happens while the app is preloaded, so the directory has to be ready before
+# that. Samples of earlier runs are cleared.
+METRICS_DIR = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'user-service-metrics'))
+shutil.rmtree(METRICS_DIR, ignore_errors=True)
+os.makedirs(METRICS_DIR, exist_ok=True)
+
+# No collections in the master while the app is imported: they would only
+# shuffle reference counts on pages the workers are about to share.
+gc.disable()
+
+
+def pre_fork(server, worker):
+    # Objects that exist now are never collected in the workers, so the
+    # collector doesn't write to (and un-share) their pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+    import app
+    app.connect_mongo()
+    app.ensure_indexes(app.db)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,22 @@
+import os
+from pymongo import ASCENDING
+from index_manager import IndexSpec, apply_indexes, report_drift, main
+
+# Declared indexes of user_database; see index_manager.py for the CLI:
+#   python indexes.py check|apply [--mongo-url URL]
+REQUIRED_INDEXES = {
+    "users": [
+        # Login and profile lookups by username
+        IndexSpec("username_1", [("username", ASCENDING)], unique=True),
+        IndexSpec("email_1", [("email", ASCENDING)], unique=True),
+    ],
+}
+
+
+def ensure_indexes(db):
+    apply_indexes(db, REQUIRED_INDEXES)
+    report_drift(db, REQUIRED_INDEXES)
+
+
+if __name__ == '__main__':
+    main('user_database', REQUIRED_INDEXES, os.environ.get('MONGO_URL', 'mongodb://mongo:27017/'))
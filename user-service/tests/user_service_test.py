@@ -82,3 +82,45 @@ def test_fetch_user_profile_no_token(client):
     assert response.status_code == 403
     assert b'Token is missing' in response.data
 
+
+
+def test_debug_slow_queries_lists_recorded_shapes(client):
+    from app import slow_queries
+    slow_queries.record("user_database", "find", {"find": "users", "filter": {"username": "testuser"}}, 250.0)
+
+    response = client.get('/debug/slow-queries')
+
+    assert response.status_code == 200
+    entry = response.get_json()["data"][0]
+    assert entry["collection"] == "users"
+    assert entry["shape"] == {"username": "?"}
+
+
+def test_register_existing_username_is_a_conflict(client, mock_mongo):
+    from pymongo.errors import DuplicateKeyError
+    mock_mongo.users.insert_one.side_effect = DuplicateKeyError("E11000 duplicate key")
+    user_data = {"username": "taken", "password": "pw", "email": "taken@example.com"}
+
+    response = client.post('/api/users/register', data=json.dumps(user_data), content_type='application/json')
+
+    assert response.status_code == 409
+
+
+def test_concurrent_user_lookups_share_one_in_query(mock_mongo, mocker):
+    import threading
+    from batch_loader import BatchLoader
+    from app import fetch_users
+    mock_mongo.users.find.return_value = [{"username": "ann"}, {"username": "bob"}]
+    loader = BatchLoader('user_test', 'users', fetch_users, window=5, max_keys=2)
+
+    results = {}
+    threads = [threading.Thread(target=lambda name=name: results.update({name: loader.load(name)}))
+               for name in ["ann", "bob"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert results == {"ann": {"username": "ann"}, "bob": {"username": "bob"}}
+    query = mock_mongo.users.find.call_args.args[0]
+    assert sorted(query["username"]["$in"]) == ["ann", "bob"]
@@ -20,10 +20,13 @@ redis_client = RedisCluster(startup_nodes=startup_nodes, decode_responses=True,
 
 connected_users: List[WebSocket] = []
 
+# Compact score deltas published by the sports service
+SCORE_DELTA_CHANNEL = "score_deltas"
+
 # Redis subscribe to a channel
 async def redis_listener():
     pubsub = redis_client.pubsub()
-    pubsub.subscribe("chat_channel")
+    pubsub.subscribe("chat_channel", SCORE_DELTA_CHANNEL)
 
     loop = asyncio.get_running_loop()
 
@@ -31,7 +34,9 @@ async def redis_listener():
 
     while True:
         message = await loop.run_in_executor(None, pubsub.get_message)
-        if message and message['type'] == 'message':
+        if message and message['type'] == 'message' and message['channel'] == SCORE_DELTA_CHANNEL:
+            await broadcast_score_delta(message['data'])
+        elif message and message['type'] == 'message':
             print(f"Message received from Redis: {message}")  
             data = json.loads(message['data'])
             print(f"Parsed message data: {data}") 
@@ -49,6 +54,14 @@ async def broadcast_to_users(data):
     else:
         print("No connected users to broadcast to.")
 
+# Deltas are already encoded, so they are forwarded as-is
+async def broadcast_score_delta(delta):
+    for user in connected_users:
+        try:
+            await user.send_text(delta)
+        except Exception as e:
+            print(f"Error sending score delta: {e}")
+
 # WS endpoint
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):